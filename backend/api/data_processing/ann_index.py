@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Construction des index FAISS pour le chatbot Goo-net Pit
+Index exact (Flat) ou approximatifs (IVF-Flat, HNSW, IVF-PQ, OPQ+IVF-PQ)
+"""
+
+from typing import Any, Dict
+import logging
+
+import numpy as np
+import faiss
+
+logger = logging.getLogger(__name__)
+
+# Types d'index disponibles (chaînes pour faiss.index_factory)
+INDEX_FACTORY_STRINGS = {
+    'flat': "Flat",
+    'ivf_flat': "IVF{nlist},Flat",
+    'hnsw': "HNSW{hnsw_m},Flat",
+    'ivf_pq': "IVF{nlist},PQ{pq_m}x{pq_nbits}",
+    'opq_ivf_pq': "OPQ{pq_m},IVF{nlist},PQ{pq_m}x{pq_nbits}",
+}
+
+DEFAULT_INDEX_PARAMS = {
+    'nlist': None,          # None : 4 * sqrt(N)
+    'nprobe': 8,
+    'hnsw_m': 32,
+    'ef_construction': 80,
+    'ef_search': 64,
+    'pq_m': 16,
+    'pq_nbits': 8,
+}
+
+
+def unwrap_index(index: faiss.Index) -> faiss.Index:
+    """Index sous-jacent (sans IDMap ni transformation OPQ)"""
+    index = faiss.downcast_index(index)
+    while isinstance(index, (faiss.IndexIDMap, faiss.IndexIDMap2, faiss.IndexPreTransform)):
+        index = faiss.downcast_index(index.index)
+    return index
+
+
+def build_index(embeddings: np.ndarray, index_type: str = 'flat',
+                index_params: Dict[str, Any] = None) -> faiss.Index:
+    """Construit (et entraîne si nécessaire) un index vide en produit scalaire"""
+    if index_type not in INDEX_FACTORY_STRINGS:
+        raise ValueError(f"Type d'index inconnu: {index_type} ({', '.join(INDEX_FACTORY_STRINGS)})")
+
+    n, d = embeddings.shape
+    params = {**DEFAULT_INDEX_PARAMS, **(index_params or {})}
+
+    if params['nlist'] is None:
+        params['nlist'] = max(1, int(4 * np.sqrt(n)))
+    params['nlist'] = min(params['nlist'], max(1, n))
+
+    # PQ : le nombre de sous-quantificateurs doit diviser la dimension
+    pq_m = min(params['pq_m'], d)
+    while d % pq_m:
+        pq_m -= 1
+    params['pq_m'] = pq_m
+
+    # Pas assez de vecteurs pour entraîner les centroïdes : index exact
+    if index_type in ('ivf_pq', 'opq_ivf_pq') and n < 2 ** params['pq_nbits']:
+        logger.warning(f"{n} vecteurs insuffisants pour entraîner {index_type}, utilisation de l'index flat")
+        index_type = 'flat'
+    elif index_type != 'flat' and n == 0:
+        index_type = 'flat'
+
+    factory_string = INDEX_FACTORY_STRINGS[index_type].format(**params)
+    index = faiss.index_factory(d, factory_string, faiss.METRIC_INNER_PRODUCT)
+
+    base = unwrap_index(index)
+    if isinstance(base, faiss.IndexHNSW):
+        base.hnsw.efConstruction = params['ef_construction']
+
+    if not index.is_trained:
+        logger.info(f"Entraînement de l'index {factory_string} sur {n} vecteurs...")
+        index.train(embeddings)
+
+    logger.info(f"Index FAISS: {factory_string}")
+    return index
+
+
+def with_ids(index: faiss.Index) -> faiss.Index:
+    """Ajoute le support des identifiants explicites à un index vide
+
+    Les index IVF stockent nativement les identifiants (et IDMap ne gère pas
+    correctement remove_ids sur IVF) ; les autres sont enveloppés dans IDMap2.
+    """
+    if isinstance(unwrap_index(index), faiss.IndexIVF):
+        enable_reconstruction(index)
+        return index
+    return faiss.IndexIDMap2(index)
+
+
+def enable_reconstruction(index: faiss.Index) -> None:
+    """Permet `reconstruct(id)` sur un index IVF (table identifiant -> liste, sauvegardée avec l'index)
+
+    Vecteur exact pour IVF-Flat, approché (décodé) pour PQ. Les autres index
+    reconstruisent déjà leurs vecteurs.
+    """
+    base = unwrap_index(index)
+    if isinstance(base, faiss.IndexIVF) and base.direct_map.type != faiss.DirectMap.Hashtable:
+        base.set_direct_map_type(faiss.DirectMap.Hashtable)
+
+
+def apply_search_params(index: faiss.Index, index_params: Dict[str, Any]) -> None:
+    """Règle le compromis rappel/latence (nprobe pour IVF, efSearch pour HNSW)"""
+    base = unwrap_index(index)
+    if isinstance(base, faiss.IndexIVF):
+        base.nprobe = min(index_params.get('nprobe', DEFAULT_INDEX_PARAMS['nprobe']), base.nlist)
+    elif isinstance(base, faiss.IndexHNSW):
+        base.hnsw.efSearch = index_params.get('ef_search', DEFAULT_INDEX_PARAMS['ef_search'])
+
+
+def supports_removal(index: faiss.Index) -> bool:
+    """HNSW ne permet pas de retirer des vecteurs"""
+    return not isinstance(unwrap_index(index), faiss.IndexHNSW)
+
+
+def search_parameters(index: faiss.Index, index_params: Dict[str, Any],
+                      selector: faiss.IDSelector) -> faiss.SearchParameters:
+    """Paramètres de recherche avec filtre d'identifiants
+
+    Des paramètres explicites remplacent ceux de l'index : nprobe et efSearch
+    sont repris de index_params.
+    """
+    base = unwrap_index(index)
+    if isinstance(base, faiss.IndexIVF):
+        return faiss.SearchParametersIVF(
+            sel=selector, nprobe=min(index_params.get('nprobe', DEFAULT_INDEX_PARAMS['nprobe']), base.nlist))
+    if isinstance(base, faiss.IndexHNSW):
+        return faiss.SearchParametersHNSW(
+            sel=selector, efSearch=index_params.get('ef_search', DEFAULT_INDEX_PARAMS['ef_search']))
+    return faiss.SearchParameters(sel=selector)
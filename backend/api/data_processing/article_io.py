@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Lecture et écriture en flux des articles de diagnostic du chatbot Goo-net Pit
+JSON Lines, éventuellement compressé (gzip, zstd), traité article par article
+"""
+
+import gzip
+import io
+import json
+import os
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, Optional
+import logging
+
+# Compression zstd (optionnelle) : sans zstandard, seuls gzip et le texte brut sont lus
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+# Suffixe de fichier par compression
+COMPRESSION_SUFFIXES = {'none': '', 'gzip': '.gz', 'zstd': '.zst'}
+
+# Fichiers d'articles recherchés, par ordre de préférence
+ARTICLE_FILE_NAMES = (
+    'diagnostic_articles.jsonl.zst',
+    'diagnostic_articles.jsonl.gz',
+    'diagnostic_articles.jsonl',
+    'diagnostic_articles.json',
+)
+
+
+def open_text(path: str, mode: str = 'r'):
+    """Ouvre un fichier texte UTF-8, décompressé/compressé selon son extension"""
+    path = Path(path)
+    if path.suffix == '.gz':
+        return gzip.open(path, mode + 't', encoding='utf-8')
+    if path.suffix == '.zst':
+        if zstandard is None:
+            raise ImportError(f"Le module zstandard est requis pour {path} (pip install zstandard)")
+        raw = open(path, mode + 'b')
+        if 'r' in mode:
+            stream = zstandard.ZstdDecompressor().stream_reader(raw, closefd=True)
+        else:
+            stream = zstandard.ZstdCompressor().stream_writer(raw, closefd=True)
+        return io.TextIOWrapper(stream, encoding='utf-8')
+    return open(path, mode, encoding='utf-8')
+
+
+def is_jsonl(path: str) -> bool:
+    """True pour .jsonl, .jsonl.gz, .jsonl.zst"""
+    suffixes = Path(path).suffixes
+    return '.jsonl' in suffixes[-2:]
+
+
+def write_jsonl(path: str, records: Iterable[Dict[str, Any]]) -> int:
+    """Écrit un enregistrement JSON par ligne ; retourne le nombre d'enregistrements
+
+    Le fichier est écrit sous un nom temporaire puis renommé : un lecteur ne voit
+    jamais un fichier à moitié écrit.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # Le suffixe de compression reste en dernier pour open_text
+    tmp_path = path.with_name(f".{path.name}.tmp{''.join(path.suffixes[-1:])}")
+
+    count = 0
+    with open_text(str(tmp_path), 'w') as f:
+        for record in records:
+            f.write(json.dumps(record, ensure_ascii=False))
+            f.write('\n')
+            count += 1
+    os.replace(tmp_path, path)
+    return count
+
+
+def iter_jsonl(path: str) -> Iterator[Dict[str, Any]]:
+    """Enregistrements d'un fichier JSON Lines, un à la fois"""
+    with open_text(path, 'r') as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"{path}:{line_number}: JSON invalide ({e})") from e
+
+
+def iter_articles(path: str) -> Iterator[Dict[str, Any]]:
+    """Articles d'un fichier JSON Lines (en flux) ou d'un tableau JSON (chargé en entier)"""
+    if is_jsonl(path):
+        yield from iter_jsonl(path)
+        return
+    with open_text(path, 'r') as f:
+        yield from json.load(f)
+
+
+def find_articles_file(directory: str) -> Optional[Path]:
+    """Premier fichier d'articles présent dans `directory` (voir ARTICLE_FILE_NAMES)"""
+    for name in ARTICLE_FILE_NAMES:
+        candidate = Path(directory) / name
+        if candidate.exists():
+            return candidate
+    return None
+
+
+class ArticleStream:
+    """Articles d'un fichier JSON Lines, relus depuis le disque à chaque itération
+
+    N'a ni longueur ni accès par position : `GoonetVectorSearch.create_embeddings`
+    le parcourt une fois et range les articles dans un fichier projeté en mémoire.
+    """
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        return iter_jsonl(str(self.path))
+
+    def __repr__(self) -> str:
+        return f"ArticleStream({self.path})"
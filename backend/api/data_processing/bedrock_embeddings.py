@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Client d'embeddings AWS Bedrock (Titan) pour la construction d'index
+Requêtes concurrentes, limitation de débit, retries avec jitter et checkpoint
+"""
+
+import json
+import random
+import threading
+import time
+import hashlib
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Codes d'erreur Bedrock pour lesquels une nouvelle tentative a du sens
+RETRYABLE_ERROR_CODES = {
+    'ThrottlingException',
+    'TooManyRequestsException',
+    'ServiceUnavailableException',
+    'ModelNotReadyException',
+    'InternalServerException',
+    'ModelTimeoutException',
+}
+
+
+class TokenBucket:
+    """Limiteur de débit thread-safe (seau à jetons)"""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1.0)
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: float = 1.0) -> None:
+        """Bloque jusqu'à ce que `tokens` jetons soient disponibles"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+
+                wait = (tokens - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+def _error_code(error: Exception) -> Optional[str]:
+    """Code d'erreur AWS (botocore ClientError) s'il existe"""
+    response = getattr(error, 'response', None)
+    if isinstance(response, dict):
+        return response.get('Error', {}).get('Code')
+    return None
+
+
+def _is_retryable(error: Exception) -> bool:
+    """Détermine si une erreur Bedrock est transitoire"""
+    if _error_code(error) in RETRYABLE_ERROR_CODES:
+        return True
+    # Erreurs réseau de botocore (EndpointConnectionError, ReadTimeoutError...)
+    return type(error).__name__ in ('EndpointConnectionError', 'ReadTimeoutError',
+                                    'ConnectTimeoutError', 'ConnectionClosedError')
+
+
+class BedrockEmbeddingClient:
+    """Génère des embeddings Titan en parallèle via `invoke_model`
+
+    `client` est n'importe quel objet exposant `invoke_model(modelId=..., body=...)`
+    (client boto3 `bedrock-runtime` ou stub local pour les tests).
+    """
+
+    def __init__(self,
+                 client: Any,
+                 model_id: str = "amazon.titan-embed-text-v1",
+                 max_concurrency: int = 8,
+                 requests_per_second: float = 10.0,
+                 max_retries: int = 6,
+                 base_delay: float = 0.5,
+                 max_delay: float = 20.0,
+                 checkpoint_path: Optional[str] = None,
+                 checkpoint_every: int = 100,
+                 dimensions: Optional[int] = None):
+        self.client = client
+        self.model_id = model_id
+        # Taille des vecteurs demandée au modèle (Titan v2) ; None : taille par défaut
+        self.dimensions = dimensions
+        self.max_concurrency = max_concurrency
+        self.rate_limiter = TokenBucket(requests_per_second)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.checkpoint_path = Path(checkpoint_path) if checkpoint_path else None
+        self.checkpoint_every = checkpoint_every
+        self._checkpoint_lock = threading.Lock()
+        # Embeddings du checkpoint, relus une fois par construction (voir clear_checkpoint)
+        self._checkpointed: Optional[Dict[str, np.ndarray]] = None
+
+    @property
+    def model_key(self) -> str:
+        """Modèle et dimension : deux configurations ne partagent ni checkpoint ni cache"""
+        return f"{self.model_id}:{self.dimensions}" if self.dimensions else self.model_id
+
+    def _invoke(self, text: str) -> np.ndarray:
+        """Un appel `invoke_model` (sans retry)"""
+        body = {"inputText": text}
+        if self.dimensions:
+            body["dimensions"] = self.dimensions
+        response = self.client.invoke_model(
+            modelId=self.model_id,
+            body=json.dumps(body),
+            contentType="application/json",
+            accept="application/json"
+        )
+        response_body = json.loads(response['body'].read())
+        return np.array(response_body['embedding'], dtype=np.float32)
+
+    def embed(self, text: str) -> np.ndarray:
+        """Embedding d'un texte avec limitation de débit et backoff exponentiel"""
+        attempt = 0
+        while True:
+            self.rate_limiter.acquire()
+            try:
+                return self._invoke(text)
+            except Exception as e:
+                if attempt >= self.max_retries or not _is_retryable(e):
+                    raise
+                # Backoff exponentiel avec "full jitter"
+                delay = random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+                logger.warning(f"Bedrock {_error_code(e) or type(e).__name__}, "
+                               f"nouvelle tentative dans {delay:.2f}s ({attempt + 1}/{self.max_retries})")
+                time.sleep(delay)
+                attempt += 1
+
+    def _text_key(self, text: str) -> str:
+        """Clé de checkpoint : modèle, dimension et texte"""
+        return hashlib.sha1(f"{self.model_key}\n{text}".encode('utf-8')).hexdigest()
+
+    def _load_checkpoint(self) -> Dict[str, np.ndarray]:
+        """Recharge les embeddings déjà calculés lors d'une exécution interrompue"""
+        if self._checkpointed is not None:
+            return self._checkpointed
+        done = {}
+        if self.checkpoint_path and self.checkpoint_path.exists():
+            with open(self.checkpoint_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        # Dernière ligne tronquée par un arrêt brutal
+                        continue
+                    embedding = np.array(entry['embedding'], dtype=np.float32)
+                    if self.dimensions and len(embedding) != self.dimensions:
+                        continue
+                    done[entry['key']] = embedding
+            logger.info(f"Checkpoint repris: {len(done)} embeddings depuis {self.checkpoint_path}")
+        self._checkpointed = done
+        return done
+
+    def clear_checkpoint(self) -> None:
+        """Supprime le checkpoint une fois tous les lots écrits (fin de construction)"""
+        with self._checkpoint_lock:
+            self._checkpointed = None
+            if self.checkpoint_path and self.checkpoint_path.exists():
+                self.checkpoint_path.unlink()
+
+    def _write_checkpoint(self, entries: List[Dict[str, Any]]) -> None:
+        if not self.checkpoint_path or not entries:
+            return
+        with self._checkpoint_lock:
+            self.checkpoint_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.checkpoint_path, 'a', encoding='utf-8') as f:
+                for entry in entries:
+                    f.write(json.dumps(entry) + '\n')
+
+    def embed_many(self, texts: List[str], checkpoint: bool = False) -> np.ndarray:
+        """Embeddings d'une liste de textes, dans l'ordre, avec requêtes concurrentes
+
+        `checkpoint` (construction d'index uniquement) : reprise depuis le
+        checkpoint et ajout des nouveaux embeddings, conservé entre les appels
+        (un par lot d'articles) ; l'appelant le supprime avec clear_checkpoint()
+        après le dernier lot. Sans checkpoint (requêtes), aucun état n'est gardé.
+        """
+        done = self._load_checkpoint() if checkpoint else {}
+        keys = [self._text_key(text) for text in texts]
+
+        # Un seul appel par texte distinct restant à calculer
+        pending = {}
+        for key, text in zip(keys, texts):
+            if key not in done and key not in pending:
+                pending[key] = text
+
+        if pending:
+            logger.info(f"Embeddings Bedrock: {len(pending)} requêtes "
+                        f"(concurrence {self.max_concurrency}, {len(done)} en checkpoint)")
+
+        buffer = []
+        error = None
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+            futures = {executor.submit(self.embed, text): key for key, text in pending.items()}
+            for future in as_completed(futures):
+                key = futures[future]
+                try:
+                    embedding = future.result()
+                except Exception as e:
+                    if error is None:
+                        error = e
+                        # Inutile de lancer les requêtes pas encore démarrées
+                        for other in futures:
+                            other.cancel()
+                    continue
+
+                done[key] = embedding
+                if not checkpoint:
+                    continue
+                buffer.append({'key': key, 'embedding': embedding.tolist()})
+                if len(buffer) >= self.checkpoint_every:
+                    self._write_checkpoint(buffer)
+                    buffer = []
+
+        self._write_checkpoint(buffer)
+
+        if error is not None:
+            distinct = set(keys)
+            logger.error(f"Échec des embeddings Bedrock ({len(distinct & done.keys())}/{len(distinct)} calculés): {error}")
+            raise error
+
+        return np.array([done[key] for key in keys], dtype=np.float32)
@@ -6,16 +6,50 @@ Utilise AWS Bedrock avec Claude Sonnet 3.5 et la recherche vectorielle
 """
 
 import json
-import re
+import asyncio
+import time
 import boto3
-from typing import Dict, List, Any, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Any, Iterator, Optional, Tuple
 import logging
 from datetime import datetime
 from dataclasses import dataclass, asdict
-from .vector_search import GoonetVectorSearch
+
+try:
+    from .vector_search import GoonetVectorSearch
+    from .claude_stream import iter_claude_stream_text, fake_claude_stream_events
+    from .stage_graph import Stage, StageGraph, StageRun
+    from .metrics import OBD_FAST_PATH, SEARCH_FILTER, STAGE_LATENCY, observe_stage_run, record_llm_usage
+    from .conversation_log import ConversationLogWriter, create_log_sink
+    from .entity_extractor import EntityExtractor
+    from .facet_index import SearchFilter
+except ImportError:
+    from vector_search import GoonetVectorSearch
+    from claude_stream import iter_claude_stream_text, fake_claude_stream_events
+    from stage_graph import Stage, StageGraph, StageRun
+    from metrics import OBD_FAST_PATH, SEARCH_FILTER, STAGE_LATENCY, observe_stage_run, record_llm_usage
+    from conversation_log import ConversationLogWriter, create_log_sink
+    from entity_extractor import EntityExtractor
+    from facet_index import SearchFilter
+
+# Client Bedrock asynchrone (optionnel) : sans aioboto3, l'appel boto3 bloquant
+# est exécuté dans un thread
+try:
+    import aioboto3
+except ImportError:
+    aioboto3 = None
 
 logger = logging.getLogger(__name__)
 
+CLAUDE_MODEL_ID = "anthropic.claude-3-5-sonnet-20241022-v2:0"
+
+# Délai maximal (secondes) des étapes de process_message ; au-delà, repli
+DEFAULT_STAGE_TIMEOUTS = {
+    'search_results': 5.0,
+    'recommended_garages': 2.0,
+    'response': 25.0,
+}
+
 @dataclass
 class UserMessage:
     """Structure d'un message utilisateur"""
@@ -36,9 +70,25 @@ class ChatResponse:
 class GoonetChatEngine:
     """Moteur de chat intelligent pour Goo-net Pit"""
     
-    def __init__(self, use_bedrock: bool = True):
+    def __init__(self,
+                 use_bedrock: bool = True,
+                 search_options: Optional[Dict[str, Any]] = None,
+                 stage_timeouts: Optional[Dict[str, float]] = None,
+                 stage_workers: int = 8,
+                 conversation_log_path: str = "data/logs/conversations.jsonl",
+                 conversation_log_options: Optional[Dict[str, Any]] = None,
+                 entity_dictionary_dir: Optional[str] = None,
+                 obd_fast_path_min_hits: Optional[int] = 1,
+                 entity_filters: bool = True):
         self.use_bedrock = use_bedrock
-        self.search_engine = GoonetVectorSearch(use_bedrock=use_bedrock)
+        # Articles citant le code OBD du message à partir desquels la recherche
+        # vectorielle est évitée (None : toujours la recherche complète)
+        self.obd_fast_path_min_hits = obd_fast_path_min_hits
+        # Constructeur, modèle et année du message appliqués comme filtres de recherche
+        self.entity_filters = entity_filters
+        self.stage_timeouts = {**DEFAULT_STAGE_TIMEOUTS, **(stage_timeouts or {})}
+        # search_options : paramètres supplémentaires de GoonetVectorSearch (type d'index, etc.)
+        self.search_engine = GoonetVectorSearch(use_bedrock=use_bedrock, **(search_options or {}))
         
         # Initialisation du client Bedrock
         if use_bedrock:
@@ -49,28 +99,38 @@ class GoonetChatEngine:
                 logger.error(f"Erreur d'initialisation Bedrock: {e}")
                 self.use_bedrock = False
         
+        # Journal unique des conversations (.jsonl ou .sqlite), écrit depuis un thread dédié
+        # conversation_log_options : taille de file, politique de perte, etc.
+        self.conversation_log = ConversationLogWriter(create_log_sink(conversation_log_path),
+                                                      **(conversation_log_options or {}))
+        
+        # Client aioboto3, créé au premier appel asynchrone (voir acall_claude_bedrock)
+        self._async_bedrock_context = None
+        self._async_bedrock_client = None
+        
         # Chargement des données et index
         self._initialize_search_engine()
         
-        # Patterns pour l'extraction d'entités
-        self.entity_patterns = {
-            'manufacturer': r'(ホンダ|トヨタ|日産|マツダ|スバル|ダイハツ|スズキ|ミツビシ)',
-            'model': r'(N-BOX|プリウス|セレナ|フィット|アクア|ノート|デミオ|CX-5|インプレッサ|フォレスター)',
-            'year': r'(\d{4})年?',
-            'obd_code': r'([PCBU][0-9A-F]{4}(?:-[0-9A-F]{1,2})?)',
-            'symptoms': r'(警告灯|エアコン|ハンドル|エンジン|ブレーキ|異音|振動|効かない|重い|不調)',
-            'location': r'(東京|大阪|名古屋|札幌|福岡|仙台|広島|神奈川|千葉|埼玉|北海道|青森|岩手|宮城|秋田|山形|福島|茨城|栃木|群馬|新潟|富山|石川|福井|山梨|長野|岐阜|静岡|愛知|三重|滋賀|京都|兵庫|奈良|和歌山|鳥取|島根|岡山|山口|徳島|香川|愛媛|高知|佐賀|長崎|熊本|大分|宮崎|鹿児島|沖縄)'
-        }
+        # Étapes de process_message, exécutées en parallèle quand elles sont indépendantes
+        self._stage_executor = ThreadPoolExecutor(max_workers=stage_workers, thread_name_prefix='goonet-stage')
+        self._message_graph = self._build_message_graph(self._generate_response)
+        self._amessage_graph = self._build_message_graph(
+            self._agenerate_response if aioboto3 is not None else self._generate_response
+        )
+        self._details_graph = self._build_message_graph()
+        
+        # Extraction d'entités en une passe (dictionnaires dans entity_dictionary_dir)
+        self.entity_extractor = EntityExtractor.from_directory(entity_dictionary_dir)
     
     def _initialize_search_engine(self):
         """Moteur de recherche et données"""
         try:
-            # Chargement des données
-            self.search_engine.load_data()
+            self.search_engine.load_garages()
             
-            # Tentative de chargement de l'index existant
+            # Tentative de chargement de l'index existant (articles inclus)
             if not self.search_engine.load_index():
                 logger.info("Création d'un nouvel index FAISS")
+                self.search_engine.load_articles()
                 self.search_engine.create_embeddings()
                 self.search_engine.save_index()
             else:
@@ -81,51 +141,157 @@ class GoonetChatEngine:
             raise e
     
     def extract_entities(self, text: str) -> Dict[str, Any]:
-        """Extraction d'entités depuis le texte utilisateur"""
-        entities = {}
+        """Extraction d'entités depuis le texte utilisateur
         
-        for entity_type, pattern in self.entity_patterns.items():
-            matches = re.findall(pattern, text)
-            if matches:
-                if entity_type == 'year':
-                    entities[entity_type] = int(matches[0])
-                elif entity_type in ['symptoms']:
-                    entities[entity_type] = matches  # Garde tous les symptômes
-                else:
-                    entities[entity_type] = matches[0]  # Premier match pour les autres
-        
-        return entities
+        Constructeur, modèle, lieu : première occurrence ; symptômes : toutes ;
+        année et code OBD : premier trouvé
+        """
+        return self.entity_extractor.extract(text)
+    
+    def search_similar_cases(self, user_message: str, entities: Dict[str, Any],
+                             k: int = 5) -> List[Dict[str, Any]]:
+        """類似事例の検索
+        
+        Constructeur, modèle et année extraits du message filtrent la recherche ;
+        sans résultat, le filtre est relâché (constructeur seul, puis aucun).
+        Message avec un code OBD connu de l'index des codes : les articles qui le
+        citent, sans embedding ni FAISS. Sinon, recherche hybride complète.
+        """
+        filters = self._entity_filters(entities)
+        
+        obd_code = entities.get('obd_code')
+        if obd_code and self.obd_fast_path_min_hits is not None:
+            for level, search_filter in filters:
+                results = self.search_engine.find_by_obd_code(obd_code, k=k, filters=search_filter)
+                if len(results) >= self.obd_fast_path_min_hits:
+                    OBD_FAST_PATH.labels('hit').inc()
+                    SEARCH_FILTER.labels(level).inc()
+                    return results
+            OBD_FAST_PATH.labels('miss').inc()
+        
+        for level, search_filter in filters:
+            results = self.search_engine.search(user_message, k=k, min_similarity=0.3, filters=search_filter)
+            if results:
+                break
+        SEARCH_FILTER.labels(level).inc()
+        return results
+    
+    def _entity_filters(self, entities: Dict[str, Any]) -> List[Tuple[str, Optional[SearchFilter]]]:
+        """(niveau, filtre) essayés dans l'ordre : entités du message, constructeur seul, aucun"""
+        if not self.entity_filters:
+            return [('none', None)]
+        candidates = [('entities', SearchFilter.from_entities(entities)),
+                      ('manufacturer', SearchFilter(vehicle_manufacturer=entities.get('manufacturer')))]
+        filters, seen = [], set()
+        for level, search_filter in candidates:
+            if not search_filter.is_empty() and search_filter not in seen:
+                seen.add(search_filter)
+                filters.append((level, search_filter))
+        return filters + [('none', None)]
+    
+    def _build_claude_request(self, prompt: str, max_tokens: int = 2000) -> str:
+        """Corps de la requête Bedrock pour Claude"""
+        return json.dumps({
+            "anthropic_version": "bedrock-2023-05-31",
+            "max_tokens": max_tokens,
+            "messages": [
+                {
+                    "role": "user",
+                    "content": prompt
+                }
+            ],
+            "temperature": 0.3,
+            "top_p": 0.9
+        })
     
     def call_claude_bedrock(self, prompt: str, max_tokens: int = 2000) -> str:
         """Appel à Claude Sonnet 3.5 via AWS Bedrock"""
         try:
-            body = json.dumps({
-                "anthropic_version": "bedrock-2023-05-31",
-                "max_tokens": max_tokens,
-                "messages": [
-                    {
-                        "role": "user",
-                        "content": prompt
-                    }
-                ],
-                "temperature": 0.3,
-                "top_p": 0.9
-            })
+            with STAGE_LATENCY.labels('bedrock').time():
+                response = self.bedrock_client.invoke_model(
+                    modelId=CLAUDE_MODEL_ID,
+                    body=self._build_claude_request(prompt, max_tokens),
+                    contentType="application/json",
+                    accept="application/json"
+                )
+                
+                response_body = json.loads(response['body'].read())
+            record_llm_usage(response_body.get('usage'))
+            return response_body['content'][0]['text']
             
-            response = self.bedrock_client.invoke_model(
-                modelId="anthropic.claude-3-5-sonnet-20241022-v2:0",
-                body=body,
+        except Exception as e:
+            logger.error(f"Erreur lors de l'appel à Claude: {e}")
+            return self._generate_fallback_response("", {}, [])
+    
+    def stream_claude_bedrock(self, prompt: str, max_tokens: int = 2000) -> Iterator[str]:
+        """Appel en flux à Claude : fragments de texte au fil de la génération"""
+        emitted = False
+        usage = {}
+        started = time.perf_counter()
+        try:
+            response = self.bedrock_client.invoke_model_with_response_stream(
+                modelId=CLAUDE_MODEL_ID,
+                body=self._build_claude_request(prompt, max_tokens),
                 contentType="application/json",
                 accept="application/json"
             )
             
-            response_body = json.loads(response['body'].read())
+            for text in iter_claude_stream_text(response['body'], usage):
+                if not emitted:
+                    STAGE_LATENCY.labels('bedrock_first_token').observe(time.perf_counter() - started)
+                emitted = True
+                yield text
+            
+            STAGE_LATENCY.labels('bedrock').observe(time.perf_counter() - started)
+            record_llm_usage(usage)
+                
+        except Exception as e:
+            logger.error(f"Erreur lors de l'appel en flux à Claude: {e}")
+            # Réponse de secours uniquement si rien n'a encore été envoyé
+            if not emitted:
+                yield self._generate_fallback_response("", {}, [])
+    
+    async def _get_async_bedrock_client(self):
+        """Client aioboto3 partagé, ouvert au premier appel"""
+        if self._async_bedrock_client is None:
+            session = aioboto3.Session()
+            self._async_bedrock_context = session.client('bedrock-runtime', region_name='us-east-1')
+            self._async_bedrock_client = await self._async_bedrock_context.__aenter__()
+        return self._async_bedrock_client
+    
+    async def acall_claude_bedrock(self, prompt: str, max_tokens: int = 2000, executor=None) -> str:
+        """Appel non bloquant à Claude (aioboto3, sinon boto3 dans un thread)"""
+        if aioboto3 is None:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(executor, self.call_claude_bedrock, prompt, max_tokens)
+        
+        try:
+            client = await self._get_async_bedrock_client()
+            with STAGE_LATENCY.labels('bedrock').time():
+                response = await client.invoke_model(
+                    modelId=CLAUDE_MODEL_ID,
+                    body=self._build_claude_request(prompt, max_tokens),
+                    contentType="application/json",
+                    accept="application/json"
+                )
+                
+                response_body = json.loads(await response['body'].read())
+            record_llm_usage(response_body.get('usage'))
             return response_body['content'][0]['text']
             
         except Exception as e:
             logger.error(f"Erreur lors de l'appel à Claude: {e}")
             return self._generate_fallback_response("", {}, [])
     
+    async def aclose(self) -> None:
+        """Ferme le client Bedrock asynchrone, le pool d'étapes et le journal"""
+        if self._async_bedrock_client is not None:
+            await self._async_bedrock_context.__aexit__(None, None, None)
+            self._async_bedrock_context = None
+            self._async_bedrock_client = None
+        self._stage_executor.shutdown(wait=False)
+        self.conversation_log.close()
+    
     def _generate_fallback_response(self, user_message: str = "", entities: Dict[str, Any] = None, search_results: List[Dict[str, Any]] = None) -> str:
         """Réponse de fallback intelligente basée sur les données locales"""
         if not entities:
@@ -264,55 +430,157 @@ class GoonetChatEngine:
         
         return prompt
     
-    def process_message(self, user_message: str, session_id: str = "default") -> Dict[str, Any]:
-        """ユーザーメッセージを処理して回答を生成"""
-        
-        # 1. エンティティ抽出
-        entities = self.extract_entities(user_message)
-        logger.info(f"抽出されたエンティティ: {entities}")
-        
-        # 2. 類似事例の検索
-        search_results = self.search_engine.search(user_message, k=5, min_similarity=0.3)
-        logger.info(f"検索結果: {len(search_results)}件")
-        
-        # 3. Claude用プロンプト作成
-        prompt = self.create_diagnostic_prompt(user_message, entities, search_results)
-        
-        # 4. Claude Sonnet 3.5による回答生成
+    def _build_message_graph(self, response_func=None) -> StageGraph:
+        """Graphe des étapes de process_message (sans génération si response_func est None)
+        
+        Les étapes sans dépendance mutuelle (recherche et garages, puis questions et
+        génération du texte) s'exécutent en parallèle. La recherche attend
+        l'extraction d'entités (une passe sur le message) pour le code OBD.
+        """
+        timeouts = self.stage_timeouts
+        stages = [
+            # 1. エンティティ抽出
+            Stage('entities', lambda user_message: self.extract_entities(user_message),
+                  ('user_message',)),
+            # 2. 類似事例の検索（故障コードがあればコード索引を優先）
+            Stage('search_results', self.search_similar_cases,
+                  ('user_message', 'entities'), timeout=timeouts.get('search_results'),
+                  fallback=lambda user_message, entities: []),
+            # 3. Claude用プロンプト作成
+            Stage('prompt', self.create_diagnostic_prompt,
+                  ('user_message', 'entities', 'search_results')),
+            # 5. ガレージ推奨の生成
+            Stage('recommended_garages', self._get_garage_recommendations, ('entities',),
+                  timeout=timeouts.get('recommended_garages'), fallback=lambda entities: []),
+            # 6. 信頼度の計算
+            Stage('confidence', self._calculate_confidence, ('search_results', 'entities')),
+            # 7. 予約フォームの生成
+            Stage('appointment_form',
+                  lambda entities, recommended_garages: self._generate_appointment_form(entities, recommended_garages),
+                  ('entities', 'recommended_garages')),
+            # 8. フォローアップ質問の生成
+            Stage('follow_up_questions', self._generate_follow_up_questions,
+                  ('entities', 'search_results')),
+        ]
+        if response_func is not None:
+            # 4. Claude Sonnet 3.5による回答生成（期限超過時は定型回答）
+            stages.append(Stage('response', response_func,
+                                ('user_message', 'entities', 'search_results', 'prompt'),
+                                timeout=timeouts.get('response'),
+                                fallback=self._fallback_stage_response))
+        return StageGraph(stages, inputs=('user_message',))
+    
+    def _generate_response(self, user_message: str, entities: Dict[str, Any],
+                           search_results: List[Dict[str, Any]], prompt: str) -> str:
         if self.use_bedrock:
-            response_text = self.call_claude_bedrock(prompt)
-        else:
-            response_text = self._generate_fallback_response(user_message, entities, search_results)
-        
-        # 5. ガレージ推奨の生成
-        garage_recommendations = self._get_garage_recommendations(entities)
-        
-        # 6. 信頼度の計算
-        confidence = self._calculate_confidence(search_results, entities)
-        
-        # 7. 予約フォームの生成
-        appointment_form = self._generate_appointment_form(entities, garage_recommendations)
+            return self.call_claude_bedrock(prompt)
+        return self._generate_fallback_response(user_message, entities, search_results)
+    
+    async def _agenerate_response(self, user_message: str, entities: Dict[str, Any],
+                                  search_results: List[Dict[str, Any]], prompt: str) -> str:
+        if self.use_bedrock:
+            return await self.acall_claude_bedrock(prompt)
+        return self._generate_fallback_response(user_message, entities, search_results)
+    
+    def _fallback_stage_response(self, user_message: str, entities: Dict[str, Any],
+                                 search_results: List[Dict[str, Any]], prompt: str) -> str:
+        return self._generate_fallback_response(user_message, entities, search_results)
+    
+    def process_message(self, user_message: str, session_id: str = "default",
+                        log_context: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """ユーザーメッセージを処理して回答を生成
+        
+        log_context : champs ajoutés à l'entrée du journal (response_id, user_info, ...)
+        """
+        run = self._message_graph.run(self._stage_executor, {'user_message': user_message})
+        observe_stage_run(run)
+        return self._finalize_response(user_message, session_id, run, log_context)
+    
+    async def aprocess_message(self, user_message: str, session_id: str = "default", executor=None,
+                               log_context: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """process_message non bloquant : étapes dans `executor`, appel Claude asynchrone"""
+        run = await self._amessage_graph.arun({'user_message': user_message}, executor=executor)
+        observe_stage_run(run)
+        return self._finalize_response(user_message, session_id, run, log_context)
+    
+    def _response_details(self, run: StageRun) -> Dict[str, Any]:
+        """回答以外の要素（ガレージ・信頼度・予約フォーム・質問）"""
+        results = run.results
+        logger.info(f"抽出されたエンティティ: {results['entities']}")
+        logger.info(f"検索結果: {len(results['search_results'])}件")
+        logger.debug(f"Durées des étapes: {run.durations} (statuts: {run.statuses})")
         
-        # 8. フォローアップ質問の生成
-        follow_up_questions = self._generate_follow_up_questions(entities, search_results)
+        return {
+            'confidence': results['confidence'],
+            'sources': [{'article_id': r['article']['article_id'], 
+                        'similarity': r['similarity'],
+                        'retrieval': r.get('retrieval'),
+                        'title': f"{r['article']['vehicle_info']['manufacturer']} {r['article']['vehicle_info']['model']} - {r['article']['summary'][:50]}..."}
+                       for r in results['search_results'][:3]],
+            'recommended_garages': results['recommended_garages'],
+            'appointment_form': results['appointment_form'],
+            'follow_up_questions': results['follow_up_questions'],
+            'entities': results['entities']
+        }
+    
+    def _finalize_response(self, user_message: str, session_id: str, run: StageRun,
+                           log_context: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """回答と付随要素をまとめて返す"""
+        response_text = run.results['response']
+        details = self._response_details(run)
         
         # 9. Logging de la conversation
-        self.log_conversation(session_id, user_message, response_text)
+        self.log_conversation(session_id, user_message, response_text,
+                              self._log_details(details, log_context))
         
         return {
             'response': response_text,
-            'confidence': confidence,
-            'sources': [{'article_id': r['article']['article_id'], 
-                        'similarity': r['score'],
-                        'title': f"{r['article']['vehicle_info']['manufacturer']} {r['article']['vehicle_info']['model']} - {r['article']['summary'][:50]}..."}
-                       for r in search_results[:3]],
-            'recommended_garages': garage_recommendations,
-            'appointment_form': appointment_form,
-            'follow_up_questions': follow_up_questions,
-            'entities': entities,
+            **details,
             'session_id': session_id
         }
     
+    @staticmethod
+    def _log_details(details: Dict[str, Any], log_context: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        return {
+            'confidence': details['confidence'],
+            'sources': [source['article_id'] for source in details['sources']],
+            'entities': details['entities'],
+            **(log_context or {})
+        }
+    
+    def stream_message(self, user_message: str, session_id: str = "default",
+                       log_context: Optional[Dict[str, Any]] = None) -> Iterator[Dict[str, Any]]:
+        """process_message en flux : événements {'event': ..., 'data': ...}
+        
+        1. 'metadata' : sources, garages, formulaire de rendez-vous (avant la génération)
+        2. 'token'    : fragments du texte généré par Claude
+        3. 'done'     : texte complet
+        """
+        run = self._details_graph.run(self._stage_executor, {'user_message': user_message})
+        observe_stage_run(run)
+        results = run.results
+        details = self._response_details(run)
+        
+        yield {'event': 'metadata', 'data': {**details, 'session_id': session_id}}
+        
+        if self.use_bedrock:
+            text_stream = self.stream_claude_bedrock(results['prompt'])
+        else:
+            # Sans Bedrock, la réponse de secours passe par un flux simulé au même format
+            fallback = self._generate_fallback_response(user_message, results['entities'], results['search_results'])
+            text_stream = iter_claude_stream_text(fake_claude_stream_events(fallback))
+        
+        fragments = []
+        for text in text_stream:
+            fragments.append(text)
+            yield {'event': 'token', 'data': {'text': text}}
+        
+        response_text = ''.join(fragments)
+        self.log_conversation(session_id, user_message, response_text,
+                              self._log_details(details, log_context))
+        
+        yield {'event': 'done', 'data': {'response': response_text, 'session_id': session_id}}
+    
     def _get_garage_recommendations(self, entities: Dict[str, Any]) -> List[Dict[str, Any]]:
         """ガレージの推奨を生成"""
         manufacturer = entities.get('manufacturer')
@@ -366,25 +634,17 @@ class GoonetChatEngine:
             
         return base_questions[:3]
     
-    def log_conversation(self, session_id: str, user_message: str, bot_response: str):
-        """Journalise la conversation"""
-        try:
-            import json
-            import os
-            from datetime import datetime
-            
-            log_entry = {
+    def log_conversation(self, session_id: str, user_message: str, bot_response: str,
+                         details: Optional[Dict[str, Any]] = None):
+        """Journalise la conversation (ajout à la file du journal, sans E/S)"""
+        with STAGE_LATENCY.labels('logging').time():
+            self.conversation_log.write({
                 "timestamp": datetime.now().isoformat(),
                 "session_id": session_id,
                 "user_message": user_message,
-                "bot_response": bot_response[:200] + "..." if len(bot_response) > 200 else bot_response
-            }
-            
-            os.makedirs('data/logs', exist_ok=True)
-            with open(f'data/logs/conversation_{session_id}.json', 'a', encoding='utf-8') as f:
-                f.write(json.dumps(log_entry, ensure_ascii=False) + '\n')
-        except Exception as e:
-            logger.warning(f"Impossible de journaliser la conversation: {e}")
+                "bot_response": bot_response,
+                **(details or {})
+            })
     
     def _calculate_confidence(self, search_results: List[Dict[str, Any]], entities: Dict[str, Any]) -> float:
         """回答の信頼度を計算"""
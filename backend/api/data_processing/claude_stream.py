@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Flux de réponse Claude (invoke_model_with_response_stream) pour le chatbot Goo-net Pit
+Décodage des événements Bedrock et flux simulé pour le développement local
+"""
+
+import json
+import time
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def iter_claude_stream_text(events: Iterable[Dict[str, Any]],
+                            usage: Optional[Dict[str, int]] = None) -> Iterator[str]:
+    """Fragments de texte d'un flux Bedrock Claude (API Messages)
+
+    `events` est le corps renvoyé par `invoke_model_with_response_stream`
+    (événements `{'chunk': {'bytes': ...}}`) ou tout itérable au même format.
+    Si `usage` est fourni, il reçoit les jetons `input_tokens` / `output_tokens`.
+    """
+    for event in events:
+        if 'chunk' not in event:
+            # Exception transmise dans le flux (throttling, validation, ...)
+            for name, detail in event.items():
+                raise RuntimeError(f"{name}: {detail}")
+            continue
+
+        payload = json.loads(event['chunk']['bytes'])
+        if usage is not None:
+            if payload.get('type') == 'message_start':
+                usage.update(payload.get('message', {}).get('usage', {}))
+            elif payload.get('type') == 'message_delta':
+                usage.update(payload.get('usage', {}))
+
+        if payload.get('type') == 'content_block_delta':
+            delta = payload.get('delta', {})
+            if delta.get('type') == 'text_delta' and delta.get('text'):
+                yield delta['text']
+        elif payload.get('type') == 'message_stop':
+            return
+
+
+def _chunk(payload: Dict[str, Any]) -> Dict[str, Any]:
+    return {'chunk': {'bytes': json.dumps(payload, ensure_ascii=False).encode('utf-8')}}
+
+
+def fake_claude_stream_events(text: str, chunk_size: int = 8, delay: float = 0.0) -> Iterator[Dict[str, Any]]:
+    """Événements au format Bedrock découpant `text` en fragments de `chunk_size` caractères"""
+    pieces: List[str] = [text[i:i + chunk_size] for i in range(0, len(text), chunk_size)]
+
+    yield _chunk({'type': 'message_start', 'message': {'role': 'assistant', 'content': [],
+                                                        'usage': {'input_tokens': 0, 'output_tokens': 0}}})
+    yield _chunk({'type': 'content_block_start', 'index': 0, 'content_block': {'type': 'text', 'text': ''}})
+    for piece in pieces:
+        if delay:
+            time.sleep(delay)
+        yield _chunk({'type': 'content_block_delta', 'index': 0,
+                      'delta': {'type': 'text_delta', 'text': piece}})
+    yield _chunk({'type': 'content_block_stop', 'index': 0})
+    yield _chunk({'type': 'message_delta', 'delta': {'stop_reason': 'end_turn'},
+                  'usage': {'output_tokens': len(pieces)}})
+    yield _chunk({'type': 'message_stop'})
+
+
+class FakeBedrockStreamClient:
+    """Client bedrock-runtime simulé : renvoie `text` en flux, sans appel AWS
+
+    Peut remplacer `GoonetChatEngine.bedrock_client` pour tester `/chat/stream`.
+    """
+
+    def __init__(self, text: str = "テスト応答です。", chunk_size: int = 8, delay: float = 0.0):
+        self.text = text
+        self.chunk_size = chunk_size
+        self.delay = delay
+        self.requests: List[Dict[str, Any]] = []
+
+    def invoke_model_with_response_stream(self, **kwargs) -> Dict[str, Any]:
+        self.requests.append(kwargs)
+        return {
+            'body': fake_claude_stream_events(self.text, self.chunk_size, self.delay),
+            'contentType': 'application/json',
+        }
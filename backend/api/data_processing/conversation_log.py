@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Journal des conversations du chatbot Goo-net Pit
+Un seul point d'écriture : file bornée, thread d'écriture par lots, destination interchangeable
+"""
+
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+import logging
+
+try:
+    from .metrics import LOG_ENTRIES, LOG_QUEUE_DEPTH, STAGE_LATENCY
+except ImportError:
+    from metrics import LOG_ENTRIES, LOG_QUEUE_DEPTH, STAGE_LATENCY
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+# Politique quand la file est pleine
+DROP_POLICIES = ('drop_newest', 'drop_oldest', 'block')
+
+# Longueur maximale des champs texte journalisés (réponse de Claude non bornée)
+DEFAULT_FIELD_LIMITS = {'bot_response': 200}
+
+
+class JsonlFileSink:
+    """Destination JSON Lines en ajout seul, avec rotation `.1`, `.2`, ... au-delà de `max_bytes`"""
+
+    def __init__(self, path: str, max_bytes: int = 64 * 1024 * 1024, backup_count: int = 5):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(self.path, 'a', encoding='utf-8')
+
+    def write_batch(self, entries: List[Dict[str, Any]]) -> None:
+        self._file.write(''.join(json.dumps(entry, ensure_ascii=False, default=str) + '\n'
+                                 for entry in entries))
+        self._file.flush()
+        if self._file.tell() >= self.max_bytes:
+            self._rotate()
+
+    def _rotate(self) -> None:
+        self._file.close()
+        for i in range(self.backup_count - 1, 0, -1):
+            source = self.path.with_name(f"{self.path.name}.{i}")
+            if source.exists():
+                os.replace(source, self.path.with_name(f"{self.path.name}.{i + 1}"))
+        if self.backup_count > 0:
+            os.replace(self.path, self.path.with_name(f"{self.path.name}.1"))
+        else:
+            self.path.unlink()
+        self._file = open(self.path, 'a', encoding='utf-8')
+
+    def close(self) -> None:
+        self._file.close()
+
+    def __repr__(self) -> str:
+        return f"JsonlFileSink({self.path})"
+
+
+class SqliteSink:
+    """Destination SQLite (WAL) : une ligne par entrée, indexée par session"""
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # Utilisée uniquement depuis le thread d'écriture
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS conversations ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " timestamp TEXT,"
+            " session_id TEXT,"
+            " entry TEXT NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS conversations_session ON conversations (session_id)")
+        self._conn.commit()
+
+    def write_batch(self, entries: List[Dict[str, Any]]) -> None:
+        self._conn.executemany(
+            "INSERT INTO conversations (timestamp, session_id, entry) VALUES (?, ?, ?)",
+            [(entry.get('timestamp'), entry.get('session_id'),
+              json.dumps(entry, ensure_ascii=False, default=str)) for entry in entries]
+        )
+        self._conn.commit()
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def __repr__(self) -> str:
+        return f"SqliteSink({self.path})"
+
+
+def create_log_sink(path: str, **kwargs):
+    """Destination selon l'extension : .sqlite/.db -> SQLite, sinon JSON Lines"""
+    if Path(path).suffix in ('.sqlite', '.sqlite3', '.db'):
+        return SqliteSink(path)
+    return JsonlFileSink(path, **kwargs)
+
+
+class ConversationLogWriter:
+    """Écriture asynchrone d'entrées de journal vers une destination (`sink`)
+
+    `write()` dépose l'entrée dans une file bornée ; un thread regroupe les entrées
+    par lots et appelle `sink.write_batch()` au plus tard toutes les
+    `flush_interval` secondes. File pleine : `drop_newest` perd la nouvelle entrée,
+    `drop_oldest` la plus ancienne en attente, `block` attend jusqu'à
+    `block_timeout` secondes avant de perdre la nouvelle. Les champs de
+    `field_limits` sont tronqués à ce nombre de caractères (suivis de « ... »)
+    avant la mise en file ; `{}` : entrées gardées telles quelles.
+    """
+
+    def __init__(self,
+                 sink,
+                 max_queue_size: int = 10000,
+                 batch_size: int = 256,
+                 flush_interval: float = 1.0,
+                 drop_policy: str = 'drop_newest',
+                 block_timeout: float = 0.1,
+                 field_limits: Optional[Dict[str, int]] = None):
+        if drop_policy not in DROP_POLICIES:
+            raise ValueError(f"Politique inconnue: {drop_policy} (choix: {', '.join(DROP_POLICIES)})")
+        self.sink = sink
+        self.max_queue_size = max_queue_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.drop_policy = drop_policy
+        self.block_timeout = block_timeout
+        self.field_limits = DEFAULT_FIELD_LIMITS if field_limits is None else field_limits
+
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max_queue_size)
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+
+        self._thread = threading.Thread(target=self._run, name='conversation-log', daemon=True)
+        self._thread.start()
+
+    def write(self, entry: Dict[str, Any]) -> bool:
+        """Ajoute une entrée au journal ; False si une entrée a été perdue"""
+        entry = self._truncate(entry)
+        accepted = True
+        try:
+            if self.drop_policy == 'block':
+                self._queue.put(entry, timeout=self.block_timeout)
+            else:
+                self._queue.put_nowait(entry)
+        except queue.Full:
+            if self.drop_policy == 'drop_oldest':
+                try:
+                    self._queue.get_nowait()
+                except queue.Empty:
+                    pass
+                try:
+                    self._queue.put_nowait(entry)
+                except queue.Full:
+                    pass
+            self._record_drop()
+            accepted = False
+
+        LOG_QUEUE_DEPTH.set(self._queue.qsize())
+        return accepted
+
+    def _truncate(self, entry: Dict[str, Any]) -> Dict[str, Any]:
+        truncated = entry
+        for name, limit in self.field_limits.items():
+            value = entry.get(name)
+            if isinstance(value, str) and len(value) > limit:
+                if truncated is entry:
+                    truncated = dict(entry)
+                truncated[name] = value[:limit] + "..."
+        return truncated
+
+    def _record_drop(self) -> None:
+        self.dropped += 1
+        LOG_ENTRIES.labels('dropped').inc()
+        if self.dropped == 1 or self.dropped % 1000 == 0:
+            logger.warning(f"File du journal pleine ({self.drop_policy}) : {self.dropped} entrées perdues")
+
+    def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            batch: List[Dict[str, Any]] = []
+            try:
+                item = self._queue.get(timeout=self.flush_interval)
+                while True:
+                    if item is _STOP:
+                        stopping = True
+                        break
+                    batch.append(item)
+                    if len(batch) >= self.batch_size:
+                        break
+                    item = self._queue.get_nowait()
+            except queue.Empty:
+                pass
+
+            if batch:
+                self._write_batch(batch)
+            LOG_QUEUE_DEPTH.set(self._queue.qsize())
+
+        self.sink.close()
+
+    def _write_batch(self, batch: List[Dict[str, Any]]) -> None:
+        started = time.perf_counter()
+        try:
+            self.sink.write_batch(batch)
+            self.written += len(batch)
+            LOG_ENTRIES.labels('written').inc(len(batch))
+        except Exception as e:
+            self.failed += len(batch)
+            LOG_ENTRIES.labels('failed').inc(len(batch))
+            logger.error(f"Erreur lors de l'écriture du journal des conversations: {e}")
+        STAGE_LATENCY.labels('log_flush').observe(time.perf_counter() - started)
+
+    def close(self, timeout: Optional[float] = 5.0) -> None:
+        """Écrit les entrées en attente puis arrête le thread"""
+        if self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join(timeout)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'sink': repr(self.sink),
+            'drop_policy': self.drop_policy,
+            'queued': self._queue.qsize(),
+            'max_queue_size': self.max_queue_size,
+            'written': self.written,
+            'dropped': self.dropped,
+            'failed': self.failed,
+        }
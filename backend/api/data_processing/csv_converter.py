@@ -5,10 +5,15 @@ Convertisseur CSV vers JSON pour le chatbot Goo-net Pit
 Transforme les données CSV en format JSON structuré pour l'IA automotive
 """
 
+import argparse
 import json
+import math
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 import pandas as pd
 import re
-from typing import Dict, List, Any, Optional
+from typing import Dict, Iterable, Iterator, List, Any, Optional
 from datetime import datetime
 from pathlib import Path
 import logging
@@ -17,6 +22,32 @@ import logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+try:
+    from .article_io import COMPRESSION_SUFFIXES, write_jsonl
+except ImportError:
+    from article_io import COMPRESSION_SUFFIXES, write_jsonl
+
+# Formats de sortie des articles : tableau JSON (indenté) ou JSON Lines
+OUTPUT_FORMATS = ('json', 'jsonl')
+
+# Lignes lues par bloc : la mémoire reste bornée quelle que soit la taille du CSV
+DEFAULT_CHUNK_SIZE = 10000
+
+# Colonnes utilisées (sentence_scores, volumineuse, n'est pas lue)
+ARTICLE_COLUMNS = ['article_id', 'create_time', 'category_id', 'text', 'summary', 'article_length']
+
+# Expressions compilées une seule fois
+OBD_CODE_PATTERN = re.compile(r'([PCBU][0-9A-F]{4}(?:-[0-9A-F]{1,2})?)')
+YEAR_PATTERN = re.compile(r'[\(（]?(\d{4})[\)）]?年?')
+SYMPTOM_PATTERNS = [
+    re.compile(r'(警告灯が点灯|エアコンが効かない|失火|異音|振動|ハンドルが重い)'),
+    re.compile(r'(冷却性能が低下|エンジンが不調|ブレーキに異常)'),
+]
+# 「円」必須 : 単独の数字（年式など）を価格として拾わない
+PRICE_PATTERN = r'(\d+(?:[,，]\d{3})*)円'
+# 「2-3時間」は範囲、「1.5時間」は単独の値
+DURATION_PATTERN = r'(\d+(?:\.\d+)?)(?:\s*[‐\-~〜～]\s*(\d+(?:\.\d+)?))?時間'
+
 class GoonetDataConverter:
     """Convertisseur principal pour les données Goo-net Pit"""
     
@@ -41,14 +72,17 @@ class GoonetDataConverter:
             'スバル': ['インプレッサ', 'フォレスター', 'レガシィ', 'XV', 'BRZ']
         }
 
+        self.full_name_patterns = {
+            manufacturer: re.compile(f'{re.escape(manufacturer)}[・·]([^（\\(\\s]+)')
+            for manufacturer in self.car_manufacturers
+        }
+        self.last_conversion_stats: Dict[str, Any] = {}
+
     def extract_obd_codes(self, text: str) -> List[Dict[str, str]]:
         """テキストからOBDコードを抽出"""
         codes = []
         # OBDコードのパターン (例: U3003-1C, P0171, C1AE687)
-        obd_pattern = r'([PCBU][0-9A-F]{4}(?:-[0-9A-F]{1,2})?)'
-        
-        matches = re.finditer(obd_pattern, text)
-        for match in matches:
+        for match in OBD_CODE_PATTERN.finditer(text):
             code = match.group(1)
             base_code = code.split('-')[0]  # -1C などのサフィックスを除去
             description = self.obd_patterns.get(base_code, '不明なコード')
@@ -71,8 +105,7 @@ class GoonetDataConverter:
         }
         
         # 年式の抽出 (例: 2017年、（2020）)
-        year_pattern = r'[\(（]?(\d{4})[\)）]?年?'
-        year_match = re.search(year_pattern, text)
+        year_match = YEAR_PATTERN.search(text)
         if year_match:
             vehicle_info['year'] = int(year_match.group(1))
         
@@ -84,8 +117,7 @@ class GoonetDataConverter:
                     if model in text:
                         vehicle_info['model'] = model
                         # フルネームの抽出 (例: ホンダ・N-BOXカスタム)
-                        full_name_pattern = f'{manufacturer}[・·]([^（\\(\\s]+)'
-                        full_match = re.search(full_name_pattern, text)
+                        full_match = self.full_name_patterns[manufacturer].search(text)
                         if full_match:
                             vehicle_info['full_name'] = f"{manufacturer}・{full_match.group(1)}"
                         break
@@ -102,13 +134,8 @@ class GoonetDataConverter:
         }
         
         # 症状のキーワード
-        symptom_patterns = [
-            r'(警告灯が点灯|エアコンが効かない|失火|異音|振動|ハンドルが重い)',
-            r'(冷却性能が低下|エンジンが不調|ブレーキに異常)'
-        ]
-        
-        for pattern in symptom_patterns:
-            match = re.search(pattern, text)
+        for pattern in SYMPTOM_PATTERNS:
+            match = pattern.search(text)
             if match:
                 result['symptom'] = match.group(1)
                 break
@@ -127,66 +154,101 @@ class GoonetDataConverter:
         
         return result
 
-    def convert_diagnostic_articles(self, csv_file: str) -> List[Dict[str, Any]]:
+    def convert_diagnostic_articles(self, csv_file: str,
+                                    chunksize: int = DEFAULT_CHUNK_SIZE,
+                                    workers: int = 1) -> List[Dict[str, Any]]:
         """診断記事CSVをJSON形式に変換"""
-        logger.info(f"診断記事の変換開始: {csv_file}")
-        
-        df = pd.read_csv(csv_file)
+        return list(self.iter_diagnostic_articles(csv_file, chunksize, workers))
+
+    def iter_diagnostic_articles(self, csv_file: str,
+                                 chunksize: int = DEFAULT_CHUNK_SIZE,
+                                 workers: int = 1) -> Iterator[Dict[str, Any]]:
+        """診断記事CSVを`chunksize`行ずつ読み込み、記事を順に返す
+
+        ファイル全体を読み込まないため、数GBのCSVでもメモリ使用量は一定。
+        `workers` > 1 の場合はブロックをプロセスプールで並列に変換し、CSVの順序で
+        返す（出力は1プロセスの場合と同一）。
+        処理速度（行/秒）はブロックごとにログ出力し、`last_conversion_stats` に残す。
+        """
+        logger.info(f"診断記事の変換開始: {csv_file} (ワーカー: {workers})")
+        started = time.perf_counter()
+        rows = 0
+
+        reader = pd.read_csv(csv_file, usecols=ARTICLE_COLUMNS, chunksize=chunksize,
+                             dtype={'article_id': str, 'text': str, 'summary': str})
+        for articles in self._convert_chunks(reader, workers):
+            yield from articles
+            rows += len(articles)
+            elapsed = time.perf_counter() - started
+            logger.info(f"{rows}行処理済み ({rows / elapsed:.0f} 行/秒)")
+
+        elapsed = time.perf_counter() - started
+        self.last_conversion_stats = {
+            'rows': rows,
+            'seconds': round(elapsed, 3),
+            'rows_per_second': round(rows / elapsed, 1) if elapsed else 0.0,
+        }
+        logger.info(f"変換完了: {rows}件の記事を処理 "
+                    f"({self.last_conversion_stats['rows_per_second']:.0f} 行/秒)")
+
+    def _convert_chunks(self, chunks: Iterable[pd.DataFrame], workers: int) -> Iterator[List[Dict[str, Any]]]:
+        """ブロックごとの変換結果を読み込み順に返す"""
+        if workers <= 1:
+            for chunk in chunks:
+                yield self.convert_article_chunk(chunk)
+            return
+
+        # 先読みは workers の2倍まで : 遅いブロックがあってもメモリは増え続けない
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_chunk_worker) as pool:
+            pending = deque()
+            for chunk in chunks:
+                pending.append(pool.submit(_convert_chunk_in_worker, chunk))
+                if len(pending) >= workers * 2:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+
+    def convert_article_chunk(self, chunk: pd.DataFrame) -> List[Dict[str, Any]]:
+        """CSVの1ブロックを記事に変換
+
+        価格と作業時間は `.str.extract` でブロック単位に抽出し、
+        OBDコード・車両情報・症状は行ごとに抽出する。
+        """
+        texts = chunk['text'].fillna('')
+
+        # 推定価格と時間の抽出
+        prices = pd.to_numeric(
+            texts.str.extract(PRICE_PATTERN, expand=False).str.replace(r'[,，]', '', regex=True)
+        )
+        durations = texts.str.extract(DURATION_PATTERN).astype(float)
+        # 時間範囲の場合は平均を取る
+        durations = (durations[0] + durations[1].fillna(durations[0])) / 2
+
         articles = []
-        
-        for _, row in df.iterrows():
-            # OBDコード抽出
-            obd_codes = self.extract_obd_codes(row['text'])
-            
-            # 車両情報抽出
-            vehicle_info = self.extract_vehicle_info(row['text'])
-            
-            # 症状・診断抽出
-            symptoms_diagnosis = self.extract_symptoms_and_diagnosis(row['text'])
-            
-            # 推定価格と時間の抽出
-            price_pattern = r'(\d+[,，]\d+|\d+)円?'
-            time_pattern = r'(\d+(?:\.\d+)?)[‐-]?(\d+(?:\.\d+)?)時間'
-            
-            price_match = re.search(price_pattern, row['text'])
-            time_match = re.search(time_pattern, row['text'])
-            
-            estimated_price = None
-            estimated_duration = None
-            
-            if price_match:
-                price_str = price_match.group(1).replace(',', '').replace('，', '')
-                estimated_price = int(price_str)
-            
-            if time_match:
-                # 時間範囲の場合は平均を取る
-                time1 = float(time_match.group(1))
-                time2 = float(time_match.group(2)) if time_match.group(2) else time1
-                estimated_duration = (time1 + time2) / 2
-            
-            article = {
-                'article_id': str(row['article_id']),
-                'create_time': row['create_time'],
-                'category_id': row['category_id'],
-                'vehicle_info': vehicle_info,
-                'obd_codes': obd_codes,
+        for row, text, price, duration in zip(chunk.itertuples(index=False), texts, prices, durations):
+            symptoms_diagnosis = self.extract_symptoms_and_diagnosis(text)
+            articles.append({
+                'article_id': row.article_id,
+                'create_time': row.create_time,
+                'category_id': _to_python(row.category_id),
+                'vehicle_info': self.extract_vehicle_info(text),
+                'obd_codes': self.extract_obd_codes(text),
                 'symptom': symptoms_diagnosis['symptom'],
                 'diagnosis': symptoms_diagnosis['diagnosis'],
                 'solution': symptoms_diagnosis['solution'],
-                'estimated_price': estimated_price,
-                'estimated_duration': estimated_duration,
-                'full_text': row['text'],
-                'summary': row['summary'],
-                'article_length': row['article_length']
-            }
-            
-            articles.append(article)
-        
-        logger.info(f"変換完了: {len(articles)}件の記事を処理")
+                'estimated_price': None if math.isnan(price) else int(price),
+                'estimated_duration': None if math.isnan(duration) else float(duration),
+                'full_text': text,
+                'summary': row.summary,
+                'article_length': _to_python(row.article_length)
+            })
         return articles
 
     def generate_garage_data(self) -> List[Dict[str, Any]]:
-        """サンプルガレージデータを生成 (実際のCSVがある場合は読み込み処理に変更)"""
+        """サンプルガレージデータを生成 (実際のCSVがある場合は読み込み処理に変更)
+
+        `latitude` / `longitude` は近隣検索（/garages?lat=&lon=）に使用する。
+        """
         logger.info("ガレージデータの生成開始")
         
         sample_garages = [
@@ -200,7 +262,9 @@ class GoonetDataConverter:
                 'url_blog': 'https://www.goo-net.com/pit/shop/0123456/blog/',
                 'specialites': ['ホンダ', 'トヨタ'],
                 'horaires': '9:00-18:00',
-                'telephone': '0166-23-4567'
+                'telephone': '0166-23-4567',
+                'latitude': 43.7545,
+                'longitude': 142.3470
             },
             {
                 'garage_id': '0234567',
@@ -212,7 +276,9 @@ class GoonetDataConverter:
                 'url_blog': 'https://www.goo-net.com/pit/shop/0234567/blog/',
                 'specialites': ['日産', 'マツダ'],
                 'horaires': '8:30-19:00',
-                'telephone': '03-3412-5678'
+                'telephone': '03-3412-5678',
+                'latitude': 35.6430,
+                'longitude': 139.6700
             },
             {
                 'garage_id': '0345678',
@@ -224,7 +290,9 @@ class GoonetDataConverter:
                 'url_blog': 'https://www.goo-net.com/pit/shop/0345678/blog/',
                 'specialites': ['スバル', 'ホンダ'],
                 'horaires': '9:00-17:30',
-                'telephone': '06-6212-3456'
+                'telephone': '06-6212-3456',
+                'latitude': 34.6650,
+                'longitude': 135.5010
             }
         ]
         
@@ -233,17 +301,44 @@ class GoonetDataConverter:
 
     def convert_and_save_all(self, 
                            csv_file: str = '/workspaces/SmarBot/sample_automotive_data.csv',
-                           output_dir: str = '/workspaces/SmarBot/data/json'):
-        """すべてのデータを変換してJSONファイルに保存"""
+                           output_dir: str = '/workspaces/SmarBot/data/json',
+                           chunksize: int = DEFAULT_CHUNK_SIZE,
+                           workers: int = 1,
+                           output_format: str = 'json',
+                           compression: str = 'none'):
+        """すべてのデータを変換してJSONファイルに保存
+
+        記事はブロック単位で変換しながら書き出すため、結果に記事一覧は含まない
+        （`articles_file` を参照）。`output_format='jsonl'` の場合は1行1記事の
+        JSON Lines（`compression` で gzip / zstd 圧縮可）。
+        """
+        if output_format not in OUTPUT_FORMATS:
+            raise ValueError(f"不明な出力形式: {output_format} ({', '.join(OUTPUT_FORMATS)})")
+        if compression not in COMPRESSION_SUFFIXES:
+            raise ValueError(f"不明な圧縮形式: {compression} ({', '.join(COMPRESSION_SUFFIXES)})")
+        if output_format == 'json' and compression != 'none':
+            raise ValueError("圧縮は jsonl 形式でのみ使用できます")
         
         # 出力ディレクトリを作成
         Path(output_dir).mkdir(parents=True, exist_ok=True)
         
-        # 診断記事の変換
-        articles = self.convert_diagnostic_articles(csv_file)
-        articles_file = Path(output_dir) / 'diagnostic_articles.json'
-        with open(articles_file, 'w', encoding='utf-8') as f:
-            json.dump(articles, f, ensure_ascii=False, indent=2)
+        # 診断記事の変換（統計は書き出しながら集計）
+        counts = {'articles': 0, 'obd_codes': 0, 'vehicles': 0}
+
+        def counted(articles: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+            for article in articles:
+                counts['articles'] += 1
+                counts['obd_codes'] += len(article['obd_codes'])
+                if article['vehicle_info']['manufacturer']:
+                    counts['vehicles'] += 1
+                yield article
+
+        articles = counted(self.iter_diagnostic_articles(csv_file, chunksize, workers))
+        articles_file = Path(output_dir) / f"diagnostic_articles.{output_format}{COMPRESSION_SUFFIXES[compression]}"
+        if output_format == 'jsonl':
+            write_jsonl(str(articles_file), articles)
+        else:
+            write_json_array(articles_file, articles)
         logger.info(f"診断記事保存完了: {articles_file}")
         
         # ガレージデータの生成
@@ -254,28 +349,78 @@ class GoonetDataConverter:
         logger.info(f"ガレージデータ保存完了: {garages_file}")
         
         # 統計情報の表示
-        total_obd_codes = sum(len(article['obd_codes']) for article in articles)
-        vehicles_with_info = sum(1 for article in articles if article['vehicle_info']['manufacturer'])
+        rows_per_second = self.last_conversion_stats.get('rows_per_second', 0.0)
         
         print(f"\n🚗 データ変換完了サマリー:")
-        print(f"  📄 診断記事: {len(articles)}件")
+        print(f"  📄 診断記事: {counts['articles']}件")
         print(f"  🔧 ガレージ: {len(garages)}件")
-        print(f"  🚨 OBDコード検出: {total_obd_codes}件")
-        print(f"  🚙 車両情報抽出: {vehicles_with_info}件")
+        print(f"  🚨 OBDコード検出: {counts['obd_codes']}件")
+        print(f"  🚙 車両情報抽出: {counts['vehicles']}件")
+        print(f"  ⚡ 処理速度: {rows_per_second:.0f} 行/秒")
         print(f"  📁 出力先: {output_dir}")
         
         return {
-            'articles': articles,
+            'articles_file': str(articles_file),
             'garages': garages,
             'stats': {
-                'total_articles': len(articles),
+                'total_articles': counts['articles'],
                 'total_garages': len(garages),
-                'obd_codes_found': total_obd_codes,
-                'vehicles_identified': vehicles_with_info
+                'obd_codes_found': counts['obd_codes'],
+                'vehicles_identified': counts['vehicles'],
+                'rows_per_second': rows_per_second
             }
         }
 
+
+_worker_converter: Optional['GoonetDataConverter'] = None
+
+
+def _init_chunk_worker() -> None:
+    global _worker_converter
+    _worker_converter = GoonetDataConverter()
+
+
+def _convert_chunk_in_worker(chunk: pd.DataFrame) -> List[Dict[str, Any]]:
+    return _worker_converter.convert_article_chunk(chunk)
+
+
+def _to_python(value: Any) -> Any:
+    """numpy のスカラーを JSON に書ける Python の値に変換"""
+    return value.item() if hasattr(value, 'item') else value
+
+
+def write_json_array(path: Path, items: Iterable[Any]) -> int:
+    """`json.dump(items, indent=2)` と同一の出力を、一覧をメモリに保持せずに書き出す"""
+    count = 0
+    with open(path, 'w', encoding='utf-8') as f:
+        for item in items:
+            body = json.dumps(item, ensure_ascii=False, indent=2).replace('\n', '\n  ')
+            f.write(('[\n  ' if count == 0 else ',\n  ') + body)
+            count += 1
+        f.write('\n]' if count else '[]')
+    return count
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Goo-net Pit CSV → JSON 変換")
+    parser.add_argument('--csv', default='/workspaces/SmarBot/sample_automotive_data.csv',
+                        help="診断記事CSV")
+    parser.add_argument('--output-dir', default='/workspaces/SmarBot/data/json',
+                        help="JSONの出力先")
+    parser.add_argument('--chunksize', type=int, default=DEFAULT_CHUNK_SIZE,
+                        help="一度に読み込む行数")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="変換に使うプロセス数（出力は1プロセスの場合と同一）")
+    parser.add_argument('--format', dest='output_format', choices=OUTPUT_FORMATS, default='json',
+                        help="記事の出力形式（jsonl: 1行1記事、ストリーム読み込み可）")
+    parser.add_argument('--compression', choices=list(COMPRESSION_SUFFIXES), default='none',
+                        help="jsonl の圧縮形式（zstd には zstandard が必要）")
+    return parser.parse_args(argv)
+
+
 if __name__ == '__main__':
+    args = parse_args()
     converter = GoonetDataConverter()
-    result = converter.convert_and_save_all()
+    result = converter.convert_and_save_all(args.csv, args.output_dir, args.chunksize, args.workers,
+                                            args.output_format, args.compression)
     print("\n✅ 変換処理が完了しました！")
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Cache persistant des embeddings pour le chatbot Goo-net Pit
+Stockage SQLite adressé par contenu : clé = hash(modèle, texte d'embedding)
+"""
+
+import hashlib
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, List
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Limite de paramètres par requête SQLite
+_SQL_CHUNK = 500
+
+
+class EmbeddingCache:
+    """Cache disque des vecteurs float32, partagé entre reconstructions d'index"""
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " key TEXT PRIMARY KEY,"
+            " dim INTEGER NOT NULL,"
+            " vector BLOB NOT NULL)"
+        )
+        self._conn.commit()
+
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(model_name: str, text: str) -> str:
+        """Clé de contenu pour un couple (modèle, texte)"""
+        return hashlib.sha256(f"{model_name}\x00{text}".encode('utf-8')).hexdigest()
+
+    def get_many(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        """Retourne les vecteurs présents dans le cache pour ces clés"""
+        found = {}
+        unique_keys = list(dict.fromkeys(keys))
+
+        with self._lock:
+            for start in range(0, len(unique_keys), _SQL_CHUNK):
+                chunk = unique_keys[start:start + _SQL_CHUNK]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", chunk
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32)
+
+        self.hits += sum(1 for key in keys if key in found)
+        self.misses += sum(1 for key in keys if key not in found)
+        return found
+
+    def put_many(self, items: Dict[str, np.ndarray]) -> None:
+        """Enregistre (ou remplace) des vecteurs dans le cache"""
+        rows = [
+            (key, int(vector.shape[-1]), np.asarray(vector, dtype=np.float32).tobytes())
+            for key, vector in items.items()
+        ]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, dim, vector) VALUES (?, ?, ?)", rows
+            )
+            self._conn.commit()
+
+    def reset_stats(self) -> None:
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
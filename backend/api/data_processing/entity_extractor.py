@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Extraction d'entités en une passe pour le chatbot Goo-net Pit
+Automate Aho-Corasick sur les dictionnaires (constructeurs, modèles, lieux, symptômes)
+et expressions compilées pour les codes OBD et l'année
+"""
+
+import re
+import unicodedata
+from collections import deque
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DICTIONARY_DIR = Path(__file__).parent / 'dictionaries'
+
+# Entités dont on garde toutes les occurrences ; pour les autres, la première
+MULTI_VALUED_ENTITIES = {'symptoms'}
+
+# Code OBD isolé : système (P, C, B, U), chiffre 0-3, trois caractères hexadécimaux, puis
+# sous-code « -1C » ou octet de type de défaut accolé (« C1AE687 » -> C1AE6, comme csv_converter)
+OBD_CODE_PATTERN = re.compile(r'(?<![0-9A-Z])([PCBU][0-3][0-9A-F]{3})(-[0-9A-F]{1,2}|[0-9A-F]{2})?(?![0-9A-Z])',
+                              re.IGNORECASE)
+# Année isolée (pas un fragment de code OBD, de prix ou de numéro)
+YEAR_PATTERN = re.compile(r'(?<![0-9A-Z])((?:19|20)\d{2})(?!\d)年?')
+
+
+def normalize_text(text: str) -> str:
+    """NFKC (pleine chasse -> demi-chasse, etc.) puis casse ignorée"""
+    return unicodedata.normalize('NFKC', text).casefold()
+
+
+class AhoCorasick:
+    """Automate Aho-Corasick : toutes les occurrences de tous les termes en une passe"""
+
+    def __init__(self):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._outputs: List[List[Tuple[int, Any]]] = [[]]
+        self._built = False
+
+    def add(self, term: str, value: Any) -> None:
+        if not term:
+            return
+        node = 0
+        for char in term:
+            next_node = self._goto[node].get(char)
+            if next_node is None:
+                next_node = len(self._goto)
+                self._goto[node][char] = next_node
+                self._goto.append({})
+                self._fail.append(0)
+                self._outputs.append([])
+            node = next_node
+        self._outputs[node].append((len(term), value))
+        self._built = False
+
+    def build(self) -> None:
+        """Calcule les liens d'échec (parcours en largeur)"""
+        queue = deque(self._goto[0].values())
+        for node in queue:
+            self._fail[node] = 0
+        while queue:
+            node = queue.popleft()
+            for char, child in self._goto[node].items():
+                fail = self._fail[node]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[child] = self._goto[fail].get(char, 0)
+                self._outputs[child] = self._outputs[child] + self._outputs[self._fail[child]]
+                queue.append(child)
+        self._built = True
+
+    def iter_matches(self, text: str) -> Iterator[Tuple[int, int, Any]]:
+        """(début, fin, valeur) de chaque occurrence, chevauchements compris"""
+        if not self._built:
+            self.build()
+        goto, fail, outputs = self._goto, self._fail, self._outputs
+        node = 0
+        for position, char in enumerate(text):
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            for length, value in outputs[node]:
+                yield position + 1 - length, position + 1, value
+
+    def __len__(self) -> int:
+        return len(self._goto)
+
+
+def _is_word_char(char: str) -> bool:
+    return char.isascii() and char.isalnum()
+
+
+class EntityExtractor:
+    """Extraction des entités d'un message en une seule passe sur le texte
+
+    Les dictionnaires sont des fichiers `<type d'entité>.txt` : une entrée par
+    ligne, forme canonique puis variantes séparées par des tabulations, `#` pour
+    les commentaires. Pour chaque type, les occurrences retenues sont les plus à
+    gauche puis les plus longues, sans chevauchement.
+    """
+
+    def __init__(self, dictionaries: Dict[str, Dict[str, List[str]]]):
+        self.entity_types = list(dictionaries)
+        self.automaton = AhoCorasick()
+        self.term_count = 0
+        for entity_type, entries in dictionaries.items():
+            for canonical, variants in entries.items():
+                for term in {canonical, *variants}:
+                    self.automaton.add(normalize_text(term), (entity_type, canonical))
+                    self.term_count += 1
+        self.automaton.build()
+
+    @classmethod
+    def from_directory(cls, directory: Optional[str] = None) -> 'EntityExtractor':
+        directory = Path(directory) if directory else DEFAULT_DICTIONARY_DIR
+        dictionaries = {path.stem: load_dictionary(path) for path in sorted(directory.glob('*.txt'))}
+        extractor = cls(dictionaries)
+        logger.info(f"Dictionnaires d'entités chargés: {extractor.term_count} termes "
+                    f"({', '.join(extractor.entity_types)})")
+        return extractor
+
+    def _dictionary_matches(self, text: str) -> Dict[str, List[str]]:
+        """Valeurs canoniques par type, dans l'ordre du texte"""
+        candidates: Dict[str, List[Tuple[int, int, str]]] = {}
+        for start, end, (entity_type, canonical) in self.automaton.iter_matches(text):
+            # Termes latins : pas de correspondance au milieu d'un mot (« fit » dans « benefit »)
+            if _is_word_char(text[start]) and start > 0 and _is_word_char(text[start - 1]):
+                continue
+            if _is_word_char(text[end - 1]) and end < len(text) and _is_word_char(text[end]):
+                continue
+            candidates.setdefault(entity_type, []).append((start, end, canonical))
+
+        found = {}
+        for entity_type, matches in candidates.items():
+            matches.sort(key=lambda match: (match[0], -match[1]))
+            values, covered_until = [], 0
+            for start, end, canonical in matches:
+                if start >= covered_until:
+                    values.append(canonical)
+                    covered_until = end
+            found[entity_type] = values
+        return found
+
+    def extract(self, text: str) -> Dict[str, Any]:
+        entities: Dict[str, Any] = {}
+        normalized = unicodedata.normalize('NFKC', text)
+
+        for entity_type, values in self._dictionary_matches(normalized.casefold()).items():
+            entities[entity_type] = values if entity_type in MULTI_VALUED_ENTITIES else values[0]
+
+        year = YEAR_PATTERN.search(normalized)
+        if year:
+            entities['year'] = int(year.group(1))
+
+        obd_code = OBD_CODE_PATTERN.search(normalized)
+        if obd_code:
+            suffix = obd_code.group(2) or ''
+            code = obd_code.group(1) + (suffix if suffix.startswith('-') else '')
+            entities['obd_code'] = code.upper()
+
+        return entities
+
+
+def load_dictionary(path: Path) -> Dict[str, List[str]]:
+    """{forme canonique: [variantes]} depuis un fichier de dictionnaire"""
+    entries: Dict[str, List[str]] = {}
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.rstrip('\n')
+            if not line.strip() or line.lstrip().startswith('#'):
+                continue
+            canonical, *variants = [field.strip() for field in line.split('\t')]
+            entries.setdefault(canonical, []).extend(variant for variant in variants if variant)
+    return entries
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Filtres de métadonnées pour la recherche du chatbot Goo-net Pit
+Colonnes de facettes (constructeur, modèle, année, prix) par identifiant FAISS,
+combinées en un bitmap des articles admis (IDSelectorBitmap, masque BM25)
+"""
+
+import threading
+import unicodedata
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Facettes à valeur discrète et facettes numériques (bornes du filtre)
+CATEGORY_FACETS = ('vehicle_manufacturer', 'vehicle_model')
+RANGE_FACETS = {
+    'vehicle_year': ('year_min', 'year_max'),
+    'estimated_price': ('price_min', 'price_max'),
+}
+FACET_COLUMNS = CATEGORY_FACETS + tuple(RANGE_FACETS)
+
+# Écart d'années toléré autour de l'année extraite du message (même génération de modèle)
+ENTITY_YEAR_TOLERANCE = 2
+
+# Masques calculés gardés en mémoire (filtres les plus récents)
+MASK_CACHE_SIZE = 256
+
+
+def normalize_facet(value: str) -> str:
+    """Clé de comparaison : NFKC, casse ignorée (« ＮーＢＯＸ », « n-box » -> « n-box »)"""
+    return unicodedata.normalize('NFKC', value).strip().casefold()
+
+
+@dataclass(frozen=True)
+class SearchFilter:
+    """Prédicats sur les métadonnées des articles ; None : pas de contrainte
+
+    Les bornes sont incluses. Un article sans valeur pour une facette filtrée
+    (modèle inconnu, prix absent) est exclu.
+    """
+    vehicle_manufacturer: Optional[str] = None
+    vehicle_model: Optional[str] = None
+    year_min: Optional[int] = None
+    year_max: Optional[int] = None
+    price_min: Optional[int] = None
+    price_max: Optional[int] = None
+
+    def is_empty(self) -> bool:
+        return not self.as_dict()
+
+    def as_dict(self) -> Dict[str, Any]:
+        """Critères renseignés uniquement"""
+        return {name: value for name, value in asdict(self).items() if value is not None}
+
+    @classmethod
+    def from_entities(cls, entities: Dict[str, Any],
+                      year_tolerance: int = ENTITY_YEAR_TOLERANCE) -> 'SearchFilter':
+        """Filtre tiré des entités du message (constructeur, modèle, année ± tolérance)"""
+        year = entities.get('year')
+        return cls(
+            vehicle_manufacturer=entities.get('manufacturer'),
+            vehicle_model=entities.get('model'),
+            year_min=year - year_tolerance if year else None,
+            year_max=year + year_tolerance if year else None,
+        )
+
+
+class FacetIndex:
+    """Colonnes de facettes indexées par identifiant FAISS
+
+    Constructeur et modèle sont codés (vocabulaire -> int32, -1 pour None) : le
+    bitmap d'une valeur est `codes == code`, sans un tableau par valeur en
+    mémoire. Année et prix sont des colonnes float64 (NaN pour None) comparées
+    aux bornes. Les masques combinés sont mis en cache jusqu'à la prochaine
+    modification.
+    """
+
+    def __init__(self):
+        self._live = np.zeros(0, dtype=bool)
+        self._vocabularies: Dict[str, Dict[str, int]] = {name: {} for name in CATEGORY_FACETS}
+        self._codes = {name: np.zeros(0, dtype=np.int32) for name in CATEGORY_FACETS}
+        self._values = {name: np.zeros(0, dtype=np.float64) for name in RANGE_FACETS}
+        # Recherches simultanées (verrou de l'index en lecture) : cache protégé à part
+        self._mask_cache: Dict[SearchFilter, np.ndarray] = {}
+        self._cache_lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return int(np.count_nonzero(self._live))
+
+    def _ensure_rows(self, row: int) -> None:
+        size = len(self._live)
+        if row < size:
+            return
+        grown = max(row + 1, 2 * size)
+        self._live = np.concatenate([self._live, np.zeros(grown - size, dtype=bool)])
+        for name in CATEGORY_FACETS:
+            self._codes[name] = np.concatenate([self._codes[name], np.full(grown - size, -1, dtype=np.int32)])
+        for name in RANGE_FACETS:
+            self._values[name] = np.concatenate([self._values[name], np.full(grown - size, np.nan)])
+
+    def add(self, row: int, metadata: Dict[str, Any]) -> None:
+        """Indexe (ou réindexe) les facettes d'une ligne"""
+        self._ensure_rows(row)
+        self._live[row] = True
+        for name in CATEGORY_FACETS:
+            value = metadata.get(name)
+            if value:
+                vocabulary = self._vocabularies[name]
+                self._codes[name][row] = vocabulary.setdefault(normalize_facet(value), len(vocabulary))
+            else:
+                self._codes[name][row] = -1
+        for name in RANGE_FACETS:
+            value = metadata.get(name)
+            self._values[name][row] = np.nan if value is None else float(value)
+        self._mask_cache.clear()
+
+    def remove(self, row: int) -> None:
+        if row < len(self._live) and self._live[row]:
+            self._live[row] = False
+            self._mask_cache.clear()
+
+    def select(self, search_filter: SearchFilter) -> np.ndarray:
+        """Masque booléen (par identifiant FAISS) des lignes vivantes satisfaisant le filtre"""
+        with self._cache_lock:
+            mask = self._mask_cache.get(search_filter)
+        if mask is not None:
+            return mask
+
+        mask = self._live.copy()
+        for name in CATEGORY_FACETS:
+            value = getattr(search_filter, name)
+            if value:
+                code = self._vocabularies[name].get(normalize_facet(value))
+                if code is None:
+                    mask[:] = False
+                    break
+                mask &= self._codes[name] == code
+        for name, (low_name, high_name) in RANGE_FACETS.items():
+            low, high = getattr(search_filter, low_name), getattr(search_filter, high_name)
+            # Comparaisons avec NaN fausses : valeur absente exclue
+            if low is not None:
+                mask &= self._values[name] >= low
+            if high is not None:
+                mask &= self._values[name] <= high
+
+        with self._cache_lock:
+            if len(self._mask_cache) >= MASK_CACHE_SIZE:
+                self._mask_cache.pop(next(iter(self._mask_cache)))
+            self._mask_cache[search_filter] = mask
+        return mask
+
+    @classmethod
+    def from_columns(cls,
+                     live: np.ndarray,
+                     categories: Dict[str, Tuple[np.ndarray, List[str]]],
+                     values: Dict[str, np.ndarray]) -> 'FacetIndex':
+        """Index construit depuis des colonnes déjà codées (métadonnées colonnaires)
+
+        `categories` : (codes int32, -1 pour None ; vocabulaire) par facette
+        discrète ; `values` : float64 (NaN pour None) par facette numérique.
+        Seul le vocabulaire est parcouru : les codes sont renumérotés d'un bloc.
+        """
+        index = cls()
+        index._live = np.array(live, dtype=bool)
+        for name in CATEGORY_FACETS:
+            codes, vocabulary = categories[name]
+            normalized = index._vocabularies[name]
+            # Valeurs de même clé normalisée (« N-BOX », « n-box ») : même code ;
+            # le dernier élément (-1) renumérote les codes -1
+            renumbered = np.array(
+                [normalized.setdefault(normalize_facet(value), len(normalized)) if value else -1
+                 for value in vocabulary] + [-1], dtype=np.int32)
+            index._codes[name] = renumbered[codes]
+        for name in RANGE_FACETS:
+            index._values[name] = np.array(values[name], dtype=np.float64)
+        return index
+
+    @classmethod
+    def build(cls, rows: Iterable[Tuple[int, Dict[str, Any]]]) -> 'FacetIndex':
+        index = cls()
+        for row, metadata in rows:
+            index.add(row, metadata)
+        return index
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'articles': len(self),
+            **{f'{name}_values': len(self._vocabularies[name]) for name in CATEGORY_FACETS},
+        }
@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Index des garages pour le chatbot Goo-net Pit
+Index inversés (lieu, spécialité constructeur, service), grille géographique
+et sélection top-k par tas
+"""
+
+import heapq
+import math
+from bisect import bisect_left
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Poids de chaque critère dans match_score
+LOCATION_WEIGHT = 3
+MANUFACTURER_WEIGHT = 2
+SERVICE_WEIGHT = 1
+
+# Suffixes administratifs retirés pour indexer aussi « 東京 », « 旭川 », « 世田谷 »
+ADMINISTRATIVE_SUFFIXES = ('都', '道', '府', '県', '市', '区', '町', '村')
+
+DEFAULT_CENTROIDS_FILE = Path(__file__).parent / 'location_centroids.tsv'
+
+# Côté d'une cellule de la grille géographique (degrés, ~11 km en latitude)
+GRID_CELL_DEGREES = 0.1
+
+EARTH_RADIUS_KM = 6371.0
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Distance orthodromique en kilomètres"""
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = (math.sin((lat2 - lat1) / 2) ** 2
+         + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def load_centroids(path: Path = DEFAULT_CENTROIDS_FILE) -> Dict[str, Tuple[float, float, float]]:
+    """{lieu: (latitude, longitude, rayon en km)} depuis un fichier TSV"""
+    centroids = {}
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if not line.strip() or line.startswith('#'):
+                continue
+            name, latitude, longitude, radius_km = line.rstrip('\n').split('\t')
+            centroids[name] = (float(latitude), float(longitude), float(radius_km))
+    return centroids
+
+
+class GeoGrid:
+    """Grille régulière latitude/longitude : une requête par rayon ne visite que
+    les cellules qui recoupent le cercle"""
+
+    def __init__(self, cell_degrees: float = GRID_CELL_DEGREES):
+        self.cell_degrees = cell_degrees
+        # Cellule -> [(position, latitude rad, longitude rad, cos(latitude))]
+        self.cells: Dict[Tuple[int, int], List[Tuple[int, float, float, float]]] = {}
+        self.size = 0
+
+    def _cell(self, latitude: float, longitude: float) -> Tuple[int, int]:
+        return math.floor(latitude / self.cell_degrees), math.floor(longitude / self.cell_degrees)
+
+    def add(self, position: int, latitude: float, longitude: float) -> None:
+        lat_rad = math.radians(latitude)
+        self.cells.setdefault(self._cell(latitude, longitude), []).append(
+            (position, lat_rad, math.radians(longitude), math.cos(lat_rad)))
+        self.size += 1
+
+    def within(self, latitude: float, longitude: float, radius_km: float) -> Dict[int, float]:
+        """{position: distance en km} des points situés dans le rayon"""
+        lat_delta = radius_km / 111.0
+        lon_delta = radius_km / (111.0 * max(math.cos(math.radians(latitude)), 0.01))
+        min_row, min_col = self._cell(latitude - lat_delta, longitude - lon_delta)
+        max_row, max_col = self._cell(latitude + lat_delta, longitude + lon_delta)
+
+        if (max_row - min_row + 1) * (max_col - min_col + 1) > len(self.cells):
+            # Rayon très large : moins coûteux de parcourir les cellules occupées
+            candidates = (point for points in self.cells.values() for point in points)
+        else:
+            candidates = (point
+                          for row in range(min_row, max_row + 1)
+                          for col in range(min_col, max_col + 1)
+                          for point in self.cells.get((row, col), ()))
+
+        # Haversine, avec les termes du centre calculés une seule fois
+        lat0, lon0 = math.radians(latitude), math.radians(longitude)
+        cos_lat0 = math.cos(lat0)
+        # sin²(d / 2R) maximal pour rester dans le rayon
+        max_a = math.sin(min(radius_km / (2 * EARTH_RADIUS_KM), math.pi / 2)) ** 2
+        sin, asin, sqrt = math.sin, math.asin, math.sqrt
+
+        found = {}
+        for position, lat_rad, lon_rad, cos_lat in candidates:
+            a = sin((lat_rad - lat0) / 2) ** 2 + cos_lat0 * cos_lat * sin((lon_rad - lon0) / 2) ** 2
+            if a <= max_a:
+                found[position] = 2 * EARTH_RADIUS_KM * asin(min(1.0, sqrt(a)))
+        return found
+
+
+def location_keys(garage: Dict[str, Any]) -> List[str]:
+    """Clés de lieu d'un garage : préfecture et ville, avec et sans suffixe"""
+    keys = []
+    for name in (garage.get('prefecture'), garage.get('ville')):
+        if not name:
+            continue
+        keys.append(name)
+        if len(name) > 2 and name.endswith(ADMINISTRATIVE_SUFFIXES):
+            keys.append(name[:-1])
+    return keys
+
+
+class GarageIndex:
+    """Recherche de garages par lieu, constructeur et service sans parcourir la liste
+
+    Chaque critère renvoie la liste (triée) des positions des garages concernés ;
+    seuls les candidats sont notés, et les `limit` meilleurs sont extraits par un
+    tas. Un lieu présent dans la table des centres (`centroids`) retient aussi les
+    garages géolocalisés (`latitude`, `longitude`) situés dans son rayon ; à score
+    égal, le plus proche l'emporte, puis l'ordre du fichier des garages.
+    """
+
+    def __init__(self, garages: List[Dict[str, Any]],
+                 centroids: Optional[Dict[str, Tuple[float, float, float]]] = None):
+        self.garages = garages
+        self.centroids = centroids or {}
+        self.by_location: Dict[str, List[int]] = {}
+        self.by_specialty: Dict[str, List[int]] = {}
+        self.by_service: Dict[str, List[int]] = {}
+        self.grid = GeoGrid()
+
+        for position, garage in enumerate(garages):
+            self._add(self.by_location, location_keys(garage), position)
+            self._add(self.by_specialty, garage.get('specialites', []), position)
+            self._add(self.by_service, garage.get('services', []), position)
+            if garage.get('latitude') is not None and garage.get('longitude') is not None:
+                self.grid.add(position, float(garage['latitude']), float(garage['longitude']))
+
+        logger.info(f"Index des garages: {len(garages)} garages ({self.grid.size} géolocalisés), "
+                    f"{len(self.by_location)} lieux, {len(self.by_specialty)} spécialités, "
+                    f"{len(self.by_service)} services")
+
+    def locate(self, location: str) -> Optional[Tuple[float, float, float]]:
+        """(latitude, longitude, rayon en km) d'un lieu de la table des centres"""
+        centroid = self.centroids.get(location)
+        if centroid is None and len(location) > 2 and location.endswith(ADMINISTRATIVE_SUFFIXES):
+            centroid = self.centroids.get(location[:-1])
+        return centroid
+
+    @staticmethod
+    def _add(index: Dict[str, List[int]], keys: Iterable[str], position: int) -> None:
+        for key in dict.fromkeys(keys):
+            index.setdefault(key, []).append(position)
+
+    def _location_postings(self, location: str) -> Tuple[List[int], Dict[int, float]]:
+        """Positions des garages du lieu et, s'il est géolocalisé, leurs distances au centre"""
+        postings = self.by_location.get(location)
+        centroid = self.locate(location)
+        if centroid is None:
+            if postings is not None:
+                return postings, {}
+            # Lieu inconnu (quartier, adresse partielle) : recherche dans les adresses
+            return [position for position, garage in enumerate(self.garages)
+                    if location in garage.get('adresse', '')], {}
+
+        distances = self.grid.within(*centroid)
+        return sorted(set(postings or ()) | distances.keys()), distances
+
+    def search(self,
+               location: Optional[str] = None,
+               vehicle_manufacturer: Optional[str] = None,
+               service_type: Optional[str] = None,
+               limit: int = 5) -> List[Dict[str, Any]]:
+        """Les `limit` garages au meilleur match_score (copies annotées)"""
+        if not any([location, vehicle_manufacturer, service_type]):
+            return [self._result(position, 0, []) for position in range(min(limit, len(self.garages)))]
+
+        scores: Dict[int, int] = {}
+        distances: Dict[int, float] = {}
+        criteria = []
+        if location:
+            postings, distances = self._location_postings(location)
+            criteria.append((postings, LOCATION_WEIGHT, f"地域一致: {location}"))
+        if vehicle_manufacturer:
+            criteria.append((self.by_specialty.get(vehicle_manufacturer, []), MANUFACTURER_WEIGHT,
+                             f"メーカー専門: {vehicle_manufacturer}"))
+        if service_type:
+            criteria.append((self.by_service.get(service_type, []), SERVICE_WEIGHT,
+                             f"サービス対応: {service_type}"))
+
+        for postings, weight, _ in criteria:
+            for position in postings:
+                scores[position] = scores.get(position, 0) + weight
+
+        best = heapq.nsmallest(limit, scores.items(),
+                               key=lambda item: (-item[1], distances.get(item[0], math.inf), item[0]))
+        results = []
+        for position, score in best:
+            reasons = [reason for postings, _, reason in criteria if self._contains(postings, position)]
+            results.append(self._result(position, score, reasons, distances.get(position)))
+        return results
+
+    def nearest(self,
+                latitude: float,
+                longitude: float,
+                radius_km: float = 10.0,
+                vehicle_manufacturer: Optional[str] = None,
+                service_type: Optional[str] = None,
+                limit: int = 5) -> List[Dict[str, Any]]:
+        """Les `limit` garages les plus proches dans le rayon, filtrés par constructeur/service"""
+        distances = self.grid.within(latitude, longitude, radius_km)
+        criteria = []
+        if vehicle_manufacturer:
+            criteria.append((self.by_specialty.get(vehicle_manufacturer, []), MANUFACTURER_WEIGHT,
+                             f"メーカー専門: {vehicle_manufacturer}"))
+        if service_type:
+            criteria.append((self.by_service.get(service_type, []), SERVICE_WEIGHT,
+                             f"サービス対応: {service_type}"))
+
+        candidates = (item for item in distances.items()
+                      if all(self._contains(postings, item[0]) for postings, _, _ in criteria))
+        best = heapq.nsmallest(limit, candidates, key=lambda item: (item[1], item[0]))
+        return [self._result(position, sum(weight for _, weight, _ in criteria),
+                             [reason for _, _, reason in criteria], distance)
+                for position, distance in best]
+
+    @staticmethod
+    def _contains(postings: List[int], position: int) -> bool:
+        index = bisect_left(postings, position)
+        return index < len(postings) and postings[index] == position
+
+    def _result(self, position: int, score: int, reasons: List[str],
+                distance_km: Optional[float] = None) -> Dict[str, Any]:
+        garage_result = self.garages[position].copy()
+        garage_result['match_score'] = score
+        garage_result['match_reasons'] = reasons
+        if distance_km is not None:
+            garage_result['distance_km'] = round(distance_km, 2)
+        return garage_result
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'garages': len(self.garages),
+            'geolocated': self.grid.size,
+            'locations': len(self.by_location),
+            'specialties': len(self.by_specialty),
+            'services': len(self.by_service),
+        }
+
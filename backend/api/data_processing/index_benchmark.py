@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark rappel / latence des index FAISS pour le chatbot Goo-net Pit
+Compare les index approximatifs (IVF, HNSW, PQ) à l'index exact (Flat)
+"""
+
+import argparse
+import time
+from typing import Any, Dict, List, Optional
+import logging
+
+import numpy as np
+import faiss
+
+try:
+    from .ann_index import INDEX_FACTORY_STRINGS, build_index, apply_search_params
+except ImportError:
+    from ann_index import INDEX_FACTORY_STRINGS, build_index, apply_search_params
+
+logger = logging.getLogger(__name__)
+
+# Configurations testées par défaut : (type d'index, paramètres)
+DEFAULT_CONFIGS = [
+    ('ivf_flat', {'nprobe': 1}),
+    ('ivf_flat', {'nprobe': 8}),
+    ('ivf_flat', {'nprobe': 32}),
+    ('hnsw', {'ef_search': 16}),
+    ('hnsw', {'ef_search': 64}),
+    ('hnsw', {'ef_search': 256}),
+    ('ivf_pq', {'nprobe': 8}),
+    ('ivf_pq', {'nprobe': 32}),
+    ('opq_ivf_pq', {'nprobe': 32}),
+]
+
+
+def _timed_search(index: faiss.Index, queries: np.ndarray, k: int):
+    """Recherche requête par requête (comme en production) avec latences"""
+    latencies = []
+    all_ids = []
+    for query in queries:
+        start = time.perf_counter()
+        _, ids = index.search(query.reshape(1, -1), k)
+        latencies.append((time.perf_counter() - start) * 1000)
+        all_ids.append(ids[0])
+    return np.array(all_ids), np.array(latencies)
+
+
+def _recall(ids: np.ndarray, ground_truth: np.ndarray) -> float:
+    """Recall@k moyen par rapport aux résultats exacts"""
+    k = ground_truth.shape[1]
+    hits = sum(len(set(found) & set(expected)) for found, expected in zip(ids, ground_truth))
+    return hits / (len(ground_truth) * k)
+
+
+def benchmark_index_types(embeddings: np.ndarray,
+                          queries: np.ndarray,
+                          k: int = 10,
+                          configs: Optional[List] = None) -> List[Dict[str, Any]]:
+    """Mesure rappel@k, latence et taille de chaque configuration face à l'index flat"""
+    embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+    queries = np.ascontiguousarray(queries, dtype=np.float32)
+    faiss.normalize_L2(embeddings)
+    faiss.normalize_L2(queries)
+
+    configs = configs or DEFAULT_CONFIGS
+    results = []
+
+    # Référence exacte
+    flat = build_index(embeddings, 'flat')
+    flat.add(embeddings)
+    ground_truth, flat_latencies = _timed_search(flat, queries, k)
+    results.append(_report('flat', {}, 0.0, flat, 1.0, flat_latencies))
+
+    built = {}
+    for index_type, params in configs:
+        # Un seul entraînement par type ; seuls nprobe/efSearch varient
+        if index_type not in built:
+            start = time.perf_counter()
+            index = build_index(embeddings, index_type, params)
+            index.add(embeddings)
+            built[index_type] = (index, time.perf_counter() - start)
+        index, build_seconds = built[index_type]
+
+        apply_search_params(index, params)
+        ids, latencies = _timed_search(index, queries, k)
+        results.append(_report(index_type, params, build_seconds, index,
+                               _recall(ids, ground_truth), latencies))
+
+    return results
+
+
+def _report(index_type: str, params: Dict[str, Any], build_seconds: float,
+            index: faiss.Index, recall: float, latencies: np.ndarray) -> Dict[str, Any]:
+    return {
+        'index_type': index_type,
+        'params': params,
+        'recall_at_k': round(recall, 4),
+        'latency_ms_mean': round(float(latencies.mean()), 4),
+        'latency_ms_p95': round(float(np.percentile(latencies, 95)), 4),
+        'build_seconds': round(build_seconds, 3),
+        'index_bytes': int(faiss.serialize_index(index).nbytes),
+    }
+
+
+def print_report(results: List[Dict[str, Any]]) -> None:
+    print(f"\n{'index':<12} {'params':<22} {'recall':>7} {'mean ms':>9} {'p95 ms':>9} {'build s':>8} {'MB':>8}")
+    for r in results:
+        params = ", ".join(f"{k}={v}" for k, v in r['params'].items())
+        print(f"{r['index_type']:<12} {params:<22} {r['recall_at_k']:>7.3f} "
+              f"{r['latency_ms_mean']:>9.3f} {r['latency_ms_p95']:>9.3f} "
+              f"{r['build_seconds']:>8.2f} {r['index_bytes'] / 1e6:>8.2f}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark rappel/latence des index FAISS")
+    parser.add_argument('--synthetic', type=int, default=0,
+                        help="Nombre de vecteurs aléatoires (0 : embeddings des articles)")
+    parser.add_argument('--dim', type=int, default=384, help="Dimension des vecteurs synthétiques")
+    parser.add_argument('--queries', type=int, default=200, help="Nombre de requêtes")
+    parser.add_argument('-k', type=int, default=10)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    if args.synthetic:
+        rng = np.random.default_rng(0)
+        embeddings = rng.standard_normal((args.synthetic, args.dim)).astype(np.float32)
+        queries = embeddings[rng.choice(len(embeddings), args.queries)] + \
+            0.1 * rng.standard_normal((args.queries, args.dim)).astype(np.float32)
+    else:
+        try:
+            from .vector_search import GoonetVectorSearch
+        except ImportError:
+            from vector_search import GoonetVectorSearch
+
+        search_engine = GoonetVectorSearch(use_bedrock=False)
+        search_engine.load_data()
+        texts = [search_engine._create_embedding_text(article) for article in search_engine.articles]
+        embeddings = search_engine.get_embeddings_cached(texts)
+        queries = embeddings[:args.queries]
+
+    print_report(benchmark_index_types(embeddings, queries, k=min(args.k, len(embeddings))))
+    print(f"\nTypes disponibles: {', '.join(INDEX_FACTORY_STRINGS)}")
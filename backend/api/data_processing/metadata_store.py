@@ -0,0 +1,375 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Stockage colonnaire des métadonnées de recherche pour le chatbot Goo-net Pit
+Un seul fichier (en-tête JSON + colonnes NumPy) projeté en mémoire et décodé à la demande
+"""
+
+import copy
+import json
+import mmap
+import os
+import struct
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'GNCOL1\n'
+_ALIGN = 8
+
+INT_NULL = np.iinfo(np.int64).min
+
+# Colonnes des métadonnées et leur encodage
+#   string      : table de chaînes (offsets + octets UTF-8)
+#   category    : codes int32 vers un vocabulaire (-1 pour None)
+#   int / float : int64 (INT_NULL pour None) / float64 (NaN pour None)
+#   string_list : liste de chaînes par ligne (offsets de lignes + table de chaînes)
+METADATA_SCHEMA = {
+    'article_id': 'string',
+    'type': 'category',
+    'vehicle_manufacturer': 'category',
+    'vehicle_model': 'category',
+    'vehicle_year': 'int',
+    'obd_codes': 'string_list',
+    'symptom': 'category',
+    'estimated_price': 'int',
+    'estimated_duration': 'float',
+}
+
+
+def _string_table(values: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+    encoded = [value.encode('utf-8') for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    if encoded:
+        offsets[1:] = np.cumsum([len(value) for value in encoded])
+    return offsets, np.frombuffer(b''.join(encoded), dtype=np.uint8)
+
+
+def _splice_strings(offsets: np.ndarray, data: np.ndarray,
+                    pieces: Iterable[Any]) -> Tuple[np.ndarray, np.ndarray]:
+    """Table de chaînes assemblée par morceaux
+
+    Un morceau est soit une plage (début, fin) de chaînes de la table existante,
+    recopiée d'un bloc, soit une liste de nouvelles chaînes encodées.
+    """
+    offset_parts = [np.zeros(1, dtype=np.int64)]
+    data_parts = []
+    position = 0
+    for piece in pieces:
+        if isinstance(piece, tuple):
+            first, last = piece
+            if last <= first:
+                continue
+            start, end = int(offsets[first]), int(offsets[last])
+            offset_parts.append(offsets[first + 1:last + 1] - start + position)
+            data_parts.append(data[start:end])
+            position += end - start
+        elif piece:
+            offset_parts.append(np.cumsum([len(value) for value in piece], dtype=np.int64) + position)
+            data_parts.append(np.frombuffer(b''.join(piece), dtype=np.uint8))
+            position = int(offset_parts[-1][-1])
+    return (np.concatenate(offset_parts),
+            np.concatenate(data_parts) if data_parts else np.zeros(0, dtype=np.uint8))
+
+
+def write_columnar(path: str, rows: Iterable[Optional[Dict[str, Any]]]) -> int:
+    """Écrit les métadonnées au format colonnaire (None = ligne supprimée)
+
+    Des ColumnarMetadata au schéma courant sont recopiées colonne par colonne :
+    seules leurs lignes modifiées ou ajoutées en mémoire sont encodées.
+    """
+    if isinstance(rows, ColumnarMetadata) and rows.schema == METADATA_SCHEMA:
+        n, arrays, vocabularies = rows._spliced_columns()
+        _write_arrays(path, n, arrays, vocabularies)
+        return n
+
+    rows = list(rows)
+    n = len(rows)
+    live = np.array([row is not None for row in rows], dtype=np.uint8)
+    arrays: Dict[str, np.ndarray] = {'_live': live}
+    vocabularies: Dict[str, List[str]] = {}
+
+    for name, kind in METADATA_SCHEMA.items():
+        values = [row.get(name) if row is not None else None for row in rows]
+
+        if kind == 'string':
+            offsets, data = _string_table(['' if v is None else str(v) for v in values])
+            arrays[f'{name}.offsets'], arrays[f'{name}.data'] = offsets, data
+        elif kind == 'category':
+            vocabulary = sorted({str(v) for v in values if v is not None})
+            lookup = {value: code for code, value in enumerate(vocabulary)}
+            arrays[f'{name}.codes'] = np.array(
+                [lookup[str(v)] if v is not None else -1 for v in values], dtype=np.int32)
+            vocabularies[name] = vocabulary
+        elif kind == 'int':
+            arrays[name] = np.array([int(v) if v is not None else INT_NULL for v in values], dtype=np.int64)
+        elif kind == 'float':
+            arrays[name] = np.array([float(v) if v is not None else np.nan for v in values], dtype=np.float64)
+        elif kind == 'string_list':
+            lists = [list(v or []) for v in values]
+            row_offsets = np.zeros(n + 1, dtype=np.int64)
+            if lists:
+                row_offsets[1:] = np.cumsum([len(items) for items in lists])
+            item_offsets, item_data = _string_table([str(item) for items in lists for item in items])
+            arrays[f'{name}.row_offsets'] = row_offsets
+            arrays[f'{name}.item_offsets'], arrays[f'{name}.item_data'] = item_offsets, item_data
+
+    _write_arrays(path, n, arrays, vocabularies)
+    return n
+
+
+def _write_arrays(path: str, n: int, arrays: Dict[str, np.ndarray], vocabularies: Dict[str, List[str]]) -> None:
+    # En-tête : emplacement de chaque colonne dans le fichier
+    columns = {}
+    position = 0
+    for key, array in arrays.items():
+        columns[key] = {'dtype': array.dtype.str, 'offset': position, 'count': int(array.size)}
+        position += -(-array.nbytes // _ALIGN) * _ALIGN
+
+    header = json.dumps({
+        'num_rows': n,
+        'schema': METADATA_SCHEMA,
+        'vocabularies': vocabularies,
+        'columns': columns,
+    }, ensure_ascii=False).encode('utf-8')
+    data_start = -(-(len(MAGIC) + 8 + len(header)) // _ALIGN) * _ALIGN
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + '.tmp')
+    with open(tmp_path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(struct.pack('<Q', len(header)))
+        f.write(header)
+        for key, array in arrays.items():
+            f.seek(data_start + columns[key]['offset'])
+            f.write(array.tobytes())
+        f.truncate(data_start + position)
+
+    # Renommage atomique : les processus qui projettent l'ancien fichier ne sont pas affectés
+    os.replace(tmp_path, path)
+
+
+class ColumnarMetadata:
+    """Métadonnées colonnaires : accès O(1) à une ligne par identifiant FAISS
+
+    Les colonnes ne sont décodées qu'au premier accès ; les lignes modifiées ou
+    ajoutées en mémoire (`__setitem__`, `append`) masquent le fichier jusqu'à la
+    prochaine sauvegarde.
+    """
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        with open(self.path, 'rb') as f:
+            self._data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if self._data[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"Format de métadonnées inconnu: {self.path}")
+        (header_length,) = struct.unpack_from('<Q', self._data, len(MAGIC))
+        header_start = len(MAGIC) + 8
+        header = json.loads(self._data[header_start:header_start + header_length])
+
+        self._data_start = -(-(header_start + header_length) // _ALIGN) * _ALIGN
+        self._columns = header['columns']
+        self.schema = header['schema']
+        self.vocabularies = header['vocabularies']
+        self._num_rows = header['num_rows']
+        self._length = self._num_rows
+        self._arrays: Dict[str, np.ndarray] = {}
+        self._overrides: Dict[int, Optional[Dict[str, Any]]] = {}
+
+    def _array(self, key: str) -> np.ndarray:
+        """Colonne brute (vue NumPy sur le fichier projeté, sans copie)"""
+        if key not in self._arrays:
+            column = self._columns[key]
+            self._arrays[key] = np.frombuffer(self._data, dtype=np.dtype(column['dtype']),
+                                              count=column['count'],
+                                              offset=self._data_start + column['offset'])
+        return self._arrays[key]
+
+    def _string(self, prefix: str, index: int) -> str:
+        offsets = self._array(f'{prefix}offsets')
+        start, end = int(offsets[index]), int(offsets[index + 1])
+        return self._array(f'{prefix}data')[start:end].tobytes().decode('utf-8')
+
+    def _value(self, name: str, row: int) -> Any:
+        kind = self.schema[name]
+        if kind == 'string':
+            return self._string(f'{name}.', row)
+        if kind == 'category':
+            code = int(self._array(f'{name}.codes')[row])
+            return self.vocabularies[name][code] if code >= 0 else None
+        if kind == 'int':
+            value = int(self._array(name)[row])
+            return None if value == INT_NULL else value
+        if kind == 'float':
+            value = float(self._array(name)[row])
+            return None if np.isnan(value) else value
+        if kind == 'string_list':
+            row_offsets = self._array(f'{name}.row_offsets')
+            return [self._string(f'{name}.item_', item)
+                    for item in range(int(row_offsets[row]), int(row_offsets[row + 1]))]
+        raise ValueError(f"Type de colonne inconnu: {kind}")
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __getitem__(self, row):
+        if isinstance(row, slice):
+            return [self[i] for i in range(*row.indices(self._length))]
+
+        row = int(row)
+        if row < 0:
+            row += self._length
+        if not 0 <= row < self._length:
+            raise IndexError(row)
+
+        if row in self._overrides:
+            return self._overrides[row]
+        if not self._array('_live')[row]:
+            return None
+        return {name: self._value(name, row) for name in self.schema}
+
+    def __setitem__(self, row: int, value: Optional[Dict[str, Any]]) -> None:
+        if not 0 <= row < self._length:
+            raise IndexError(row)
+        self._overrides[row] = value
+
+    def append(self, value: Optional[Dict[str, Any]]) -> None:
+        self._overrides[self._length] = value
+        self._length += 1
+
+    def snapshot(self) -> 'ColumnarMetadata':
+        """Copie en lecture seule : même fichier projeté, modifications figées à cet instant"""
+        clone = copy.copy(self)
+        clone._overrides = dict(self._overrides)
+        return clone
+
+    def _spliced_columns(self) -> Tuple[int, Dict[str, np.ndarray], Dict[str, List[str]]]:
+        """Colonnes du fichier avec les lignes de `_overrides` appliquées
+
+        Colonnes de taille fixe copiées puis corrigées ligne par ligne ; tables
+        de chaînes recopiées par plages de lignes non modifiées. Les nouvelles
+        valeurs catégorielles sont ajoutées en fin de vocabulaire.
+        """
+        n, file_rows = self._length, self._num_rows
+        modified = sorted(self._overrides)
+        # Plages de lignes du fichier non modifiées, intercalées avec les lignes modifiées
+        runs = []
+        start = 0
+        for row in modified:
+            runs.append((min(start, file_rows), min(row, file_rows)))
+            start = row + 1
+        runs.append((min(start, file_rows), file_rows))
+
+        def fixed(key: str, fill) -> np.ndarray:
+            column = np.full(n, fill, dtype=self._array(key).dtype)
+            column[:file_rows] = self._array(key)
+            return column
+
+        live = fixed('_live', 0)
+        for row in modified:
+            live[row] = self._overrides[row] is not None
+        arrays: Dict[str, np.ndarray] = {'_live': live}
+        vocabularies: Dict[str, List[str]] = {}
+
+        for name, kind in self.schema.items():
+            values = [(row, (self._overrides[row] or {}).get(name)) for row in modified]
+
+            if kind == 'string':
+                encoded = {row: ('' if v is None else str(v)).encode('utf-8') for row, v in values}
+                pieces = [piece for (first, last), row in zip(runs, modified + [None])
+                          for piece in ((first, last), [encoded[row]] if row is not None else [])]
+                arrays[f'{name}.offsets'], arrays[f'{name}.data'] = _splice_strings(
+                    self._array(f'{name}.offsets'), self._array(f'{name}.data'), pieces)
+            elif kind == 'category':
+                vocabulary = list(self.vocabularies[name])
+                lookup = {value: code for code, value in enumerate(vocabulary)}
+                codes = fixed(f'{name}.codes', -1)
+                for row, v in values:
+                    if v is None:
+                        codes[row] = -1
+                        continue
+                    if str(v) not in lookup:
+                        lookup[str(v)] = len(vocabulary)
+                        vocabulary.append(str(v))
+                    codes[row] = lookup[str(v)]
+                arrays[f'{name}.codes'] = codes
+                vocabularies[name] = vocabulary
+            elif kind == 'int':
+                column = fixed(name, INT_NULL)
+                for row, v in values:
+                    column[row] = int(v) if v is not None else INT_NULL
+                arrays[name] = column
+            elif kind == 'float':
+                column = fixed(name, np.nan)
+                for row, v in values:
+                    column[row] = float(v) if v is not None else np.nan
+                arrays[name] = column
+            elif kind == 'string_list':
+                file_offsets = self._array(f'{name}.row_offsets')
+                counts = np.zeros(n, dtype=np.int64)
+                counts[:file_rows] = np.diff(file_offsets)
+                items = {row: [str(item).encode('utf-8') for item in v or []] for row, v in values}
+                for row, encoded in items.items():
+                    counts[row] = len(encoded)
+                row_offsets = np.zeros(n + 1, dtype=np.int64)
+                np.cumsum(counts, out=row_offsets[1:])
+                pieces = [piece for (first, last), row in zip(runs, modified + [None])
+                          for piece in ((int(file_offsets[first]), int(file_offsets[last])),
+                                        items[row] if row is not None else [])]
+                arrays[f'{name}.row_offsets'] = row_offsets
+                arrays[f'{name}.item_offsets'], arrays[f'{name}.item_data'] = _splice_strings(
+                    self._array(f'{name}.item_offsets'), self._array(f'{name}.item_data'), pieces)
+
+        return n, arrays, vocabularies
+
+    def __iter__(self) -> Iterator[Optional[Dict[str, Any]]]:
+        for row in range(self._length):
+            yield self[row]
+
+    def live_article_ids(self) -> Iterator[Tuple[int, str]]:
+        """(identifiant FAISS, article_id) des lignes actives, sans décoder les autres colonnes"""
+        live = self._array('_live')
+        for row in range(self._length):
+            if row in self._overrides:
+                value = self._overrides[row]
+                if value is not None:
+                    yield row, str(value['article_id'])
+            elif live[row]:
+                yield row, self._string('article_id.', row)
+
+    def live_mask(self) -> np.ndarray:
+        """Lignes actives du fichier (booléens), modifications en mémoire non comprises"""
+        return self._array('_live').astype(bool)
+
+    def category_codes(self, name: str) -> Tuple[np.ndarray, List[str]]:
+        """Colonne catégorielle du fichier : codes int32 (-1 pour None) et vocabulaire"""
+        return self._array(f'{name}.codes'), self.vocabularies[name]
+
+    def numeric_values(self, name: str) -> np.ndarray:
+        """Colonne numérique du fichier en float64 (NaN pour None)"""
+        values = self._array(name)
+        if self.schema[name] == 'int':
+            values = np.where(values == INT_NULL, np.nan, values.astype(np.float64))
+        return values
+
+    def modified_rows(self) -> Iterator[Tuple[int, Optional[Dict[str, Any]]]]:
+        """(identifiant FAISS, métadonnées ou None) des lignes modifiées ou ajoutées en mémoire"""
+        return iter(sorted(self._overrides.items()))
+
+    def live_columns(self, names: Iterable[str]) -> Iterator[Tuple[int, Dict[str, Any]]]:
+        """(identifiant FAISS, {colonne: valeur}) des lignes actives, colonnes `names` seulement"""
+        names = tuple(names)
+        live = self._array('_live')
+        for row in range(self._length):
+            if row in self._overrides:
+                value = self._overrides[row]
+                if value is not None:
+                    yield row, {name: value.get(name) for name in names}
+            elif live[row]:
+                yield row, {name: self._value(name, row) for name in names}
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Métriques Prometheus du chatbot Goo-net Pit
+Latence par étape, jetons Claude, caches et taille de l'index
+"""
+
+import os
+from typing import Any, Dict, Iterator, Optional
+import logging
+
+from prometheus_client import (CollectorRegistry, Counter, Gauge, Histogram, REGISTRY,
+                               CONTENT_TYPE_LATEST, generate_latest)
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+logger = logging.getLogger(__name__)
+
+# Seuils (secondes) couvrant un cache hit (~0.1 ms) comme un appel Claude (~30 s)
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25,
+                   0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0)
+
+# Étapes mesurées :
+#   embedding, faiss_search, sparse_search, bedrock, logging, log_flush : opérations élémentaires
+#   entities, search_results, prompt, response, recommended_garages, confidence,
+#   appointment_form, follow_up_questions : étapes du graphe de process_message
+STAGE_LATENCY = Histogram(
+    'goonet_stage_duration_seconds',
+    "Durée de chaque étape du traitement d'un message",
+    ['stage'],
+    buckets=LATENCY_BUCKETS,
+)
+
+STAGE_OUTCOMES = Counter(
+    'goonet_stage_outcomes_total',
+    "Résultat des étapes du graphe (ok, timeout, error)",
+    ['stage', 'status'],
+)
+
+REQUEST_LATENCY = Histogram(
+    'goonet_http_request_duration_seconds',
+    "Durée des requêtes HTTP par route",
+    ['method', 'route', 'status'],
+    buckets=LATENCY_BUCKETS,
+)
+
+LLM_TOKENS = Counter(
+    'goonet_llm_tokens_total',
+    "Jetons consommés par Claude",
+    ['direction'],
+)
+
+RETRIEVAL_RESULTS = Counter(
+    'goonet_retrieval_results_total',
+    "Résultats de la recherche hybride selon le moteur qui les a trouvés (dense, sparse, both)",
+    ['retriever'],
+)
+
+OBD_FAST_PATH = Counter(
+    'goonet_obd_fast_path_total',
+    "Messages avec code OBD : réponse depuis l'index des codes (hit) ou recherche complète (miss)",
+    ['outcome'],
+)
+
+SEARCH_FILTER = Counter(
+    'goonet_search_filter_total',
+    "Filtre des entités appliqué à la recherche : complet (entities), relâché (manufacturer) ou aucun (none)",
+    ['level'],
+)
+
+LOG_ENTRIES = Counter(
+    'goonet_conversation_log_entries_total',
+    "Entrées du journal des conversations (written, dropped, failed)",
+    ['outcome'],
+)
+
+LOG_QUEUE_DEPTH = Gauge(
+    'goonet_conversation_log_queue_depth',
+    "Entrées en attente d'écriture dans le journal des conversations",
+    multiprocess_mode='livesum',
+)
+
+
+def observe_stage_run(run) -> None:
+    """Enregistre durées et statuts d'une exécution de StageGraph"""
+    for stage, duration in run.durations.items():
+        STAGE_LATENCY.labels(stage).observe(duration)
+        STAGE_OUTCOMES.labels(stage, run.statuses.get(stage, 'ok')).inc()
+
+
+def record_llm_usage(usage: Optional[Dict[str, Any]]) -> None:
+    """Jetons d'entrée/sortie rapportés par Bedrock (`usage` de l'API Messages)"""
+    if not usage:
+        return
+    if usage.get('input_tokens'):
+        LLM_TOKENS.labels('input').inc(usage['input_tokens'])
+    if usage.get('output_tokens'):
+        LLM_TOKENS.labels('output').inc(usage['output_tokens'])
+
+
+class SearchEngineCollector:
+    """Métriques lues à chaque collecte : caches, taille de l'index, articles, garages"""
+
+    def __init__(self, search_engine):
+        self.search_engine = search_engine
+
+    def collect(self) -> Iterator[Any]:
+        engine = self.search_engine
+
+        hits = CounterMetricFamily('goonet_cache_hits', "Accès au cache trouvés", labels=['cache'])
+        misses = CounterMetricFamily('goonet_cache_misses', "Accès au cache manqués", labels=['cache'])
+        size = GaugeMetricFamily('goonet_cache_entries', "Entrées en cache", labels=['cache'])
+        hit_rate = GaugeMetricFamily('goonet_cache_hit_ratio', "Taux de succès du cache", labels=['cache'])
+
+        caches = {
+            'query_embeddings': engine.query_embedding_cache.stats(),
+            'search_results': engine.result_cache.stats(),
+        }
+        if engine.embedding_cache is not None:
+            cache = engine.embedding_cache
+            total = cache.hits + cache.misses
+            caches['embeddings'] = {'hits': cache.hits, 'misses': cache.misses, 'size': len(cache),
+                                    'hit_rate': cache.hits / total if total else 0.0}
+
+        for name, stats in caches.items():
+            hits.add_metric([name], stats['hits'])
+            misses.add_metric([name], stats['misses'])
+            size.add_metric([name], stats['size'])
+            hit_rate.add_metric([name], stats['hit_rate'])
+        yield from (hits, misses, size, hit_rate)
+
+        yield GaugeMetricFamily('goonet_index_vectors', "Vecteurs dans l'index FAISS",
+                                value=engine.index.ntotal if engine.index is not None else 0)
+        yield GaugeMetricFamily('goonet_index_version', "Version de l'index (incrémentée à chaque modification)",
+                                value=engine.index_version)
+        yield GaugeMetricFamily('goonet_articles', "Articles actifs", value=engine.article_count)
+        yield GaugeMetricFamily('goonet_garages', "Garages chargés", value=len(engine.garages))
+
+
+def register_search_engine(search_engine, registry: CollectorRegistry = REGISTRY) -> SearchEngineCollector:
+    collector = SearchEngineCollector(search_engine)
+    registry.register(collector)
+    return collector
+
+
+def render_metrics(collectors=()) -> tuple:
+    """(contenu, type MIME) au format texte Prometheus
+
+    Avec PROMETHEUS_MULTIPROC_DIR (plusieurs workers uvicorn), les histogrammes et
+    compteurs sont agrégés sur tous les processus ; les `collectors` (jauges de
+    l'index et des caches) restent ceux du worker qui répond.
+    """
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        from prometheus_client import multiprocess
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        for collector in collectors:
+            registry.register(collector)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Index des codes OBD pour le chatbot Goo-net Pit
+Table code normalisé -> articles, pour répondre sans recherche vectorielle
+"""
+
+import copy
+import os
+import unicodedata
+from pathlib import Path
+from typing import Dict, Iterable, List, Tuple
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_obd_code(code: str) -> Tuple[str, str]:
+    """(code complet, code de base) : « ｕ３００３－１ｃ » -> ('U3003-1C', 'U3003')"""
+    code = unicodedata.normalize('NFKC', code).strip().upper()
+    return code, code.split('-')[0]
+
+
+class _Postings:
+    """Lignes par clé, figées en tableaux numpy (format CSR)"""
+
+    def __init__(self, keys: List[str] = (), offsets: np.ndarray = None, rows: np.ndarray = None):
+        self.vocabulary: Dict[str, int] = dict(zip(keys, range(len(keys))))
+        self.offsets = np.zeros(1, dtype=np.int64) if offsets is None else offsets
+        self.rows = np.zeros(0, dtype=np.int64) if rows is None else rows
+
+    def get(self, key: str) -> np.ndarray:
+        key_id = self.vocabulary.get(key)
+        if key_id is None:
+            return self.rows[:0]
+        return self.rows[self.offsets[key_id]:self.offsets[key_id + 1]]
+
+    def merged(self, live: np.ndarray, overlay: Dict[str, Dict[int, None]]) -> '_Postings':
+        """Postings figés des lignes vivantes fusionnés avec la surcouche (clés sans ligne retirées)"""
+        keys = sorted(self.vocabulary.keys() | overlay.keys())
+        key_ids = dict(zip(keys, range(len(keys))))
+        renumbered = np.array([key_ids[key] for key in sorted(self.vocabulary, key=self.vocabulary.get)],
+                              dtype=np.int64)
+        frozen_keys = np.repeat(renumbered, np.diff(self.offsets))
+        kept = live[self.rows]
+
+        added = [(key_ids[key], row) for key, rows in overlay.items() for row in rows]
+        added = np.array(added, dtype=np.int64).reshape(-1, 2)
+        pairs = np.unique(np.column_stack([np.concatenate([frozen_keys[kept], added[:, 0]]),
+                                           np.concatenate([self.rows[kept], added[:, 1]])]), axis=0)
+
+        counts = np.bincount(pairs[:, 0], minlength=len(keys))
+        used = np.flatnonzero(counts)
+        offsets = np.zeros(len(used) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(counts[used])
+        return _Postings([keys[key_id] for key_id in used], offsets, pairs[:, 1].copy())
+
+
+class ObdCodeIndex:
+    """Articles (identifiants FAISS) par code OBD complet et par code de base
+
+    `U3003-1C` est indexé sous `U3003-1C` et sous `U3003` : une requête avec le
+    code de base trouve toutes les variantes de suffixe. Comme l'index BM25, les
+    postings sont figés en tableaux (sauvegardés avec l'index) ; les lignes
+    ajoutées ou modifiées ensuite vont dans une surcouche, fusionnée au prochain
+    `compact()` (appelé par `save()`).
+    """
+
+    def __init__(self):
+        self._codes = _Postings()
+        self._bases = _Postings()
+        # Lignes dont les postings figés sont encore valides
+        self._base_live = np.zeros(0, dtype=bool)
+        # Surcouche : dictionnaires utilisés comme ensembles ordonnés (ordre d'insertion)
+        self._by_code: Dict[str, Dict[int, None]] = {}
+        self._by_base: Dict[str, Dict[int, None]] = {}
+        self._codes_by_row: Dict[int, List[str]] = {}
+        # Modifié depuis le dernier compact()
+        self._dirty = False
+
+    def __len__(self) -> int:
+        """Codes distincts (un code figé sans ligne vivante compte jusqu'au compact())"""
+        return len(self._codes.vocabulary.keys() | self._by_code.keys())
+
+    def add(self, row: int, codes: Iterable[str]) -> None:
+        """Indexe (ou réindexe) les codes OBD d'une ligne"""
+        self.remove(row)
+        normalized = list(dict.fromkeys(normalize_obd_code(code)[0] for code in codes or () if code))
+        if not normalized:
+            return
+        for code in normalized:
+            self._by_code.setdefault(code, {})[row] = None
+            self._by_base.setdefault(code.split('-')[0], {})[row] = None
+        self._codes_by_row[row] = normalized
+        self._dirty = True
+
+    def remove(self, row: int) -> None:
+        if row < len(self._base_live) and self._base_live[row]:
+            self._base_live[row] = False
+            self._dirty = True
+        for code in self._codes_by_row.pop(row, ()):
+            for table, key in ((self._by_code, code), (self._by_base, code.split('-')[0])):
+                rows = table.get(key)
+                if rows is not None:
+                    rows.pop(row, None)
+                    if not rows:
+                        del table[key]
+
+    def _rows(self, frozen: _Postings, overlay: Dict[str, Dict[int, None]], key: str) -> np.ndarray:
+        """Lignes vivantes de la clé (figées + surcouche), triées"""
+        rows = frozen.get(key)
+        rows = rows[self._base_live[rows]]
+        added = overlay.get(key)
+        if added:
+            rows = np.concatenate([rows, np.fromiter(added, dtype=np.int64, count=len(added))])
+        return np.unique(rows)
+
+    def lookup(self, code: str) -> List[Tuple[int, bool]]:
+        """(ligne, correspondance exacte) : code identique d'abord, puis même code de base"""
+        code, base = normalize_obd_code(code)
+        exact = self._rows(self._codes, self._by_code, code)
+        same_base = np.setdiff1d(self._rows(self._bases, self._by_base, base), exact, assume_unique=True)
+        return [(row, True) for row in exact.tolist()] + [(row, False) for row in same_base.tolist()]
+
+    def snapshot(self) -> 'ObdCodeIndex':
+        """Copie indépendante des modifications ultérieures (postings figés partagés)"""
+        clone = copy.copy(self)
+        clone._base_live = self._base_live.copy()
+        clone._by_code = {code: dict(rows) for code, rows in self._by_code.items()}
+        clone._by_base = {base: dict(rows) for base, rows in self._by_base.items()}
+        clone._codes_by_row = dict(self._codes_by_row)
+        return clone
+
+    def compact(self) -> None:
+        """Fige la surcouche avec les postings existants (tableaux CSR)"""
+        if not self._dirty:
+            return
+
+        self._codes = self._codes.merged(self._base_live, self._by_code)
+        self._bases = self._bases.merged(self._base_live, self._by_base)
+        self._base_live = self._live_rows(self._codes.rows)
+        self._by_code = {}
+        self._by_base = {}
+        self._codes_by_row = {}
+        self._dirty = False
+
+    @staticmethod
+    def _live_rows(rows: np.ndarray) -> np.ndarray:
+        live = np.zeros(int(rows.max()) + 1 if len(rows) else 0, dtype=bool)
+        live[rows] = True
+        return live
+
+    @classmethod
+    def build(cls, rows: Iterable[Tuple[int, Iterable[str]]]) -> 'ObdCodeIndex':
+        """Index des (ligne, codes), figé"""
+        index = cls()
+        for row, codes in rows:
+            index.add(row, codes)
+        index.compact()
+        return index
+
+    def save(self, path: str) -> None:
+        """Écrit l'index (npz) sous un nom temporaire renommé atomiquement"""
+        self.compact()
+        path = Path(path)
+        tmp_path = path.with_name(path.name + '.tmp')
+        arrays = {}
+        for name, postings in (('codes', self._codes), ('bases', self._bases)):
+            # Codes séparés par des sauts de ligne : pas de pickle
+            keys = '\n'.join(sorted(postings.vocabulary, key=postings.vocabulary.get)).encode('utf-8')
+            arrays[name] = np.frombuffer(keys, dtype=np.uint8)
+            arrays[f'{name}_offsets'] = postings.offsets
+            arrays[f'{name}_rows'] = postings.rows
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, **arrays)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> 'ObdCodeIndex':
+        index = cls()
+        with np.load(path, allow_pickle=False) as data:
+            for name in ('codes', 'bases'):
+                keys = data[name].tobytes().decode('utf-8')
+                setattr(index, f'_{name}', _Postings(keys.split('\n') if keys else [],
+                                                     data[f'{name}_offsets'], data[f'{name}_rows']))
+        index._base_live = cls._live_rows(index._codes.rows)
+        return index
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'codes': len(self),
+            'base_codes': len(self._bases.vocabulary.keys() | self._by_base.keys()),
+            'articles': int(np.count_nonzero(self._base_live)) + len(self._codes_by_row),
+        }
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Stockage d'enregistrements JSON adressables par ligne pour le chatbot Goo-net Pit
+Fichier JSON Lines + table d'offsets, lus via mmap (partagés entre processus)
+"""
+
+import copy
+import json
+import mmap
+import os
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, Optional
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def _offsets_path(path: Path) -> Path:
+    return path.with_name(path.name + '.offsets.npy')
+
+
+def _encode(record: Optional[Dict[str, Any]]) -> bytes:
+    """Ligne JSON d'un enregistrement (ligne vide pour None)"""
+    if record is None:
+        return b'\n'
+    return json.dumps(record, ensure_ascii=False).encode('utf-8') + b'\n'
+
+
+def write_records(path: str, records: Iterable[Optional[Dict[str, Any]]]) -> int:
+    """Écrit les enregistrements (une ligne JSON chacun, ligne vide pour None)
+
+    L'écriture passe par des fichiers temporaires renommés atomiquement, ce qui
+    laisse intacts les fichiers déjà projetés en mémoire par d'autres processus.
+    Une MmapRecordList est recopiée octet pour octet : seules ses lignes
+    modifiées ou ajoutées en mémoire sont encodées.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + '.tmp')
+
+    with open(tmp_path, 'wb') as f:
+        if isinstance(records, MmapRecordList):
+            offsets = records._write_to(f)
+        else:
+            offsets = [0]
+            for record in records:
+                f.write(_encode(record))
+                offsets.append(f.tell())
+
+    offsets_file = _offsets_path(path)
+    tmp_offsets = offsets_file.with_name(offsets_file.name + '.tmp')
+    with open(tmp_offsets, 'wb') as f:
+        np.save(f, np.asarray(offsets, dtype=np.int64))
+
+    os.replace(tmp_path, path)
+    os.replace(tmp_offsets, offsets_file)
+    return len(offsets) - 1
+
+
+def records_exist(path: str) -> bool:
+    path = Path(path)
+    return path.exists() and _offsets_path(path).exists()
+
+
+class MmapRecordList:
+    """Liste d'enregistrements décodés à la demande depuis un fichier projeté en mémoire
+
+    Se comporte comme une liste : les lignes modifiées ou ajoutées en mémoire
+    (`__setitem__`, `append`) masquent le contenu du fichier jusqu'à la prochaine
+    sauvegarde.
+    """
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self._offsets = np.load(_offsets_path(self.path), mmap_mode='r')
+
+        with open(self.path, 'rb') as f:
+            # mmap refuse les fichiers vides
+            self._data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) \
+                if os.fstat(f.fileno()).st_size else b''
+
+        self._overrides: Dict[int, Optional[Dict[str, Any]]] = {}
+        self._length = len(self._offsets) - 1
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __getitem__(self, row):
+        if isinstance(row, slice):
+            return [self[i] for i in range(*row.indices(self._length))]
+
+        row = int(row)
+        if row < 0:
+            row += self._length
+        if not 0 <= row < self._length:
+            raise IndexError(row)
+
+        if row in self._overrides:
+            return self._overrides[row]
+
+        start, end = int(self._offsets[row]), int(self._offsets[row + 1]) - 1
+        if end <= start:
+            return None
+        return json.loads(self._data[start:end])
+
+    def __setitem__(self, row: int, value: Optional[Dict[str, Any]]) -> None:
+        if not 0 <= row < self._length:
+            raise IndexError(row)
+        self._overrides[row] = value
+
+    def append(self, value: Optional[Dict[str, Any]]) -> None:
+        self._overrides[self._length] = value
+        self._length += 1
+
+    def snapshot(self) -> 'MmapRecordList':
+        """Copie en lecture seule : même fichier projeté, modifications figées à cet instant"""
+        clone = copy.copy(self)
+        clone._overrides = dict(self._overrides)
+        return clone
+
+    def _write_to(self, f) -> np.ndarray:
+        """Écrit toutes les lignes dans `f` et renvoie leurs offsets
+
+        Les plages de lignes non modifiées sont copiées d'un bloc depuis le
+        fichier projeté, leurs offsets décalés ; seules les lignes de
+        `_overrides` sont encodées.
+        """
+        file_rows = len(self._offsets) - 1
+        offsets = np.zeros(self._length + 1, dtype=np.int64)
+        position = 0
+        start = 0
+        with memoryview(self._data) as data:
+            for row in sorted(self._overrides) + [self._length]:
+                end = min(row, file_rows)
+                if end > start:
+                    first, last = int(self._offsets[start]), int(self._offsets[end])
+                    f.write(data[first:last])
+                    offsets[start + 1:end + 1] = self._offsets[start + 1:end + 1] - first + position
+                    position += last - first
+                if row == self._length:
+                    break
+                position += f.write(_encode(self._overrides[row]))
+                offsets[row + 1] = position
+                start = row + 1
+        return offsets
+
+    def __iter__(self) -> Iterator[Optional[Dict[str, Any]]]:
+        for row in range(self._length):
+            yield self[row]
@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Index lexical BM25 pour le chatbot Goo-net Pit
+Bigrammes de caractères pour le japonais, mots entiers pour les codes OBD et
+noms de modèles latins ; complète la recherche vectorielle FAISS
+"""
+
+import copy
+import math
+import os
+import re
+import unicodedata
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Mots latins/numériques (« u3003-1c », « n-box ») ou suites de caractères japonais
+TOKEN_PATTERN = re.compile(r'[0-9a-z]+(?:-[0-9a-z]+)*|[^\W\x00-\x7f]+')
+
+
+def tokenize(text: str) -> List[str]:
+    """Termes indexés : mots latins (et leurs parties), bigrammes des suites japonaises"""
+    terms = []
+    for match in TOKEN_PATTERN.finditer(unicodedata.normalize('NFKC', text).casefold()):
+        token = match.group(0)
+        if token.isascii():
+            terms.append(token)
+            if '-' in token:
+                # « u3003-1c » retrouvé aussi par « u3003 »
+                terms.extend(part for part in token.split('-') if len(part) > 1)
+        elif len(token) == 1:
+            terms.append(token)
+        else:
+            terms.extend(token[i:i + 2] for i in range(len(token) - 1))
+    return terms
+
+
+class SparseIndex:
+    """Index inversé BM25 sur des lignes numérotées (mêmes identifiants que FAISS)
+
+    Les listes de postings construites sont figées en tableaux numpy (format CSR) ;
+    les lignes ajoutées ou modifiées ensuite vont dans une surcouche en mémoire,
+    fusionnée au prochain `compact()` (appelé par `save()`).
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        # Postings figés : termes -> [offsets[t], offsets[t + 1]) dans rows / tfs
+        self._vocabulary: Dict[str, int] = {}
+        self._offsets = np.zeros(1, dtype=np.int64)
+        self._rows = np.zeros(0, dtype=np.int64)
+        self._tfs = np.zeros(0, dtype=np.float32)
+        # Lignes dont les postings figés sont encore valides
+        self._base_live = np.zeros(0, dtype=bool)
+        # Surcouche : terme -> {ligne: fréquence}, et termes de chaque ligne
+        self._overlay: Dict[str, Dict[int, int]] = {}
+        self._overlay_terms: Dict[int, List[str]] = {}
+        # Longueur (en termes) de chaque ligne ; 0 pour une ligne absente ou supprimée
+        self._doc_lengths = np.zeros(0, dtype=np.float32)
+        self._live_count = 0
+        self._total_length = 0.0
+        # Modifié depuis le dernier compact()
+        self._dirty = False
+
+    def __len__(self) -> int:
+        return self._live_count
+
+    @property
+    def vocabulary_size(self) -> int:
+        return len(self._vocabulary) + sum(1 for term in self._overlay if term not in self._vocabulary)
+
+    def _ensure_rows(self, row: int) -> None:
+        if row >= len(self._doc_lengths):
+            grown = np.zeros(max(row + 1, 2 * len(self._doc_lengths)), dtype=np.float32)
+            grown[:len(self._doc_lengths)] = self._doc_lengths
+            self._doc_lengths = grown
+
+    def add(self, row: int, text: str) -> None:
+        """Indexe (ou réindexe) le texte d'une ligne"""
+        self.remove(row)
+        self._dirty = True
+        terms = tokenize(text)
+        if not terms:
+            return
+        counts = Counter(terms)
+        for term, count in counts.items():
+            self._overlay.setdefault(term, {})[row] = count
+        self._overlay_terms[row] = list(counts)
+
+        self._ensure_rows(row)
+        self._doc_lengths[row] = len(terms)
+        self._live_count += 1
+        self._total_length += len(terms)
+
+    def remove(self, row: int) -> None:
+        if row < len(self._doc_lengths) and self._doc_lengths[row]:
+            self._dirty = True
+        if row < len(self._base_live) and self._base_live[row]:
+            self._base_live[row] = False
+        for term in self._overlay_terms.pop(row, ()):
+            postings = self._overlay[term]
+            del postings[row]
+            if not postings:
+                del self._overlay[term]
+        if row < len(self._doc_lengths) and self._doc_lengths[row]:
+            self._live_count -= 1
+            self._total_length -= float(self._doc_lengths[row])
+            self._doc_lengths[row] = 0
+
+    def search(self, query: str, k: int, allowed: Optional[np.ndarray] = None) -> List[Tuple[int, float]]:
+        """Les k lignes au meilleur score BM25, (ligne, score) par score décroissant
+
+        `allowed` : masque booléen par ligne ; les lignes hors masque sont ignorées.
+        """
+        query_terms = Counter(tokenize(query))
+        if not query_terms or not self._live_count:
+            return []
+
+        # Seules les lignes des postings des termes de la requête sont touchées
+        average_length = self._total_length / self._live_count
+        rows_parts, score_parts = [], []
+        for term, query_count in query_terms.items():
+            rows, tfs = self._postings(term)
+            if not len(rows):
+                continue
+            idf = math.log(1 + (self._live_count - len(rows) + 0.5) / (len(rows) + 0.5))
+            length_norm = self.k1 * (1 - self.b + self.b * self._doc_lengths[rows] / average_length)
+            rows_parts.append(rows)
+            score_parts.append(query_count * idf * tfs * (self.k1 + 1) / (tfs + length_norm))
+        if not rows_parts:
+            return []
+
+        # Somme par ligne des contributions de chaque terme
+        candidates, inverse = np.unique(np.concatenate(rows_parts), return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(score_parts))
+
+        if allowed is not None:
+            admitted = candidates < len(allowed)
+            admitted[admitted] = allowed[candidates[admitted]]
+            candidates, scores = candidates[admitted], scores[admitted]
+
+        if len(candidates) > k:
+            # k-ième meilleur score ; les ex aequo sont départagés par numéro de ligne
+            threshold = np.partition(scores, len(scores) - k)[len(scores) - k]
+            kept = scores >= threshold
+            candidates, scores = candidates[kept], scores[kept]
+        order = np.lexsort((candidates, -scores))[:k]
+        return [(int(candidates[i]), float(scores[i])) for i in order]
+
+    def _postings(self, term: str) -> Tuple[np.ndarray, np.ndarray]:
+        """Lignes vivantes contenant le terme et fréquences (figées + surcouche)"""
+        rows = tfs = None
+        term_id = self._vocabulary.get(term)
+        if term_id is not None:
+            start, end = self._offsets[term_id], self._offsets[term_id + 1]
+            rows, tfs = self._rows[start:end], self._tfs[start:end]
+            live = self._base_live[rows]
+            if not live.all():
+                rows, tfs = rows[live], tfs[live]
+
+        overlay = self._overlay.get(term)
+        if overlay:
+            overlay_rows = np.fromiter(overlay.keys(), dtype=np.int64, count=len(overlay))
+            overlay_tfs = np.fromiter(overlay.values(), dtype=np.float32, count=len(overlay))
+            if rows is None:
+                return overlay_rows, overlay_tfs
+            return np.concatenate([rows, overlay_rows]), np.concatenate([tfs, overlay_tfs])
+
+        if rows is None:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        return rows, tfs
+
+    def snapshot(self) -> 'SparseIndex':
+        """Copie indépendante des modifications ultérieures (postings figés partagés)
+
+        Les tableaux figés ne sont jamais modifiés en place (compact() les remplace) ;
+        seuls la surcouche et les tableaux par ligne sont recopiés.
+        """
+        clone = copy.copy(self)
+        clone._overlay = {term: dict(postings) for term, postings in self._overlay.items()}
+        clone._overlay_terms = dict(self._overlay_terms)
+        clone._base_live = self._base_live.copy()
+        clone._doc_lengths = self._doc_lengths.copy()
+        return clone
+
+    def compact(self) -> None:
+        """Fige la surcouche avec les postings existants (tableaux CSR)"""
+        if not self._dirty:
+            return
+
+        terms = sorted(set(self._vocabulary) | set(self._overlay))
+        offsets = [0]
+        rows_parts, tfs_parts = [], []
+        for term in terms:
+            rows, tfs = self._postings(term)
+            order = np.argsort(rows, kind='stable')
+            rows_parts.append(rows[order])
+            tfs_parts.append(tfs[order])
+            offsets.append(offsets[-1] + len(rows))
+
+        self._vocabulary = {term: term_id for term_id, term in enumerate(terms)}
+        self._offsets = np.array(offsets, dtype=np.int64)
+        self._rows = np.concatenate(rows_parts) if rows_parts else np.zeros(0, dtype=np.int64)
+        self._tfs = np.concatenate(tfs_parts) if tfs_parts else np.zeros(0, dtype=np.float32)
+        self._base_live = self._doc_lengths > 0
+        self._overlay = {}
+        self._overlay_terms = {}
+        self._dirty = False
+
+    @classmethod
+    def build(cls, documents: Iterable[Tuple[int, str]], **kwargs) -> 'SparseIndex':
+        """Index des (ligne, texte), figé"""
+        index = cls(**kwargs)
+        for row, text in documents:
+            index.add(row, text)
+        index.compact()
+        return index
+
+    def save(self, path: str) -> None:
+        """Écrit l'index (npz) sous un nom temporaire renommé atomiquement"""
+        self.compact()
+        path = Path(path)
+        tmp_path = path.with_name(path.name + '.tmp')
+        # Termes séparés par des sauts de ligne (absents des termes) : pas de pickle
+        terms = '\n'.join(sorted(self._vocabulary, key=self._vocabulary.get)).encode('utf-8')
+        with open(tmp_path, 'wb') as f:
+            np.savez(f,
+                     terms=np.frombuffer(terms, dtype=np.uint8),
+                     offsets=self._offsets,
+                     rows=self._rows,
+                     tfs=self._tfs,
+                     doc_lengths=self._doc_lengths,
+                     params=np.array([self.k1, self.b], dtype=np.float64))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> 'SparseIndex':
+        with np.load(path, allow_pickle=False) as data:
+            k1, b = data['params'].tolist()
+            index = cls(k1=k1, b=b)
+            terms = data['terms'].tobytes().decode('utf-8')
+            index._vocabulary = {term: term_id for term_id, term in enumerate(terms.split('\n'))} if terms else {}
+            index._offsets = data['offsets']
+            index._rows = data['rows']
+            index._tfs = data['tfs']
+            index._doc_lengths = data['doc_lengths'].copy()
+        index._base_live = index._doc_lengths > 0
+        index._live_count = int(np.count_nonzero(index._doc_lengths))
+        index._total_length = float(index._doc_lengths.sum())
+        return index
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'documents': self._live_count,
+            'terms': self.vocabulary_size,
+            'postings': int(len(self._rows)) + sum(len(postings) for postings in self._overlay.values()),
+        }
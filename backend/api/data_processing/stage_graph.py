@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Exécution en graphe des étapes de traitement pour le chatbot Goo-net Pit
+Les étapes indépendantes s'exécutent en parallèle, chacune avec délai maximal et repli
+"""
+
+import asyncio
+import time
+from concurrent.futures import Executor, FIRST_COMPLETED, wait
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Stage:
+    """Étape du graphe
+
+    `func` reçoit en arguments nommés les résultats des étapes (ou entrées) listées
+    dans `depends_on`. En cas d'exception ou de dépassement de `timeout` secondes,
+    `fallback` (mêmes arguments) fournit le résultat ; sans repli, l'erreur remonte.
+    `func` peut être une coroutine (uniquement avec `StageGraph.arun`).
+    """
+    name: str
+    func: Callable[..., Any]
+    depends_on: Tuple[str, ...] = ()
+    timeout: Optional[float] = None
+    fallback: Optional[Callable[..., Any]] = None
+
+
+@dataclass
+class StageRun:
+    """Résultat d'une exécution : valeurs, durées (s) et statut de chaque étape"""
+    results: Dict[str, Any] = field(default_factory=dict)
+    durations: Dict[str, float] = field(default_factory=dict)
+    statuses: Dict[str, str] = field(default_factory=dict)  # ok, timeout, error
+
+
+class StageTimeout(Exception):
+    """Étape non terminée avant son délai maximal"""
+
+
+class StageGraph:
+    """Graphe acyclique d'étapes, exécuté dès que les dépendances sont prêtes
+
+    Un thread ne pouvant pas être interrompu, une étape qui dépasse son délai
+    continue en arrière-plan : son résultat est simplement ignoré.
+    """
+
+    def __init__(self, stages: List[Stage], inputs: Tuple[str, ...] = ()):
+        self.stages = {stage.name: stage for stage in stages}
+        self.inputs = tuple(inputs)
+        if len(self.stages) != len(stages):
+            raise ValueError("Noms d'étapes en double")
+        self.order = self._topological_order()
+
+    def _topological_order(self) -> List[str]:
+        order: List[str] = []
+        state: Dict[str, str] = {}
+
+        def visit(name: str) -> None:
+            if state.get(name) == 'done':
+                return
+            if state.get(name) == 'visiting':
+                raise ValueError(f"Cycle dans le graphe d'étapes: {name}")
+            state[name] = 'visiting'
+            for dep in self.stages[name].depends_on:
+                if dep in self.stages:
+                    visit(dep)
+                elif dep not in self.inputs:
+                    raise ValueError(f"Dépendance inconnue pour l'étape {name}: {dep}")
+            state[name] = 'done'
+            order.append(name)
+
+        for name in self.stages:
+            visit(name)
+        return order
+
+    def _resolve_failure(self, run: StageRun, stage: Stage, kwargs: Dict[str, Any],
+                         error: BaseException, started: float) -> None:
+        """Applique le repli d'une étape échouée (ou relance l'erreur)"""
+        status = 'timeout' if isinstance(error, (StageTimeout, asyncio.TimeoutError)) else 'error'
+        run.durations[stage.name] = time.perf_counter() - started
+        run.statuses[stage.name] = status
+        if stage.fallback is None:
+            raise error
+        logger.warning(f"Étape {stage.name} ({status}): {error!r} — repli utilisé")
+        run.results[stage.name] = stage.fallback(**kwargs)
+
+    def run(self, executor: Executor, inputs: Dict[str, Any]) -> StageRun:
+        """Exécution synchrone : chaque étape prête est soumise à `executor`"""
+        run = StageRun()
+        values = dict(inputs)
+        remaining = list(self.order)
+        running: Dict[Any, Tuple[Stage, Dict[str, Any], float]] = {}
+
+        while remaining or running:
+            # Démarrage des étapes dont toutes les dépendances sont résolues
+            for name in list(remaining):
+                stage = self.stages[name]
+                if all(dep in values for dep in stage.depends_on):
+                    kwargs = {dep: values[dep] for dep in stage.depends_on}
+                    running[executor.submit(stage.func, **kwargs)] = (stage, kwargs, time.perf_counter())
+                    remaining.remove(name)
+
+            # Attente jusqu'à la prochaine fin d'étape ou la prochaine échéance
+            now = time.perf_counter()
+            deadlines = [started + stage.timeout - now
+                         for stage, _, started in running.values() if stage.timeout is not None]
+            done, _ = wait(list(running), timeout=max(min(deadlines), 0) if deadlines else None,
+                           return_when=FIRST_COMPLETED)
+
+            now = time.perf_counter()
+            for future in list(running):
+                stage, kwargs, started = running[future]
+                if future in done:
+                    del running[future]
+                    error = future.exception()
+                    if error is None:
+                        run.results[stage.name] = future.result()
+                        run.durations[stage.name] = now - started
+                        run.statuses[stage.name] = 'ok'
+                    else:
+                        self._resolve_failure(run, stage, kwargs, error, started)
+                elif stage.timeout is not None and now - started >= stage.timeout:
+                    del running[future]
+                    future.cancel()
+                    self._resolve_failure(run, stage, kwargs,
+                                          StageTimeout(f"{stage.name} > {stage.timeout}s"), started)
+                else:
+                    continue
+                values[stage.name] = run.results[stage.name]
+
+        return run
+
+    async def arun(self, inputs: Dict[str, Any], executor: Optional[Executor] = None) -> StageRun:
+        """Exécution asynchrone : coroutines attendues, fonctions bloquantes dans `executor`"""
+        loop = asyncio.get_running_loop()
+        run = StageRun()
+        tasks: Dict[str, asyncio.Task] = {}
+
+        async def execute(stage: Stage) -> Any:
+            kwargs = {}
+            for dep in stage.depends_on:
+                kwargs[dep] = await tasks[dep] if dep in tasks else inputs[dep]
+
+            started = time.perf_counter()
+            if asyncio.iscoroutinefunction(stage.func):
+                pending = stage.func(**kwargs)
+            else:
+                pending = loop.run_in_executor(executor, lambda: stage.func(**kwargs))
+            try:
+                run.results[stage.name] = await asyncio.wait_for(pending, stage.timeout)
+                run.durations[stage.name] = time.perf_counter() - started
+                run.statuses[stage.name] = 'ok'
+            except Exception as e:
+                self._resolve_failure(run, stage, kwargs, e, started)
+            return run.results[stage.name]
+
+        for name in self.order:
+            tasks[name] = asyncio.ensure_future(execute(self.stages[name]))
+        try:
+            await asyncio.gather(*tasks.values())
+        finally:
+            for task in tasks.values():
+                task.cancel()
+        return run
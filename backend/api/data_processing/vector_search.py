@@ -7,31 +7,139 @@ Utilise FAISS pour la recherche sémantique et AWS Bedrock pour les embeddings
 
 import json
 import numpy as np
+from datetime import datetime
 import faiss
 import boto3
-from typing import Dict, List, Any, Optional, Tuple
+from typing import Dict, Iterable, Iterator, List, Any, Optional, Tuple
 import logging
 from pathlib import Path
-import pickle
 from sentence_transformers import SentenceTransformer
 import os
+import re
+import tempfile
+import threading
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from .bedrock_embeddings import BedrockEmbeddingClient
+    from .embedding_cache import EmbeddingCache
+    from .ann_index import (INDEX_FACTORY_STRINGS, DEFAULT_INDEX_PARAMS, build_index,
+                            with_ids, enable_reconstruction, apply_search_params,
+                            search_parameters, supports_removal)
+    from .record_store import MmapRecordList, write_records
+    from .metadata_store import ColumnarMetadata, write_columnar
+    from .ttl_cache import TTLCache
+    from .metrics import STAGE_LATENCY, RETRIEVAL_RESULTS
+    from .sparse_index import SparseIndex
+    from .obd_index import ObdCodeIndex, normalize_obd_code
+    from .facet_index import CATEGORY_FACETS, RANGE_FACETS, FacetIndex, SearchFilter
+    from .article_io import ArticleStream, find_articles_file, is_jsonl
+    from .garage_index import GarageIndex, load_centroids
+    from .rw_lock import ReadWriteLock
+except ImportError:
+    from bedrock_embeddings import BedrockEmbeddingClient
+    from embedding_cache import EmbeddingCache
+    from ann_index import (INDEX_FACTORY_STRINGS, DEFAULT_INDEX_PARAMS, build_index,
+                           with_ids, enable_reconstruction, apply_search_params,
+                           search_parameters, supports_removal)
+    from record_store import MmapRecordList, write_records
+    from metadata_store import ColumnarMetadata, write_columnar
+    from ttl_cache import TTLCache
+    from metrics import STAGE_LATENCY, RETRIEVAL_RESULTS
+    from sparse_index import SparseIndex
+    from obd_index import ObdCodeIndex, normalize_obd_code
+    from facet_index import CATEGORY_FACETS, RANGE_FACETS, FacetIndex, SearchFilter
+    from article_io import ArticleStream, find_articles_file, is_jsonl
+    from garage_index import GarageIndex, load_centroids
+    from rw_lock import ReadWriteLock
 
 logger = logging.getLogger(__name__)
 
+# Version du format de l'index sauvegardé (manifest.json)
+BUNDLE_FORMAT_VERSION = 2
+
+DEFAULT_DATA_DIR = "/workspaces/SmarBot/data/json"
+DEFAULT_INDEX_DIR = "/workspaces/SmarBot/data/faiss_index"
+
+# Délai avant une sauvegarde programmée : les modifications rapprochées sont regroupées
+SAVE_DELAY_SECONDS = 5.0
+
+# Articles lus et encodés par lot lors de la construction de l'index
+EMBEDDING_CHUNK_SIZE = 4096
+
+# Candidats demandés à chaque moteur avant fusion (multiple de k, au moins le minimum)
+HYBRID_CANDIDATE_FACTOR = 4
+HYBRID_MIN_CANDIDATES = 20
+
 class GoonetVectorSearch:
     """Moteur de recherche vectorielle pour les données Goo-net Pit"""
     
     def __init__(self, 
                  use_bedrock: bool = True,
-                 model_name: str = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"):
+                 model_name: str = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2",
+                 batch_size: int = 64,
+                 num_workers: int = 0,
+                 bedrock_concurrency: int = 8,
+                 bedrock_requests_per_second: float = 10.0,
+                 bedrock_checkpoint_path: Optional[str] = None,
+                 bedrock_dimensions: Optional[int] = None,
+                 embedding_cache_path: Optional[str] = "/workspaces/SmarBot/data/embedding_cache/embeddings.sqlite",
+                 index_type: str = "flat",
+                 index_params: Optional[Dict[str, Any]] = None,
+                 mmap_index: bool = False,
+                 query_cache_size: int = 1024,
+                 query_cache_ttl: float = 3600.0,
+                 result_cache_size: int = 1024,
+                 result_cache_ttl: float = 600.0,
+                 hybrid_search: bool = True,
+                 rrf_k: int = 60):
         self.use_bedrock = use_bedrock
         self.model_name = model_name
         self.embedding_dimension = 384  # Dimension pour le modèle MiniLM
         
+        # Encodage par lots (num_workers > 1 : pool multi-processus CPU)
+        self.batch_size = batch_size
+        self.num_workers = num_workers
+        self._encoder_pool = None
+        
+        # Type d'index FAISS (flat, ivf_flat, hnsw, ivf_pq, opq_ivf_pq)
+        if index_type not in INDEX_FACTORY_STRINGS:
+            raise ValueError(f"Type d'index inconnu: {index_type} ({', '.join(INDEX_FACTORY_STRINGS)})")
+        self.index_type = index_type
+        self.index_params = {**DEFAULT_INDEX_PARAMS, **(index_params or {})}
+        
+        # Chargement de l'index par projection mémoire (partagé entre workers via le page cache)
+        self.mmap_index = mmap_index
+        self._read_only = False
+        
+        # Caches mémoire des requêtes : embeddings (par requête normalisée) et résultats
+        # (invalidés à chaque modification de l'index via index_version)
+        self.query_embedding_cache = TTLCache(maxsize=query_cache_size, ttl=query_cache_ttl)
+        self.result_cache = TTLCache(maxsize=result_cache_size, ttl=result_cache_ttl)
+        self.index_version = 0
+        
+        # Recherche hybride : index BM25 construit avec l'index FAISS, interrogé en
+        # parallèle, classements fusionnés par Reciprocal Rank Fusion (constante rrf_k)
+        self.hybrid_search = hybrid_search
+        self.rrf_k = rrf_k
+        self.sparse_index: Optional[SparseIndex] = None
+        self._sparse_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix='sparse-search')
+        
+        # Cache disque des embeddings (None pour désactiver)
+        self.embedding_cache = EmbeddingCache(embedding_cache_path) if embedding_cache_path else None
+        
         # Initialisation des clients
         if use_bedrock:
             try:
                 self.bedrock_client = boto3.client('bedrock-runtime', region_name='us-east-1')
+                self.bedrock_embedder = BedrockEmbeddingClient(
+                    self.bedrock_client,
+                    max_concurrency=bedrock_concurrency,
+                    requests_per_second=bedrock_requests_per_second,
+                    checkpoint_path=bedrock_checkpoint_path,
+                    dimensions=bedrock_dimensions
+                )
                 logger.info("Client AWS Bedrock initialisé")
             except Exception as e:
                 logger.warning(f"Impossible d'initialiser Bedrock, utilisation du modèle local: {e}")
@@ -43,28 +151,31 @@ class GoonetVectorSearch:
             logger.info(f"Modèle d'embedding local chargé: {model_name}")
         
         # Index FAISS et métadonnées
+        # Les identifiants FAISS sont les positions dans self.metadata / self.articles ;
+        # une ligne supprimée reste à None pour ne pas décaler les identifiants suivants.
         self.index = None
         self.metadata = []
         self.articles = []
         self.garages = []
+        # Centres des préfectures et villes (lieu extrait du message -> coordonnées)
+        self.location_centroids = load_centroids()
+        self.garage_index = GarageIndex([], self.location_centroids)
+        self._row_by_article_id: Dict[str, int] = {}
+        # Code OBD normalisé (complet et de base) -> identifiants FAISS
+        self.obd_index = ObdCodeIndex()
+        # Constructeur, modèle, année, prix par identifiant FAISS (filtres de recherche)
+        self.facet_index = FacetIndex()
+        # Recherches en lecture partagée ; construction, chargement et mises à jour exclusives
+        self._index_lock = ReadWriteLock()
+        # Sauvegardes sérialisées (mêmes fichiers temporaires) et sauvegarde programmée
+        self._save_lock = threading.Lock()
+        self._save_timer: Optional[threading.Timer] = None
+        self._save_timer_lock = threading.Lock()
     
     def get_embedding_bedrock(self, text: str) -> np.ndarray:
         """Obtient un embedding via AWS Bedrock (Titan Embeddings)"""
         try:
-            body = json.dumps({
-                "inputText": text
-            })
-            
-            response = self.bedrock_client.invoke_model(
-                modelId="amazon.titan-embed-text-v1",
-                body=body,
-                contentType="application/json",
-                accept="application/json"
-            )
-            
-            response_body = json.loads(response['body'].read())
-            embedding = np.array(response_body['embedding'], dtype=np.float32)
-            return embedding
+            return self.bedrock_embedder.embed(text)
             
         except Exception as e:
             logger.error(f"Erreur lors de l'appel à Bedrock: {e}")
@@ -85,61 +196,399 @@ class GoonetVectorSearch:
         else:
             return self.get_embedding_local(text)
     
+    def get_embeddings_local(self, texts: List[str], batch_size: Optional[int] = None) -> np.ndarray:
+        """Encode une liste de textes par lots avec le modèle local"""
+        batch_size = batch_size or self.batch_size
+        
+        if self.num_workers > 1:
+            # Un processus d'encodage par cœur CPU
+            if self._encoder_pool is None:
+                self._encoder_pool = self.embedding_model.start_multi_process_pool(
+                    target_devices=['cpu'] * self.num_workers
+                )
+                logger.info(f"Pool d'encodage démarré: {self.num_workers} processus")
+            return self.embedding_model.encode_multi_process(
+                texts, self._encoder_pool, batch_size=batch_size
+            )
+        
+        return self.embedding_model.encode(
+            texts,
+            batch_size=batch_size,
+            convert_to_numpy=True,
+            show_progress_bar=False
+        )
+    
+    def get_embeddings(self, texts: List[str], batch_size: Optional[int] = None,
+                       checkpoint: bool = False) -> np.ndarray:
+        """Interface unifiée pour obtenir les embeddings d'une liste de textes
+        
+        `checkpoint` : construction d'index, reprise possible après interruption (Bedrock)
+        """
+        if not texts:
+            return np.zeros((0, self.embedding_dimension), dtype=np.float32)
+        
+        if self.use_bedrock:
+            embeddings = self.bedrock_embedder.embed_many(texts, checkpoint=checkpoint)
+        else:
+            embeddings = self.get_embeddings_local(texts, batch_size)
+        
+        return np.asarray(embeddings, dtype=np.float32)
+    
+    @property
+    def embedding_model_id(self) -> str:
+        """Identifiant du modèle produisant les embeddings (clé du cache)"""
+        if self.use_bedrock:
+            return self.bedrock_embedder.model_key
+        return self.model_name
+    
+    def get_embeddings_cached(self, texts: List[str], checkpoint: bool = False) -> np.ndarray:
+        """Embeddings d'une liste de textes en ne calculant que les absents du cache"""
+        if self.embedding_cache is None or not texts:
+            return self.get_embeddings(texts, checkpoint=checkpoint)
+        
+        keys = [EmbeddingCache.make_key(self.embedding_model_id, text) for text in texts]
+        cached = self.embedding_cache.get_many(keys)
+        
+        # Textes distincts à calculer
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in cached:
+                missing.setdefault(key, text)
+        
+        hits = sum(1 for key in keys if key in cached)
+        logger.info(f"Cache d'embeddings: {hits} hits, {len(keys) - hits} misses "
+                    f"({len(missing)} textes distincts à calculer)")
+        
+        if missing:
+            new_embeddings = self.get_embeddings(list(missing.values()), checkpoint=checkpoint)
+            computed = dict(zip(missing.keys(), new_embeddings))
+            self.embedding_cache.put_many(computed)
+            cached.update(computed)
+        
+        return np.array([cached[key] for key in keys], dtype=np.float32)
+    
+    def stop_encoder_pool(self) -> None:
+        """Arrête le pool d'encodage multi-processus s'il est actif"""
+        if self._encoder_pool is not None:
+            SentenceTransformer.stop_multi_process_pool(self._encoder_pool)
+            self._encoder_pool = None
+            logger.info("Pool d'encodage arrêté")
+    
     def load_data(self, 
-                  articles_file: str = "/workspaces/SmarBot/data/json/diagnostic_articles.json",
+                  articles_file: Optional[str] = None,
                   garages_file: str = "/workspaces/SmarBot/data/json/garages.json"):
         """Charge les données JSON"""
         logger.info("Chargement des données...")
         
+        self.load_articles(articles_file)
+        self.load_garages(garages_file)
+        
+        articles = f"{len(self.articles)} articles" if isinstance(self.articles, list) else repr(self.articles)
+        logger.info(f"Données chargées: {articles}, {len(self.garages)} garages")
+    
+    def load_articles(self, articles_file: Optional[str] = None):
+        """Charge les articles de diagnostic (nécessaire uniquement pour construire l'index)
+        
+        Sans `articles_file`, prend le premier fichier présent dans le répertoire des
+        données (diagnostic_articles.jsonl.zst, .jsonl.gz, .jsonl puis .json).
+        Un fichier JSON Lines n'est pas chargé : il est lu en flux par create_embeddings().
+        """
+        if articles_file is None:
+            articles_file = find_articles_file(DEFAULT_DATA_DIR) or Path(DEFAULT_DATA_DIR) / 'diagnostic_articles.json'
+        
+        if is_jsonl(str(articles_file)):
+            self.articles = ArticleStream(str(articles_file))
+            return
         with open(articles_file, 'r', encoding='utf-8') as f:
             self.articles = json.load(f)
-        
+    
+    def load_garages(self, garages_file: str = "/workspaces/SmarBot/data/json/garages.json"):
+        """Charge les garages et construit leurs index (lieu, spécialité, service, coordonnées)"""
         with open(garages_file, 'r', encoding='utf-8') as f:
             self.garages = json.load(f)
-        
-        logger.info(f"Données chargées: {len(self.articles)} articles, {len(self.garages)} garages")
+        self.garage_index = GarageIndex(self.garages, self.location_centroids)
     
     def create_embeddings(self) -> None:
-        """Crée les embeddings pour tous les articles"""
+        """Crée les embeddings pour tous les articles
+        
+        Les articles sont encodés par lots de EMBEDDING_CHUNK_SIZE. Lus en flux
+        (ArticleStream), ils sont recopiés au fil de l'eau dans un fichier
+        d'enregistrements projeté en mémoire : seuls les vecteurs et les
+        métadonnées restent en mémoire.
+        """
         logger.info("Création des embeddings...")
         
-        embeddings = []
-        self.metadata = []
+        metadata = []
+        embedding_chunks = []
+        sparse_index = SparseIndex()
+        obd_index = ObdCodeIndex()
         
-        for article in self.articles:
+        def encode(articles: List[Dict[str, Any]]) -> None:
+            # Index lexical BM25 et index des codes OBD (mêmes identifiants de ligne que FAISS)
+            for row, article in enumerate(articles, len(metadata)):
+                sparse_index.add(row, self._create_sparse_text(article))
+                obd_index.add(row, [code['code'] for code in article['obd_codes']])
             # Texte pour l'embedding : combinaison optimisée
-            embedding_text = self._create_embedding_text(article)
-            
-            # Génération de l'embedding
-            embedding = self.get_embedding(embedding_text)
-            embeddings.append(embedding)
-            
+            embedding_texts = [self._create_embedding_text(article) for article in articles]
             # Métadonnées pour la recherche
-            metadata = {
-                'article_id': article['article_id'],
-                'type': 'diagnostic_article',
-                'vehicle_manufacturer': article['vehicle_info']['manufacturer'],
-                'vehicle_model': article['vehicle_info']['model'],
-                'vehicle_year': article['vehicle_info']['year'],
-                'obd_codes': [code['code'] for code in article['obd_codes']],
-                'symptom': article['symptom'],
-                'estimated_price': article['estimated_price'],
-                'estimated_duration': article['estimated_duration'],
-                'embedding_text': embedding_text
-            }
-            self.metadata.append(metadata)
+            metadata.extend(self._create_metadata(article) for article in articles)
+            # Génération des embeddings par lots (seuls les textes nouveaux ou modifiés sont calculés)
+            embedding_chunks.append(self.get_embeddings_cached(embedding_texts, checkpoint=True))
         
-        # Création de l'index FAISS
-        embeddings_array = np.array(embeddings, dtype=np.float32)
+        def encoded(articles: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+            """Transmet les articles à l'écriture tout en les encodant par lots"""
+            batch = []
+            for article in articles:
+                batch.append(article)
+                yield article
+                if len(batch) >= EMBEDDING_CHUNK_SIZE:
+                    encode(batch)
+                    batch = []
+            if batch:
+                encode(batch)
         
-        # Utilisation de IndexFlatIP pour la similarité cosinus
-        self.index = faiss.IndexFlatIP(self.embedding_dimension)
+        if isinstance(self.articles, ArticleStream):
+            articles = self._spool_articles(encoded(self.articles))
+        else:
+            articles = self.articles
+            for start in range(0, len(articles), EMBEDDING_CHUNK_SIZE):
+                encode(articles[start:start + EMBEDDING_CHUNK_SIZE])
+        
+        embeddings_array = (np.vstack(embedding_chunks) if embedding_chunks
+                            else self.get_embeddings_cached([]))
+        if len(embeddings_array):
+            self.embedding_dimension = embeddings_array.shape[1]
+        sparse_index.compact()
+        obd_index.compact()
+        # Tous les lots sont calculés : le checkpoint Bedrock n'a plus d'utilité
+        if self.use_bedrock:
+            self.bedrock_embedder.clear_checkpoint()
         
         # Normalisation pour la similarité cosinus
         faiss.normalize_L2(embeddings_array)
-        self.index.add(embeddings_array)
         
-        logger.info(f"Index FAISS créé avec {self.index.ntotal} vecteurs")
+        # Produit scalaire sur vecteurs normalisés (similarité cosinus),
+        # avec identifiants explicites pour les mises à jour
+        index = with_ids(build_index(embeddings_array, self.index_type, self.index_params))
+        index.add_with_ids(embeddings_array, np.arange(len(embeddings_array), dtype=np.int64))
+        
+        with self._index_lock.write():
+            self.index = index
+            self.metadata = metadata
+            self.articles = articles
+            self.sparse_index = sparse_index
+            self._read_only = False
+            self._rebuild_row_mapping(obd_index)
+            self._index_changed()
+            apply_search_params(self.index, self.index_params)
+        
+        logger.info(f"Index FAISS créé avec {self.index.ntotal} vecteurs "
+                    f"(BM25: {sparse_index.vocabulary_size} termes)")
+    
+    @staticmethod
+    def _spool_articles(articles: Iterable[Dict[str, Any]]) -> MmapRecordList:
+        """Recopie des articles lus en flux dans un fichier temporaire projeté en mémoire
+        
+        Les fichiers sont supprimés aussitôt ouverts (la projection reste valide) ;
+        save_index() les réécrit dans le répertoire de l'index.
+        """
+        fd, spool_file = tempfile.mkstemp(prefix='goonet_articles_', suffix='.jsonl')
+        os.close(fd)
+        write_records(spool_file, articles)
+        records = MmapRecordList(spool_file)
+        for path in (Path(spool_file), Path(spool_file + '.offsets.npy')):
+            path.unlink(missing_ok=True)
+        return records
+    
+    def set_search_params(self, nprobe: Optional[int] = None, ef_search: Optional[int] = None) -> None:
+        """Règle le compromis rappel/latence (nprobe pour IVF, efSearch pour HNSW)"""
+        if nprobe is not None:
+            self.index_params['nprobe'] = nprobe
+        if ef_search is not None:
+            self.index_params['ef_search'] = ef_search
+        
+        if self.index is not None:
+            with self._index_lock.write():
+                apply_search_params(self.index, self.index_params)
+    
+    def _create_metadata(self, article: Dict[str, Any]) -> Dict[str, Any]:
+        """Métadonnées de recherche d'un article"""
+        return {
+            'article_id': article['article_id'],
+            'type': 'diagnostic_article',
+            'vehicle_manufacturer': article['vehicle_info']['manufacturer'],
+            'vehicle_model': article['vehicle_info']['model'],
+            'vehicle_year': article['vehicle_info']['year'],
+            'obd_codes': [code['code'] for code in article['obd_codes']],
+            'symptom': article['symptom'],
+            'estimated_price': article['estimated_price'],
+            'estimated_duration': article['estimated_duration']
+        }
+    
+    def _index_changed(self) -> None:
+        """Nouvelle version de l'index : les résultats en cache ne sont plus valides"""
+        self.index_version += 1
+        self.result_cache.clear()
+    
+    def cache_stats(self) -> Dict[str, Any]:
+        """Statistiques des caches de requêtes"""
+        return {
+            'index_version': self.index_version,
+            'query_embeddings': self.query_embedding_cache.stats(),
+            'search_results': self.result_cache.stats()
+        }
+    
+    @property
+    def article_count(self) -> int:
+        """Nombre d'articles actifs (hors articles supprimés)"""
+        if self.index is None:
+            # Articles lus en flux : nombre connu une fois l'index construit
+            return 0 if isinstance(self.articles, ArticleStream) else len(self.articles)
+        return len(self._row_by_article_id)
+    
+    def _rebuild_row_mapping(self, obd_index: Optional[ObdCodeIndex] = None) -> None:
+        """Reconstruit les tables par identifiant FAISS : article_id, codes OBD, facettes de filtrage
+        
+        `obd_index` : index des codes déjà construit (ou chargé) ; sinon il est
+        reconstruit depuis les métadonnées (index sauvegardé sans `obd.npz`).
+        """
+        if isinstance(self.metadata, ColumnarMetadata):
+            self._row_by_article_id = {article_id: row for row, article_id in self.metadata.live_article_ids()}
+            # Facettes depuis les colonnes codées du fichier, puis lignes modifiées en mémoire
+            facet_index = FacetIndex.from_columns(
+                self.metadata.live_mask(),
+                {name: self.metadata.category_codes(name) for name in CATEGORY_FACETS},
+                {name: self.metadata.numeric_values(name) for name in RANGE_FACETS})
+            for row, metadata in self.metadata.modified_rows():
+                if metadata is None:
+                    facet_index.remove(row)
+                else:
+                    facet_index.add(row, metadata)
+            if obd_index is None:
+                # Colonne des codes seulement, sans décoder les métadonnées complètes
+                obd_index = ObdCodeIndex.build((row, metadata['obd_codes'])
+                                               for row, metadata in self.metadata.live_columns(('obd_codes',)))
+        else:
+            rows = [(row, metadata) for row, metadata in enumerate(self.metadata) if metadata is not None]
+            self._row_by_article_id = {str(metadata['article_id']): row for row, metadata in rows}
+            facet_index = FacetIndex.build(rows)
+            if obd_index is None:
+                obd_index = ObdCodeIndex.build((row, metadata['obd_codes']) for row, metadata in rows)
+        self.obd_index = obd_index
+        self.facet_index = facet_index
+    
+    def upsert_articles(self, articles: List[Dict[str, Any]]) -> Dict[str, int]:
+        """Ajoute ou met à jour des articles dans l'index sans reconstruction complète
+        
+        Tout le lot est validé et encodé avant la moindre modification : un article
+        invalide (KeyError sur un champ manquant) rejette le lot entier. Les
+        changements sont ensuite appliqués sous le verrou, FAISS en premier.
+        """
+        if self.index is None:
+            raise ValueError("Index non initialisé. Appelez create_embeddings() d'abord.")
+        
+        # Un article présent plusieurs fois : la dernière version l'emporte
+        articles = list({str(article['article_id']): article for article in articles}.values())
+        if not articles:
+            return {'added': 0, 'updated': 0}
+        
+        # Préparation (et validation) de toutes les lignes
+        prepared = [(str(article['article_id']), article, self._create_metadata(article),
+                     self._create_sparse_text(article))
+                    for article in articles]
+        embedding_texts = [self._create_embedding_text(article) for article in articles]
+        embeddings_array = self.get_embeddings_cached(embedding_texts, checkpoint=True)
+        if self.use_bedrock:
+            self.bedrock_embedder.clear_checkpoint()
+        faiss.normalize_L2(embeddings_array)
+        
+        with self._index_lock.write():
+            self._check_writable()
+            rows = []
+            updated_rows = []
+            next_row = len(self.metadata)
+            for article_id, _, _, _ in prepared:
+                row = self._row_by_article_id.get(article_id)
+                if row is None:
+                    row = next_row
+                    next_row += 1
+                else:
+                    updated_rows.append(row)
+                rows.append(row)
+            if updated_rows:
+                self._check_supports_removal()
+            
+            # FAISS d'abord : en cas d'échec, métadonnées et index annexes restent intacts
+            if updated_rows:
+                self.index.remove_ids(np.array(updated_rows, dtype=np.int64))
+            try:
+                self.index.add_with_ids(embeddings_array, np.array(rows, dtype=np.int64))
+            except Exception:
+                # Anciens vecteurs déjà retirés : les articles mis à jour sont retirés aussi
+                for article_id, _, _, _ in prepared:
+                    row = self._row_by_article_id.get(article_id)
+                    if row is not None:
+                        self._remove_row(article_id, row)
+                self._index_changed()
+                raise
+            
+            for row, (article_id, article, metadata, sparse_text) in zip(rows, prepared):
+                if row == len(self.metadata):
+                    self.metadata.append(None)
+                    self.articles.append(None)
+                self.metadata[row] = metadata
+                self.articles[row] = article
+                self._row_by_article_id[article_id] = row
+                self.obd_index.add(row, metadata['obd_codes'])
+                self.facet_index.add(row, metadata)
+                if self.sparse_index is not None:
+                    self.sparse_index.add(row, sparse_text)
+            self._index_changed()
+        
+        updated = len(updated_rows)
+        logger.info(f"Index mis à jour: {len(rows) - updated} ajout(s), {updated} mise(s) à jour")
+        return {'added': len(rows) - updated, 'updated': updated}
+    
+    def _check_writable(self) -> None:
+        """Un index projeté en mémoire est en lecture seule"""
+        if self._read_only:
+            raise ValueError("Index chargé en mmap (lecture seule) ; rechargez-le sans mmap pour le modifier")
+    
+    def _check_supports_removal(self) -> None:
+        """Vérifie que l'index permet de retirer des vecteurs"""
+        if not supports_removal(self.index):
+            raise ValueError("L'index HNSW ne supporte pas la suppression ; reconstruisez l'index")
+    
+    def delete_articles(self, article_ids: List[str]) -> int:
+        """Supprime des articles de l'index par article_id"""
+        if self.index is None:
+            raise ValueError("Index non initialisé. Appelez create_embeddings() d'abord.")
+        
+        with self._index_lock.write():
+            self._check_writable()
+            self._check_supports_removal()
+            
+            found = {str(article_id): self._row_by_article_id[str(article_id)]
+                     for article_id in article_ids if str(article_id) in self._row_by_article_id}
+            if found:
+                # FAISS d'abord : en cas d'échec, rien n'est modifié
+                self.index.remove_ids(np.array(list(found.values()), dtype=np.int64))
+                for article_id, row in found.items():
+                    self._remove_row(article_id, row)
+                self._index_changed()
+        
+        logger.info(f"Index mis à jour: {len(found)} suppression(s)")
+        return len(found)
+    
+    def _remove_row(self, article_id: str, row: int) -> None:
+        """Retire une ligne des métadonnées et des index annexes (appelant sous verrou d'écriture)"""
+        del self._row_by_article_id[article_id]
+        self.metadata[row] = None
+        self.articles[row] = None
+        self.obd_index.remove(row)
+        self.facet_index.remove(row)
+        if self.sparse_index is not None:
+            self.sparse_index.remove(row)
     
     def _create_embedding_text(self, article: Dict[str, Any]) -> str:
         """Crée un texte optimisé pour l'embedding"""
@@ -178,43 +627,289 @@ class GoonetVectorSearch:
         
         return " | ".join(parts)
     
+    def _create_sparse_text(self, article: Dict[str, Any]) -> str:
+        """Texte indexé par BM25 : champs structurés et texte intégral (noms de modèles, codes)"""
+        return f"{self._create_embedding_text(article)} | {article.get('full_text') or ''}"
+    
     def search(self, 
                query: str, 
                k: int = 5,
-               min_similarity: float = 0.3) -> List[Dict[str, Any]]:
-        """Recherche sémantique dans les articles"""
+               min_similarity: float = 0.3,
+               filters: Optional[SearchFilter] = None) -> List[Dict[str, Any]]:
+        """Recherche dans les articles : vectorielle, fusionnée avec BM25 si l'index hybride est disponible
+        
+        En mode hybride, la recherche BM25 s'exécute dans un autre thread pendant le
+        calcul de l'embedding et la recherche FAISS ; chaque résultat porte alors un
+        champ `retrieval` (rangs, scores et part de chaque moteur dans le score fusionné).
+        
+        `filters` restreint la recherche aux articles dont les métadonnées satisfont
+        le filtre : le bitmap des articles admis est appliqué pendant la recherche
+        FAISS (IDSelectorBitmap) et BM25, les k résultats sont donc tous conformes.
+        """
         if self.index is None:
             raise ValueError("Index non initialisé. Appelez create_embeddings() d'abord.")
         
-        # Génération de l'embedding de la requête
-        query_embedding = self.get_embedding(query)
-        query_embedding = query_embedding.reshape(1, -1)
+        normalized_query = self.normalize_query(query)
+        hybrid = self._hybrid_enabled()
+        if filters is not None and filters.is_empty():
+            filters = None
         
-        # Normalisation pour la similarité cosinus
-        faiss.normalize_L2(query_embedding)
+        # Résultats déjà calculés pour cette version de l'index
+        cache_key = (normalized_query, k, min_similarity, hybrid, filters, self.index_version)
+        cached_results = self.result_cache.get(cache_key)
+        if cached_results is not None:
+            return list(cached_results)
+        
+        # Aucun article admis par le filtre : ni embedding ni recherche
+        allowed = self._allowed_rows(filters)
+        if allowed is not None and not allowed.any():
+            return []
+        
+        depth = self._candidate_depth(k) if hybrid else k
+        sparse_future = (self._sparse_pool.submit(self._sparse_search, normalized_query, depth, allowed)
+                         if hybrid else None)
+        
+        # Embedding de la requête (normalisé pour la similarité cosinus)
+        query_embedding = self.get_query_embedding(normalized_query).reshape(1, -1)
         
         # Recherche
-        similarities, indices = self.index.search(query_embedding, k)
+        with self._index_lock.read(), STAGE_LATENCY.labels('faiss_search').time():
+            index_version = self.index_version
+            similarities, indices = self._index_search(query_embedding, depth, allowed)
+        
+        sparse_hits = sparse_future.result() if sparse_future is not None else None
+        results = self._format_results(query, similarities[0], indices[0], min_similarity,
+                                       sparse_hits, k, query_embedding[0])
+        self.result_cache.set((normalized_query, k, min_similarity, hybrid, filters, index_version), results)
+        return list(results)
+    
+    def _allowed_rows(self, filters: Optional[SearchFilter]) -> Optional[np.ndarray]:
+        """Masque des identifiants FAISS admis par le filtre (None : pas de filtre)"""
+        if filters is None or filters.is_empty():
+            return None
+        with self._index_lock.read():
+            return self.facet_index.select(filters)
+    
+    def _index_search(self, embeddings: np.ndarray, depth: int,
+                      allowed: Optional[np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+        """Recherche FAISS, limitée aux identifiants du masque s'il y en a un (appelant sous verrou)"""
+        if allowed is None:
+            return self.index.search(embeddings, depth)
+        # Bit i : identifiant FAISS i ; le tableau doit vivre pendant la recherche
+        bitmap = np.packbits(allowed, bitorder='little')
+        params = search_parameters(self.index, self.index_params, faiss.IDSelectorBitmap(bitmap))
+        return self.index.search(embeddings, depth, params=params)
+    
+    def find_by_obd_code(self, code: str, k: int = 5,
+                         filters: Optional[SearchFilter] = None) -> List[Dict[str, Any]]:
+        """Articles citant un code OBD, sans embedding ni recherche FAISS
+        
+        Même format que search() : similarité 1.0 pour le code identique
+        (« U3003-1C »), 0.9 pour le même code de base (« U3003 »).
+        """
+        code = normalize_obd_code(code)[0]
+        allowed = self._allowed_rows(filters)
+        with self._index_lock.read():
+            matches = self.obd_index.lookup(code)
+        if allowed is not None:
+            matches = [(row, exact) for row, exact in matches if row < len(allowed) and allowed[row]]
+        matches = matches[:k]
+        
+        results = []
+        for row, exact in matches:
+            article = self.articles[row]
+            if article is None:
+                continue
+            similarity = 1.0 if exact else 0.9
+            results.append({
+                'rank': len(results) + 1,
+                'similarity': similarity,
+                'article': article,
+                'metadata': self.metadata[row],
+                'relevance_explanation': " | ".join([
+                    f"故障コード一致: {code}" + ("" if exact else " (基本コード)"),
+                    f"類似度: {similarity:.3f} (コード索引)"
+                ]),
+                'retrieval': {'obd_code': code, 'exact': exact}
+            })
+        return results
+    
+    def _hybrid_enabled(self) -> bool:
+        return self.hybrid_search and self.sparse_index is not None
+    
+    @staticmethod
+    def _candidate_depth(k: int) -> int:
+        return max(k * HYBRID_CANDIDATE_FACTOR, HYBRID_MIN_CANDIDATES)
+    
+    def _sparse_search(self, normalized_query: str, depth: int,
+                       allowed: Optional[np.ndarray] = None) -> List[Tuple[int, float]]:
+        """(ligne, score BM25) des meilleurs articles pour la requête, parmi les lignes admises"""
+        with self._index_lock.read(), STAGE_LATENCY.labels('sparse_search').time():
+            return self.sparse_index.search(normalized_query, depth, allowed)
+    
+    @staticmethod
+    def normalize_query(query: str) -> str:
+        """Forme canonique d'une requête (NFKC, espaces normalisés) pour les caches"""
+        return re.sub(r'\s+', ' ', unicodedata.normalize('NFKC', query)).strip()
+    
+    def get_query_embedding(self, normalized_query: str) -> np.ndarray:
+        """Embedding L2-normalisé d'une requête, avec cache LRU/TTL"""
+        embedding = self.query_embedding_cache.get(normalized_query)
+        if embedding is None:
+            with STAGE_LATENCY.labels('embedding').time():
+                embedding = np.array(self.get_embedding(normalized_query), dtype=np.float32).reshape(1, -1)
+            faiss.normalize_L2(embedding)
+            embedding = embedding[0]
+            self.query_embedding_cache.set(normalized_query, embedding)
+        return embedding
+    
+    def search_many(self,
+                    queries: List[str],
+                    k: int = 5,
+                    min_similarity: float = 0.3,
+                    batch_size: Optional[int] = None,
+                    filters: Optional[SearchFilter] = None) -> List[List[Dict[str, Any]]]:
+        """Recherche sémantique pour une liste de requêtes (un seul appel FAISS, même filtre pour toutes)"""
+        if self.index is None:
+            raise ValueError("Index non initialisé. Appelez create_embeddings() d'abord.")
+        if not queries:
+            return []
+        
+        allowed = self._allowed_rows(filters)
+        if allowed is not None and not allowed.any():
+            return [[] for _ in queries]
+        
+        normalized_queries = [self.normalize_query(query) for query in queries]
+        hybrid = self._hybrid_enabled()
+        depth = self._candidate_depth(k) if hybrid else k
+        sparse_futures = [self._sparse_pool.submit(self._sparse_search, query, depth, allowed)
+                          for query in normalized_queries] if hybrid else None
+        
+        # Embeddings absents du cache calculés par lots
+        embeddings = {query: self.query_embedding_cache.get(query) for query in set(normalized_queries)}
+        missing = [query for query, embedding in embeddings.items() if embedding is None]
+        if missing:
+            with STAGE_LATENCY.labels('embedding').time():
+                new_embeddings = np.ascontiguousarray(self.get_embeddings(missing, batch_size), dtype=np.float32)
+            faiss.normalize_L2(new_embeddings)
+            for query, embedding in zip(missing, new_embeddings):
+                embeddings[query] = embedding
+                self.query_embedding_cache.set(query, embedding)
+        
+        query_embeddings = np.array([embeddings[query] for query in normalized_queries], dtype=np.float32)
+        
+        with self._index_lock.read(), STAGE_LATENCY.labels('faiss_search').time():
+            similarities, indices = self._index_search(query_embeddings, depth, allowed)
+        
+        return [
+            self._format_results(query, similarities[i], indices[i], min_similarity,
+                                 sparse_futures[i].result() if hybrid else None, k, query_embeddings[i])
+            for i, query in enumerate(queries)
+        ]
+    
+    def _format_results(self,
+                        query: str,
+                        similarities: np.ndarray,
+                        indices: np.ndarray,
+                        min_similarity: float,
+                        sparse_hits: Optional[List[Tuple[int, float]]] = None,
+                        k: Optional[int] = None,
+                        query_embedding: Optional[np.ndarray] = None) -> List[Dict[str, Any]]:
+        """Formate les résultats FAISS d'une requête, fusionnés avec les résultats BM25 s'il y en a"""
+        if sparse_hits is None:
+            ranked = [(int(idx), float(similarity), None)
+                      for similarity, idx in zip(similarities, indices)
+                      # -1 : moins de k vecteurs dans l'index
+                      if idx >= 0 and similarity >= min_similarity]
+        else:
+            ranked = self._fuse(similarities, indices, min_similarity, sparse_hits, k, query_embedding)
         
-        # Formatage des résultats
         results = []
-        for i, (similarity, idx) in enumerate(zip(similarities[0], indices[0])):
-            if similarity >= min_similarity:
-                article = self.articles[idx]
+        for i, (idx, similarity, retrieval) in enumerate(ranked):
+            # Article lu (et décodé) uniquement pour les résultats retournés
+            article = self.articles[idx]
+            if article is not None:
                 metadata = self.metadata[idx]
                 
                 result = {
                     'rank': i + 1,
-                    'similarity': float(similarity),
+                    'similarity': similarity,
                     'article': article,
                     'metadata': metadata,
-                    'relevance_explanation': self._explain_relevance(query, article, similarity)
+                    'relevance_explanation': self._explain_relevance(query, article, similarity, retrieval)
                 }
+                if retrieval is not None:
+                    result['retrieval'] = retrieval
                 results.append(result)
         
         return results
     
-    def _explain_relevance(self, query: str, article: Dict[str, Any], similarity: float) -> str:
+    def _fuse(self,
+              similarities: np.ndarray,
+              indices: np.ndarray,
+              min_similarity: float,
+              sparse_hits: List[Tuple[int, float]],
+              k: int,
+              query_embedding: np.ndarray) -> List[Tuple[int, float, Dict[str, Any]]]:
+        """Reciprocal Rank Fusion des classements FAISS et BM25
+        
+        Score fusionné : somme de 1 / (rrf_k + rang) sur les moteurs ayant trouvé
+        l'article. Les articles sous min_similarity ne comptent pas : pour un
+        article trouvé uniquement par BM25, la similarité est calculée sur son
+        vecteur reconstruit depuis l'index.
+        """
+        dense = {}
+        for similarity, idx in zip(similarities, indices):
+            if idx >= 0 and similarity >= min_similarity:
+                dense[int(idx)] = (len(dense) + 1, float(similarity))
+        sparse = {row: (rank, score) for rank, (row, score) in enumerate(sparse_hits, 1)}
+        
+        # Articles trouvés par BM25 seul : même seuil de similarité que FAISS
+        reconstructed = self._reconstructed_similarities(
+            [row for row, _ in sparse_hits if row not in dense], query_embedding)
+        sparse = {row: hit for row, hit in sparse.items()
+                  if row in dense or reconstructed[row] >= min_similarity}
+        
+        fused = {}
+        for row in dense.keys() | sparse.keys():
+            dense_part = 1.0 / (self.rrf_k + dense[row][0]) if row in dense else 0.0
+            sparse_part = 1.0 / (self.rrf_k + sparse[row][0]) if row in sparse else 0.0
+            fused[row] = (dense_part + sparse_part, dense_part, sparse_part)
+        
+        ranked = []
+        for row in sorted(fused, key=lambda row: (-fused[row][0], row))[:k]:
+            score, dense_part, sparse_part = fused[row]
+            similarity = dense[row][1] if row in dense else reconstructed[row]
+            source = 'both' if dense_part and sparse_part else ('dense' if dense_part else 'sparse')
+            RETRIEVAL_RESULTS.labels(source).inc()
+            ranked.append((row, similarity, {
+                'fusion_score': score,
+                'dense_rank': dense[row][0] if row in dense else None,
+                'sparse_rank': sparse[row][0] if row in sparse else None,
+                'bm25_score': sparse[row][1] if row in sparse else None,
+                'contribution': {'dense': dense_part / score, 'sparse': sparse_part / score}
+            }))
+        return ranked
+    
+    def _reconstructed_similarities(self, rows: List[int], query_embedding: np.ndarray) -> Dict[int, float]:
+        """Similarité cosinus entre la requête et les vecteurs stockés des articles
+        
+        Approchée pour PQ (vecteurs décodés), comme les scores de recherche FAISS.
+        Vecteur non reconstructible : similarité 0.0.
+        """
+        similarities = {}
+        with self._index_lock.read():
+            for row in rows:
+                try:
+                    vector = self.index.reconstruct(row)
+                except RuntimeError:
+                    similarities[row] = 0.0
+                    continue
+                similarities[row] = float(np.dot(vector, query_embedding))
+        return similarities
+    
+    def _explain_relevance(self, query: str, article: Dict[str, Any], similarity: float,
+                           retrieval: Optional[Dict[str, Any]] = None) -> str:
         """Explique pourquoi cet article est pertinent"""
         explanations = []
         
@@ -246,85 +941,223 @@ class GoonetVectorSearch:
         
         explanations.append(f"類似度: {similarity:.3f} ({relevance})")
         
+        # Rang dans la recherche par mots-clés (BM25)
+        if retrieval and retrieval['sparse_rank']:
+            explanations.append(f"キーワード一致: {retrieval['sparse_rank']}位")
+        
         return " | ".join(explanations)
     
     def find_nearby_garages(self, 
                            location: str = None,
                            vehicle_manufacturer: str = None,
-                           service_type: str = None) -> List[Dict[str, Any]]:
-        """ガレージの検索 (簡易版 - 実際にはより高度な地理的検索が必要)"""
-        filtered_garages = []
+                           service_type: str = None,
+                           limit: int = 5) -> List[Dict[str, Any]]:
+        """ガレージの検索 : 地域・メーカー・サービスの転置インデックスで候補を絞り、上位 `limit` 件を返す"""
+        return self.garage_index.search(location, vehicle_manufacturer, service_type, limit)
+    
+    def find_garages_near(self,
+                          latitude: float,
+                          longitude: float,
+                          radius_km: float = 10.0,
+                          vehicle_manufacturer: str = None,
+                          service_type: str = None,
+                          limit: int = 5) -> List[Dict[str, Any]]:
+        """Garages les plus proches d'un point (grille géographique), avec `distance_km`"""
+        return self.garage_index.nearest(latitude, longitude, radius_km,
+                                         vehicle_manufacturer, service_type, limit)
+    
+    def save_index(self, index_dir: str = DEFAULT_INDEX_DIR):
+        """Sauvegarde l'index complet : vecteurs, métadonnées, articles et manifeste
         
-        for garage in self.garages:
-            match_score = 0
-            reasons = []
+        L'état est capturé sous le verrou en lecture (copie sérialisée de l'index
+        FAISS, modifications en attente des métadonnées, des articles, de BM25 et
+        des codes OBD) ; les fichiers sont écrits hors verrou, sans bloquer
+        recherches ni mises à jour. Chaque fichier est renommé atomiquement (les
+        workers qui projettent les anciens fichiers en mémoire ne sont pas
+        affectés) ; le manifeste est écrit en dernier et sert de marqueur de validité.
+        Articles et métadonnées déjà sauvegardés sont recopiés depuis les fichiers
+        projetés : seules les lignes modifiées depuis le chargement sont encodées.
+        """
+        if self.index is None:
+            return
+        
+        with self._save_lock:
+            with self._index_lock.read():
+                index_bytes = faiss.serialize_index(self.index)
+                metadata = self._snapshot_rows(self.metadata)
+                articles = self._snapshot_rows(self.articles)
+                sparse_index = self.sparse_index.snapshot() if self.sparse_index is not None else None
+                obd_index = self.obd_index.snapshot()
+                manifest = {
+                    'format_version': BUNDLE_FORMAT_VERSION,
+                    'model_name': self.embedding_model_id,
+                    'embedding_dimension': self.index.d,
+                    'index_type': self.index_type,
+                    'num_articles': self.article_count,
+                }
             
-            # Localisation
-            if location and location in garage['adresse']:
-                match_score += 3
-                reasons.append(f"地域一致: {location}")
+            index_path = Path(index_dir)
+            index_path.mkdir(parents=True, exist_ok=True)
             
-            # Spécialité véhicule
-            if vehicle_manufacturer and vehicle_manufacturer in garage.get('specialites', []):
-                match_score += 2
-                reasons.append(f"メーカー専門: {vehicle_manufacturer}")
+            # Vecteurs FAISS (format de faiss.write_index)
+            index_file = index_path / "articles.index"
+            tmp_file = index_file.with_name(index_file.name + '.tmp')
+            index_bytes.tofile(str(tmp_file))
+            os.replace(tmp_file, index_file)
             
-            # Type de service
-            if service_type and service_type in garage.get('services', []):
-                match_score += 1
-                reasons.append(f"サービス対応: {service_type}")
+            # Métadonnées (format colonnaire) et articles (JSON Lines + offsets)
+            write_columnar(str(index_path / "metadata.cols"), metadata)
+            num_rows = write_records(str(index_path / "articles.jsonl"), articles)
             
-            if match_score > 0 or not any([location, vehicle_manufacturer, service_type]):
-                garage_result = garage.copy()
-                garage_result['match_score'] = match_score
-                garage_result['match_reasons'] = reasons
-                filtered_garages.append(garage_result)
-        
-        # Tri par score de correspondance
-        filtered_garages.sort(key=lambda x: x['match_score'], reverse=True)
+            # Index BM25 (facultatif : sans lui, la recherche reste vectorielle)
+            files = {
+                'index': "articles.index",
+                'metadata': "metadata.cols",
+                'articles': "articles.jsonl"
+            }
+            if sparse_index is not None:
+                sparse_index.save(str(index_path / "sparse.npz"))
+                files['sparse'] = "sparse.npz"
+            # Index des codes OBD (sans lui, reconstruit au chargement)
+            obd_index.save(str(index_path / "obd.npz"))
+            files['obd'] = "obd.npz"
+            
+            manifest.update({
+                'num_rows': num_rows,
+                'created_at': datetime.now().isoformat(),
+                'files': files
+            })
+            manifest_file = index_path / "manifest.json"
+            tmp_manifest = manifest_file.with_name(manifest_file.name + '.tmp')
+            with open(tmp_manifest, 'w', encoding='utf-8') as f:
+                json.dump(manifest, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_manifest, manifest_file)
         
-        return filtered_garages[:5]  # Top 5
+        logger.info(f"Index sauvegardé dans {index_dir}")
+    
+    @staticmethod
+    def _snapshot_rows(rows):
+        """Copie figée d'une liste de lignes (les fichiers projetés ne sont pas recopiés)"""
+        return rows.snapshot() if isinstance(rows, (ColumnarMetadata, MmapRecordList)) else list(rows)
     
-    def save_index(self, index_dir: str = "/workspaces/SmarBot/data/faiss_index"):
-        """Sauvegarde l'index FAISS et les métadonnées"""
-        Path(index_dir).mkdir(parents=True, exist_ok=True)
+    def schedule_save(self, index_dir: str = DEFAULT_INDEX_DIR, delay: float = SAVE_DELAY_SECONDS) -> None:
+        """Sauvegarde différée : les modifications des `delay` prochaines secondes
+        sont enregistrées par une seule écriture"""
+        with self._save_timer_lock:
+            if self._save_timer is None:
+                self._save_timer = threading.Timer(delay, self._run_scheduled_save, args=(index_dir,))
+                self._save_timer.daemon = True
+                self._save_timer.start()
+    
+    def _run_scheduled_save(self, index_dir: str) -> None:
+        with self._save_timer_lock:
+            self._save_timer = None
+        try:
+            self.save_index(index_dir)
+        except Exception as e:
+            logger.error(f"Échec de la sauvegarde programmée de l'index: {e}")
+    
+    def flush_save(self) -> None:
+        """Exécute immédiatement la sauvegarde programmée s'il y en a une (arrêt du service)"""
+        with self._save_timer_lock:
+            timer, self._save_timer = self._save_timer, None
+        if timer is not None:
+            timer.cancel()
+            self.save_index(*timer.args)
+    
+    def _read_faiss_index(self, index_file: Path, mmap: bool) -> "faiss.Index":
+        """Lit l'index FAISS, éventuellement en projection mémoire"""
+        if not mmap:
+            return faiss.read_index(str(index_file))
         
-        if self.index is not None:
-            # Sauvegarde de l'index FAISS
-            index_file = Path(index_dir) / "articles.index"
-            faiss.write_index(self.index, str(index_file))
-            
-            # Sauvegarde des métadonnées
-            metadata_file = Path(index_dir) / "metadata.pkl"
-            with open(metadata_file, 'wb') as f:
-                pickle.dump(self.metadata, f)
-            
-            logger.info(f"Index sauvegardé dans {index_dir}")
+        # IO_FLAG_MMAP_IFC : vecteurs Flat/HNSW projetés ; IO_FLAG_MMAP : listes IVF
+        read_only = faiss.IO_FLAG_READ_ONLY
+        try:
+            return faiss.read_index(str(index_file),
+                                    faiss.IO_FLAG_MMAP | getattr(faiss, 'IO_FLAG_MMAP_IFC', 0) | read_only)
+        except RuntimeError:
+            return faiss.read_index(str(index_file), faiss.IO_FLAG_MMAP | read_only)
     
-    def load_index(self, index_dir: str = "/workspaces/SmarBot/data/faiss_index"):
-        """Charge l'index FAISS et les métadonnées"""
-        index_file = Path(index_dir) / "articles.index"
-        metadata_file = Path(index_dir) / "metadata.pkl"
+    def load_index(self, index_dir: str = DEFAULT_INDEX_DIR, mmap: Optional[bool] = None):
+        """Charge l'index complet (vecteurs, métadonnées et articles) en une étape
         
-        if index_file.exists() and metadata_file.exists():
-            self.index = faiss.read_index(str(index_file))
-            
-            with open(metadata_file, 'rb') as f:
-                self.metadata = pickle.load(f)
-            
-            logger.info(f"Index chargé depuis {index_dir}")
-            return True
-        return False
+        Les articles ne sont pas décodés au chargement : seuls ceux des résultats
+        de recherche sont lus depuis le fichier. Avec mmap=True, les vecteurs sont
+        également projetés en mémoire plutôt que copiés : plusieurs workers
+        partagent une seule copie via le page cache, et l'index est en lecture seule.
+        
+        Retourne False si l'index est absent ou incompatible (format, modèle, dimension).
+        """
+        mmap = self.mmap_index if mmap is None else mmap
+        index_path = Path(index_dir)
+        manifest_file = index_path / "manifest.json"
+        
+        if not manifest_file.exists():
+            return False
+        
+        with open(manifest_file, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        
+        if manifest.get('format_version') != BUNDLE_FORMAT_VERSION:
+            logger.warning(f"Format d'index {manifest.get('format_version')} non supporté, reconstruction nécessaire")
+            return False
+        if manifest['model_name'] != self.embedding_model_id:
+            logger.warning(f"Index construit avec {manifest['model_name']} (modèle actuel: "
+                           f"{self.embedding_model_id}), reconstruction nécessaire")
+            return False
+        
+        files = manifest['files']
+        index = self._read_faiss_index(index_path / files['index'], mmap)
+        if index.d != manifest['embedding_dimension']:
+            logger.warning("Dimension de l'index incohérente avec le manifeste, reconstruction nécessaire")
+            return False
+        
+        # Index antérieurs à la table identifiant -> liste : similarité des résultats BM25 seuls
+        enable_reconstruction(index)
+        
+        metadata = ColumnarMetadata(str(index_path / files['metadata']))
+        articles = MmapRecordList(str(index_path / files['articles']))
+        sparse_index = None
+        if files.get('sparse') and (index_path / files['sparse']).exists():
+            sparse_index = SparseIndex.load(str(index_path / files['sparse']))
+        else:
+            logger.warning("Index BM25 absent du répertoire : recherche vectorielle seule "
+                           "(reconstruisez l'index pour la recherche hybride)")
+        obd_index = None
+        if files.get('obd') and (index_path / files['obd']).exists():
+            obd_index = ObdCodeIndex.load(str(index_path / files['obd']))
+        
+        with self._index_lock.write():
+            self.index = index
+            self.metadata = metadata
+            self.articles = articles
+            self.sparse_index = sparse_index
+            self._read_only = mmap
+            self.embedding_dimension = index.d
+            self._rebuild_row_mapping(obd_index)
+            self._index_changed()
+            apply_search_params(self.index, self.index_params)
+        
+        logger.info(f"Index chargé depuis {index_dir}: {self.article_count} articles"
+                    + (" (mmap)" if mmap else ""))
+        return True
 
 if __name__ == '__main__':
     # Test du système de recherche
-    search_engine = GoonetVectorSearch(use_bedrock=False)
+    search_engine = GoonetVectorSearch(
+        use_bedrock=False,
+        batch_size=int(os.getenv('EMBEDDING_BATCH_SIZE', '64')),
+        num_workers=int(os.getenv('EMBEDDING_WORKERS', '0'))
+    )
     
     # Chargement des données
     search_engine.load_data()
     
     # Création des embeddings
-    search_engine.create_embeddings()
+    try:
+        search_engine.create_embeddings()
+    finally:
+        search_engine.stop_encoder_pool()
     
     # Sauvegarde
     search_engine.save_index()
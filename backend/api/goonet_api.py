@@ -5,22 +5,32 @@ API FastAPI pour le chatbot Goo-net Pit
 Intègre la recherche vectorielle et le moteur conversationnel
 """
 
-from fastapi import FastAPI, HTTPException, BackgroundTasks
+from fastapi import FastAPI, HTTPException, BackgroundTasks, Header, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response, StreamingResponse
 from pydantic import BaseModel, Field
 from typing import List, Dict, Any, Optional
 import logging
 import uuid
+from collections import deque
 from datetime import datetime
 import json
 import os
 import sys
+import asyncio
+import functools
+import hmac
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 # Ajout du chemin pour les imports
 sys.path.append('/workspaces/SmarBot/backend/api/data_processing')
 
 from chat_engine import GoonetChatEngine, ChatResponse
 from vector_search import GoonetVectorSearch
+from facet_index import SearchFilter
+from metrics import REQUEST_LATENCY, register_search_engine, render_metrics
+from ttl_cache import TTLCache
 
 # Configuration du logging
 logging.basicConfig(level=logging.INFO)
@@ -43,10 +53,37 @@ class ChatResponseModel(BaseModel):
     follow_up_questions: Optional[List[str]] = None
     timestamp: datetime
 
+class SearchFilterModel(BaseModel):
+    vehicle_manufacturer: Optional[str] = Field(None, description="Constructeur (ex. ホンダ)")
+    vehicle_model: Optional[str] = Field(None, description="Modèle (ex. N-BOX)")
+    year_min: Optional[int] = Field(None, description="Année minimale (incluse)")
+    year_max: Optional[int] = Field(None, description="Année maximale (incluse)")
+    price_min: Optional[int] = Field(None, ge=0, description="Prix estimé minimal en yens (inclus)")
+    price_max: Optional[int] = Field(None, ge=0, description="Prix estimé maximal en yens (inclus)")
+    
+    def to_filter(self) -> SearchFilter:
+        return SearchFilter(**self.dict())
+
 class SearchRequest(BaseModel):
     query: str = Field(..., description="Requête de recherche")
     max_results: int = Field(5, ge=1, le=20, description="Nombre maximum de résultats")
     min_similarity: float = Field(0.3, ge=0.0, le=1.0, description="Seuil de similarité minimum")
+    filters: Optional[SearchFilterModel] = Field(None, description="Filtres sur les métadonnées des articles")
+
+class BatchSearchRequest(BaseModel):
+    queries: List[str] = Field(..., min_items=1, max_items=10000, description="Requêtes de recherche")
+    max_results: int = Field(5, ge=1, le=20, description="Nombre maximum de résultats par requête")
+    min_similarity: float = Field(0.3, ge=0.0, le=1.0, description="Seuil de similarité minimum")
+    filters: Optional[SearchFilterModel] = Field(None, description="Filtres appliqués à toutes les requêtes")
+
+# Délai de regroupement des sauvegardes de l'index après /admin/articles
+INDEX_SAVE_DELAY_SECONDS = float(os.getenv('INDEX_SAVE_DELAY_SECONDS', '5'))
+
+# Nombre de requêtes traitées par appel à search_many dans /search/batch
+SEARCH_BATCH_CHUNK_SIZE = 256
+
+class ArticleUpsertRequest(BaseModel):
+    articles: List[Dict[str, Any]] = Field(..., min_items=1, description="Articles de diagnostic (format diagnostic_articles.json)")
 
 class FeedbackRequest(BaseModel):
     response_id: str = Field(..., description="ID de la réponse")
@@ -71,23 +108,106 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def record_request_latency(request: Request, call_next):
+    """Durée de chaque requête, par route (et non par URL, pour borner les séries)"""
+    start = time.perf_counter()
+    response = await call_next(request)
+    route = request.scope.get("route")
+    REQUEST_LATENCY.labels(
+        request.method,
+        route.path if route else "unmatched",
+        str(response.status_code)
+    ).observe(time.perf_counter() - start)
+    return response
+
 # Variables globales pour le cache des moteurs
 chat_engine: Optional[GoonetChatEngine] = None
 search_engine: Optional[GoonetVectorSearch] = None
-conversation_logs: Dict[str, List] = {}
+search_engine_metrics = None
+# Derniers messages de chaque session en mémoire : sessions bornées (LRU/TTL),
+# messages bornés par session ; l'historique complet est dans le journal du moteur
+SESSION_MAX_MESSAGES = int(os.getenv('SESSION_MAX_MESSAGES', '50'))
+conversation_logs = TTLCache(maxsize=int(os.getenv('SESSION_CACHE_SIZE', '10000')),
+                             ttl=float(os.getenv('SESSION_TTL_SECONDS', '3600')))
+
+# Pool borné pour le travail bloquant (encodage, recherche FAISS, appels boto3) :
+# la boucle d'événements reste disponible pour les autres requêtes
+worker_pool = ThreadPoolExecutor(max_workers=int(os.getenv('API_WORKER_THREADS', '8')),
+                                 thread_name_prefix='goonet-worker')
+
+async def run_in_worker(func, *args, **kwargs):
+    """Exécute une fonction bloquante dans le pool de travail"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(worker_pool, functools.partial(func, *args, **kwargs))
+
+async def iterate_in_worker(iterator):
+    """Parcourt un itérateur bloquant élément par élément dans le pool de travail"""
+    done = object()
+    try:
+        while True:
+            item = await run_in_worker(next, iterator, done)
+            if item is done:
+                break
+            yield item
+    finally:
+        close = getattr(iterator, 'close', None)
+        if close:
+            try:
+                close()
+            except ValueError:
+                # Générateur encore en cours dans un thread (client déconnecté)
+                pass
+
+def format_sse(event: str, data: Any) -> str:
+    """Événement Server-Sent Events"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
 
 @app.on_event("startup")
 async def startup_event():
     """Initialisation au démarrage de l'API"""
-    global chat_engine, search_engine
+    global chat_engine, search_engine, search_engine_metrics
     
     logger.info("🚀 Initialisation de l'API Goo-net Pit...")
     
     try:
         # Initialisation du moteur de chat
         use_bedrock = os.getenv('USE_AWS_BEDROCK', 'false').lower() == 'true'
-        chat_engine = GoonetChatEngine(use_bedrock=use_bedrock)
+        search_options = {
+            "index_type": os.getenv('FAISS_INDEX_TYPE', 'flat'),
+            # Index et métadonnées projetés en mémoire : une seule copie pour tous les workers
+            "mmap_index": os.getenv('FAISS_INDEX_MMAP', 'false').lower() == 'true',
+            # BM25 + FAISS fusionnés (RRF)
+            "hybrid_search": os.getenv('HYBRID_SEARCH', 'true').lower() == 'true',
+            "index_params": {
+                "nprobe": int(os.getenv('FAISS_NPROBE', '8')),
+                "ef_search": int(os.getenv('FAISS_EF_SEARCH', '64'))
+            }
+        }
+        # Au-delà de ce délai, la réponse de Claude est remplacée par la réponse de secours
+        stage_timeouts = {"response": float(os.getenv('LLM_TIMEOUT_SECONDS', '25'))}
+        # Journal des conversations : .jsonl (rotation) ou .sqlite (WAL)
+        # Réponse journalisée tronquée à ce nombre de caractères (0 : réponse complète)
+        log_response_chars = int(os.getenv('CONVERSATION_LOG_RESPONSE_CHARS', '200'))
+        conversation_log_options = {
+            "max_queue_size": int(os.getenv('CONVERSATION_LOG_QUEUE_SIZE', '10000')),
+            "drop_policy": os.getenv('CONVERSATION_LOG_DROP_POLICY', 'drop_newest'),
+            "field_limits": {"bot_response": log_response_chars} if log_response_chars else {}
+        }
+        chat_engine = GoonetChatEngine(
+            use_bedrock=use_bedrock,
+            search_options=search_options,
+            stage_timeouts=stage_timeouts,
+            conversation_log_path=os.getenv('CONVERSATION_LOG_PATH',
+                                            '/workspaces/SmarBot/data/logs/conversations.jsonl'),
+            conversation_log_options=conversation_log_options,
+            # Code OBD : réponse depuis l'index des codes dès ce nombre d'articles (0 : désactivé)
+            obd_fast_path_min_hits=int(os.getenv('OBD_FAST_PATH_MIN_HITS', '1')) or None,
+            # Constructeur, modèle et année du message comme filtres de recherche
+            entity_filters=os.getenv('ENTITY_SEARCH_FILTERS', 'true').lower() == 'true'
+        )
         search_engine = chat_engine.search_engine
+        search_engine_metrics = register_search_engine(search_engine)
         
         logger.info(f"✅ Moteurs initialisés (Bedrock: {use_bedrock})")
         
@@ -95,6 +215,16 @@ async def startup_event():
         logger.error(f"❌ Erreur d'initialisation: {e}")
         raise e
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Libération du client Bedrock asynchrone et du pool de travail"""
+    if chat_engine:
+        await chat_engine.aclose()
+    if search_engine:
+        # Modifications de l'index pas encore sauvegardées
+        await run_in_worker(search_engine.flush_save)
+    worker_pool.shutdown(wait=False)
+
 @app.get("/")
 async def root():
     """Point d'entrée racine de l'API"""
@@ -106,6 +236,7 @@ async def root():
         "endpoints": {
             "chat": "/chat",
             "search": "/search",
+            "search_batch": "/search/batch",
             "feedback": "/feedback",
             "health": "/health"
         }
@@ -129,12 +260,12 @@ async def health_check():
     # Vérification additionnelle
     if search_engine and search_engine.index:
         health_status["index_size"] = search_engine.index.ntotal
-        health_status["metadata_count"] = len(search_engine.metadata)
+        health_status["metadata_count"] = search_engine.article_count
     
     return health_status
 
 @app.post("/chat", response_model=ChatResponseModel)
-async def chat_endpoint(request: ChatMessage, background_tasks: BackgroundTasks):
+async def chat_endpoint(request: ChatMessage):
     """Point d'entrée principal pour le chat"""
     global chat_engine
     
@@ -146,30 +277,26 @@ async def chat_endpoint(request: ChatMessage, background_tasks: BackgroundTasks)
     session_id = request.session_id or str(uuid.uuid4())
     
     try:
-        # Traitement du message
-        response = chat_engine.process_message(request.message)
+        # Traitement du message (hors de la boucle d'événements)
+        # Le moteur journalise l'échange (une seule entrée par message)
+        log_context = {"response_id": response_id, "user_info": request.user_info}
+        response = await chat_engine.aprocess_message(request.message, session_id,
+                                                      executor=worker_pool, log_context=log_context)
         
         # Formatage de la réponse
         api_response = ChatResponseModel(
             response_id=response_id,
             session_id=session_id,
-            message=response.message,
-            confidence=response.confidence,
-            sources=response.sources,
-            recommendations=response.recommendations,
-            appointment_form=response.appointment_form,
-            follow_up_questions=response.follow_up_questions,
+            message=response['response'],
+            confidence=response['confidence'],
+            sources=response['sources'],
+            recommendations=response['recommended_garages'],
+            appointment_form=response['appointment_form'],
+            follow_up_questions=response['follow_up_questions'],
             timestamp=datetime.now()
         )
         
-        # Logging en arrière-plan
-        background_tasks.add_task(
-            log_conversation,
-            session_id,
-            request.message,
-            api_response.dict(),
-            request.user_info
-        )
+        remember_session_message(session_id, request.message, api_response.dict())
         
         return api_response
         
@@ -177,6 +304,44 @@ async def chat_endpoint(request: ChatMessage, background_tasks: BackgroundTasks)
         logger.error(f"Erreur lors du traitement du chat: {e}")
         raise HTTPException(status_code=500, detail=f"Erreur de traitement: {str(e)}")
 
+@app.post("/chat/stream")
+async def chat_stream_endpoint(request: ChatMessage):
+    """Chat en flux (Server-Sent Events)
+    
+    Événements : `metadata` (sources, garages, formulaire de rendez-vous) avant la
+    génération, puis `token` pour chaque fragment de texte, et enfin `done`.
+    """
+    global chat_engine
+    
+    if not chat_engine:
+        raise HTTPException(status_code=503, detail="Moteur de chat non initialisé")
+    
+    response_id = str(uuid.uuid4())
+    session_id = request.session_id or str(uuid.uuid4())
+    
+    log_context = {"response_id": response_id, "user_info": request.user_info}
+    
+    async def generate_events():
+        try:
+            events = chat_engine.stream_message(request.message, session_id, log_context=log_context)
+            async for item in iterate_in_worker(events):
+                data = item['data']
+                if item['event'] == 'metadata':
+                    data = {'response_id': response_id, **data}
+                elif item['event'] == 'done':
+                    remember_session_message(session_id, request.message,
+                                             {'response_id': response_id, **data})
+                yield format_sse(item['event'], data)
+        except Exception as e:
+            logger.error(f"Erreur lors du chat en flux: {e}")
+            yield format_sse('error', {'detail': f"Erreur de traitement: {str(e)}"})
+    
+    return StreamingResponse(
+        generate_events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.post("/search")
 async def search_endpoint(request: SearchRequest):
     """Recherche directe dans la base de connaissances"""
@@ -186,14 +351,17 @@ async def search_endpoint(request: SearchRequest):
         raise HTTPException(status_code=503, detail="Moteur de recherche non initialisé")
     
     try:
-        results = search_engine.search(
+        results = await run_in_worker(
+            search_engine.search,
             query=request.query,
             k=request.max_results,
-            min_similarity=request.min_similarity
+            min_similarity=request.min_similarity,
+            filters=request.filters.to_filter() if request.filters else None
         )
         
         return {
             "query": request.query,
+            "filters": request.filters.to_filter().as_dict() if request.filters else {},
             "results_count": len(results),
             "results": results,
             "timestamp": datetime.now().isoformat()
@@ -203,6 +371,40 @@ async def search_endpoint(request: SearchRequest):
         logger.error(f"Erreur lors de la recherche: {e}")
         raise HTTPException(status_code=500, detail=f"Erreur de recherche: {str(e)}")
 
+@app.post("/search/batch")
+async def batch_search_endpoint(request: BatchSearchRequest):
+    """Recherche groupée ; résultats renvoyés au fil de l'eau en JSON Lines"""
+    global search_engine
+    
+    if not search_engine:
+        raise HTTPException(status_code=503, detail="Moteur de recherche non initialisé")
+    
+    def generate_results():
+        # Générateur synchrone : exécuté par Starlette dans le pool de threads
+        for start in range(0, len(request.queries), SEARCH_BATCH_CHUNK_SIZE):
+            chunk = request.queries[start:start + SEARCH_BATCH_CHUNK_SIZE]
+            try:
+                chunk_results = search_engine.search_many(
+                    chunk,
+                    k=request.max_results,
+                    min_similarity=request.min_similarity,
+                    filters=request.filters.to_filter() if request.filters else None
+                )
+            except Exception as e:
+                logger.error(f"Erreur lors de la recherche groupée: {e}")
+                yield json.dumps({"error": f"Erreur de recherche: {str(e)}"}, ensure_ascii=False) + "\n"
+                return
+            
+            for offset, (query, results) in enumerate(zip(chunk, chunk_results)):
+                yield json.dumps({
+                    "index": start + offset,
+                    "query": query,
+                    "results_count": len(results),
+                    "results": results
+                }, ensure_ascii=False) + "\n"
+    
+    return StreamingResponse(generate_results(), media_type="application/x-ndjson")
+
 @app.post("/feedback")
 async def feedback_endpoint(request: FeedbackRequest, background_tasks: BackgroundTasks):
     """Collecte du feedback utilisateur"""
@@ -230,27 +432,52 @@ async def feedback_endpoint(request: FeedbackRequest, background_tasks: Backgrou
 async def get_garages(
     location: Optional[str] = None,
     manufacturer: Optional[str] = None,
-    service: Optional[str] = None
+    service: Optional[str] = None,
+    lat: Optional[float] = Query(None, ge=-90, le=90),
+    lon: Optional[float] = Query(None, ge=-180, le=180),
+    radius: float = Query(10.0, gt=0, le=500, description="Rayon en km (avec lat/lon)"),
+    limit: int = Query(5, ge=1, le=100)
 ):
-    """Récupération des garages avec filtres"""
+    """Récupération des garages avec filtres
+    
+    Avec `lat` et `lon` : les garages les plus proches dans `radius` km, triés par
+    distance (`manufacturer` et `service` filtrent alors les résultats).
+    """
     global search_engine
     
     if not search_engine:
         raise HTTPException(status_code=503, detail="Moteur de recherche non initialisé")
+    if (lat is None) != (lon is None):
+        raise HTTPException(status_code=422, detail="lat et lon doivent être fournis ensemble")
     
     try:
-        garages = search_engine.find_nearby_garages(
-            location=location,
-            vehicle_manufacturer=manufacturer,
-            service_type=service
-        )
+        if lat is not None:
+            garages = search_engine.find_garages_near(
+                latitude=lat,
+                longitude=lon,
+                radius_km=radius,
+                vehicle_manufacturer=manufacturer,
+                service_type=service,
+                limit=limit
+            )
+        else:
+            garages = search_engine.find_nearby_garages(
+                location=location,
+                vehicle_manufacturer=manufacturer,
+                service_type=service,
+                limit=limit
+            )
+        
+        filters = {
+            "location": location,
+            "manufacturer": manufacturer,
+            "service": service
+        }
+        if lat is not None:
+            filters.update({"lat": lat, "lon": lon, "radius": radius})
         
         return {
-            "filters": {
-                "location": location,
-                "manufacturer": manufacturer,
-                "service": service
-            },
+            "filters": filters,
             "garages_count": len(garages),
             "garages": garages,
             "timestamp": datetime.now().isoformat()
@@ -274,42 +501,99 @@ async def get_stats():
     
     if search_engine:
         stats["database_stats"] = {
-            "total_articles": len(search_engine.articles),
+            "total_articles": search_engine.article_count,
             "total_garages": len(search_engine.garages),
             "vector_index_size": search_engine.index.ntotal if search_engine.index else 0
         }
+        stats["cache_stats"] = search_engine.cache_stats()
+    
+    if chat_engine:
+        stats["conversation_log"] = chat_engine.conversation_log.stats()
     
     return stats
 
-# Fonctions utilitaires pour les tâches en arrière-plan
-async def log_conversation(session_id: str, user_message: str, response: Dict, user_info: Optional[Dict]):
-    """Journalisation des conversations"""
-    global conversation_logs
+@app.get("/metrics")
+async def metrics_endpoint():
+    """Métriques au format Prometheus (latences par étape, jetons, caches, index)"""
+    content, content_type = render_metrics([search_engine_metrics] if search_engine_metrics else [])
+    return Response(content=content, media_type=content_type)
+
+def check_admin_token(x_admin_token: Optional[str]):
+    """Vérifie le jeton d'administration ; sans ADMIN_API_TOKEN, les endpoints d'administration sont fermés"""
+    expected = os.getenv('ADMIN_API_TOKEN')
+    if not expected:
+        raise HTTPException(status_code=503, detail="Administration désactivée (ADMIN_API_TOKEN non défini)")
+    if not x_admin_token or not hmac.compare_digest(x_admin_token.encode('utf-8'), expected.encode('utf-8')):
+        raise HTTPException(status_code=401, detail="Jeton d'administration invalide")
+
+@app.post("/admin/articles")
+async def upsert_articles_endpoint(request: ArticleUpsertRequest,
+                                   x_admin_token: Optional[str] = Header(None)):
+    """Ajout ou mise à jour d'articles dans l'index sans redémarrage"""
+    global search_engine
     
-    log_entry = {
-        "timestamp": datetime.now().isoformat(),
-        "session_id": session_id,
-        "user_message": user_message,
-        "response": response,
-        "user_info": user_info
-    }
+    check_admin_token(x_admin_token)
+    if not search_engine:
+        raise HTTPException(status_code=503, detail="Moteur de recherche non initialisé")
     
-    if session_id not in conversation_logs:
-        conversation_logs[session_id] = []
+    try:
+        result = await run_in_worker(search_engine.upsert_articles, request.articles)
+    except KeyError as e:
+        raise HTTPException(status_code=422, detail=f"Champ d'article manquant: {e}")
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except Exception as e:
+        logger.error(f"Erreur lors de la mise à jour de l'index: {e}")
+        raise HTTPException(status_code=500, detail=f"Erreur de mise à jour: {str(e)}")
     
-    conversation_logs[session_id].append(log_entry)
+    # Persistance de l'index en arrière-plan, regroupée avec les modifications proches
+    search_engine.schedule_save(delay=INDEX_SAVE_DELAY_SECONDS)
+    
+    return {
+        **result,
+        "index_size": search_engine.index.ntotal,
+        "timestamp": datetime.now().isoformat()
+    }
+
+@app.delete("/admin/articles/{article_id}")
+async def delete_article_endpoint(article_id: str,
+                                  x_admin_token: Optional[str] = Header(None)):
+    """Suppression d'un article de l'index"""
+    global search_engine
+    
+    check_admin_token(x_admin_token)
+    if not search_engine:
+        raise HTTPException(status_code=503, detail="Moteur de recherche non initialisé")
     
-    # Optionnel : Sauvegarde sur disque
     try:
-        log_file = f"/workspaces/SmarBot/data/logs/conversation_{session_id}.json"
-        os.makedirs(os.path.dirname(log_file), exist_ok=True)
-        
-        with open(log_file, 'w', encoding='utf-8') as f:
-            json.dump(conversation_logs[session_id], f, ensure_ascii=False, indent=2)
-            
-    except Exception as e:
-        logger.error(f"Erreur lors de la sauvegarde du log: {e}")
+        deleted = await run_in_worker(search_engine.delete_articles, [article_id])
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    
+    if not deleted:
+        raise HTTPException(status_code=404, detail=f"Article introuvable: {article_id}")
+    
+    search_engine.schedule_save(delay=INDEX_SAVE_DELAY_SECONDS)
+    
+    return {
+        "deleted": article_id,
+        "index_size": search_engine.index.ntotal,
+        "timestamp": datetime.now().isoformat()
+    }
 
+def remember_session_message(session_id: str, user_message: str, response: Dict):
+    """Derniers échanges de la session en mémoire (le journal sur disque est tenu par le moteur)"""
+    session_log = conversation_logs.get(session_id)
+    if session_log is None:
+        session_log = deque(maxlen=SESSION_MAX_MESSAGES)
+    session_log.append({
+        "timestamp": datetime.now().isoformat(),
+        "user_message": user_message,
+        "response": response
+    })
+    conversation_logs.set(session_id, session_log)
+
+# Fonctions utilitaires pour les tâches en arrière-plan
 async def save_feedback(feedback_data: Dict):
     """Sauvegarde du feedback"""
     try:
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""
+Fixtures des tests du moteur de recherche Goo-net Pit
+Encodeur local déterministe (sacs de bigrammes hachés) à la place du modèle
+sentence-transformers : pas de téléchargement, similarités reproductibles
+"""
+
+import hashlib
+import sys
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / 'data_processing'))
+
+EMBEDDING_DIMENSION = 64
+
+
+class HashingEncoder:
+    """Remplace SentenceTransformer : bigrammes de caractères hachés dans 64 dimensions"""
+
+    def __init__(self, model_name: str):
+        self.model_name = model_name
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return EMBEDDING_DIMENSION
+
+    def _encode_one(self, text: str) -> np.ndarray:
+        vector = np.zeros(EMBEDDING_DIMENSION, dtype=np.float32)
+        for i in range(max(len(text) - 1, 1)):
+            digest = hashlib.md5(text[i:i + 2].encode('utf-8')).digest()
+            vector[digest[0] % EMBEDDING_DIMENSION] += 1.0 if digest[1] & 1 else -1.0
+        return vector
+
+    def encode(self, texts, **kwargs) -> np.ndarray:
+        if isinstance(texts, str):
+            return self._encode_one(texts)
+        return np.array([self._encode_one(text) for text in texts], dtype=np.float32)
+
+
+def make_article(article_id: str,
+                 manufacturer: Optional[str] = 'ホンダ',
+                 model: Optional[str] = 'N-BOX',
+                 year: Optional[int] = 2018,
+                 symptom: str = 'ハンドルが重い',
+                 obd_codes: Iterable[str] = (),
+                 price: Optional[int] = 20000) -> Dict[str, Any]:
+    """Article de diagnostic au format de diagnostic_articles.json"""
+    return {
+        'article_id': article_id,
+        'vehicle_info': {'manufacturer': manufacturer, 'model': model, 'year': year},
+        'obd_codes': [{'code': code, 'description': '故障コード'} for code in obd_codes],
+        'symptom': symptom,
+        'summary': f"{manufacturer} {model} {symptom}",
+        'diagnosis': f"{symptom}の点検",
+        'solution': '部品交換',
+        'work_content': '点検・交換',
+        'full_text': f"{manufacturer} {model} {symptom} {' '.join(obd_codes)}",
+        'estimated_price': price,
+        'estimated_duration': 1.0,
+    }
+
+
+@pytest.fixture
+def articles():
+    return [
+        make_article('honda-1', symptom='ハンドルが重い'),
+        make_article('honda-2', model='フィット', year=2015, symptom='エアコンが効かない', price=30000),
+        make_article('toyota-1', manufacturer='トヨタ', model='プリウス', year=2020,
+                     symptom='エンジン警告灯が点灯', obd_codes=['P0A80'], price=150000),
+        make_article('nissan-1', manufacturer='日産', model='セレナ', year=2019,
+                     symptom='バッテリー警告灯', obd_codes=['U3003-1C'], price=8000),
+        make_article('mazda-1', manufacturer='マツダ', model='デミオ', year=2016,
+                     symptom='ブレーキの異音', price=None),
+    ]
+
+
+@pytest.fixture
+def search_engine(monkeypatch, articles):
+    pytest.importorskip('faiss')
+    pytest.importorskip('sentence_transformers')
+    import vector_search
+
+    monkeypatch.setattr(vector_search, 'SentenceTransformer', HashingEncoder)
+    engine = vector_search.GoonetVectorSearch(use_bedrock=False, embedding_cache_path=None)
+    engine.articles = list(articles)
+    engine.create_embeddings()
+    return engine
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""Tests du client d'embeddings Bedrock avec un `invoke_model` local"""
+
+import io
+import json
+import threading
+
+import numpy as np
+import pytest
+
+from bedrock_embeddings import BedrockEmbeddingClient
+
+
+class ClientError(Exception):
+    """Erreur au format botocore (`response['Error']['Code']`)"""
+
+    def __init__(self, code: str):
+        super().__init__(code)
+        self.response = {'Error': {'Code': code}}
+
+
+class StubBedrock:
+    """`invoke_model` local : vecteur (longueur du texte, somme des caractères)"""
+
+    def __init__(self, failures=None):
+        # Texte -> erreurs à lever avant de répondre
+        self.failures = {text: list(errors) for text, errors in (failures or {}).items()}
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def invoke_model(self, modelId, body, contentType, accept):
+        text = json.loads(body)['inputText']
+        with self._lock:
+            self.calls.append(text)
+            errors = self.failures.get(text)
+            error = errors.pop(0) if errors else None
+        if error is not None:
+            raise error
+        embedding = [float(len(text)), float(sum(map(ord, text)))]
+        return {'body': io.BytesIO(json.dumps({'embedding': embedding}).encode('utf-8'))}
+
+
+def _expected(texts):
+    return np.array([[len(text), sum(map(ord, text))] for text in texts], dtype=np.float32)
+
+
+def _client(stub, **options):
+    return BedrockEmbeddingClient(stub, requests_per_second=1000.0, base_delay=0.0, max_delay=0.0, **options)
+
+
+def test_query_embeddings_keep_no_checkpoint_state(tmp_path):
+    checkpoint = tmp_path / 'checkpoint.jsonl'
+    client = _client(StubBedrock(), checkpoint_path=str(checkpoint))
+
+    client.embed_many(['エンジン警告灯', 'ブレーキの異音'])
+
+    assert client._checkpointed is None
+    assert not checkpoint.exists()
+
+
+def test_throttling_is_retried_and_other_errors_are_raised():
+    stub = StubBedrock({'a': [ClientError('ThrottlingException'), ClientError('ThrottlingException')],
+                        'b': [ClientError('ValidationException')]})
+    client = _client(stub)
+
+    np.testing.assert_array_equal(client.embed('a'), _expected(['a'])[0])
+    assert stub.calls.count('a') == 3
+    with pytest.raises(ClientError, match='ValidationException'):
+        client.embed('b')
+    assert stub.calls.count('b') == 1
+
+
+def test_output_order_is_preserved_under_concurrency():
+    texts = [f"記事{i}" * (i % 7 + 1) for i in range(200)] + ['記事1', '記事2']
+    stub = StubBedrock()
+
+    embeddings = _client(stub, max_concurrency=16).embed_many(texts)
+
+    np.testing.assert_array_equal(embeddings, _expected(texts))
+    assert len(stub.calls) == len(set(texts))
+
+
+def test_build_resumes_from_checkpoint_and_clear_deletes_it(tmp_path):
+    checkpoint = tmp_path / 'checkpoint.jsonl'
+    texts = ['ハンドルが重い', 'エアコンが効かない', 'バッテリー警告灯']
+
+    # Construction interrompue sur le troisième texte
+    interrupted = _client(StubBedrock({texts[2]: [ClientError('ValidationException')]}),
+                          checkpoint_path=str(checkpoint), checkpoint_every=1)
+    with pytest.raises(ClientError):
+        interrupted.embed_many(texts, checkpoint=True)
+    assert checkpoint.exists()
+
+    stub = StubBedrock()
+    resumed = _client(stub, checkpoint_path=str(checkpoint))
+    np.testing.assert_array_equal(resumed.embed_many(texts, checkpoint=True), _expected(texts))
+    assert stub.calls == [texts[2]]
+
+    resumed.clear_checkpoint()
+    assert not checkpoint.exists()
+    assert resumed._checkpointed is None
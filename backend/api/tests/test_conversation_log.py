@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+"""Tests du journal des conversations"""
+
+import json
+
+from conversation_log import ConversationLogWriter, JsonlFileSink
+
+
+def _write_and_read(tmp_path, entry, **options):
+    path = tmp_path / 'conversations.jsonl'
+    writer = ConversationLogWriter(JsonlFileSink(str(path)), **options)
+    writer.write(entry)
+    writer.close()
+    return json.loads(path.read_text(encoding='utf-8'))
+
+
+def test_long_bot_response_is_truncated(tmp_path):
+    entry = {'user_message': 'エンジンがかからない', 'bot_response': 'あ' * 5000}
+
+    logged = _write_and_read(tmp_path, entry)
+
+    assert logged['bot_response'] == 'あ' * 200 + '...'
+    assert logged['user_message'] == entry['user_message']
+    assert len(entry['bot_response']) == 5000
+
+
+def test_field_limits_are_configurable(tmp_path):
+    entry = {'bot_response': 'x' * 300}
+
+    assert _write_and_read(tmp_path, entry, field_limits={'bot_response': 10})['bot_response'] == 'x' * 10 + '...'
+    assert _write_and_read(tmp_path / 'full', entry, field_limits={})['bot_response'] == 'x' * 300
@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+"""Tests de l'extraction d'entités"""
+
+import pytest
+
+from entity_extractor import EntityExtractor
+
+
+@pytest.fixture(scope='module')
+def extractor():
+    return EntityExtractor.from_directory()
+
+
+@pytest.mark.parametrize('message, code', [
+    ('U3003-1Cが出ました', 'U3003-1C'),
+    ('ｐ０１７１ の警告灯', 'P0171'),
+    ('診断機でc1ae687が表示', 'C1AE6'),
+    ('P0300と B1342', 'P0300'),
+])
+def test_obd_codes_are_extracted_and_normalized(extractor, message, code):
+    assert extractor.extract(message)['obd_code'] == code
+
+
+@pytest.mark.parametrize('message', [
+    'the bedded seat is loose',
+    'cafe1 の近くで故障',
+    'シリアル XP03001 の部品',
+])
+def test_words_and_longer_identifiers_are_not_obd_codes(extractor, message):
+    assert 'obd_code' not in extractor.extract(message)
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+"""Tests des filtres de métadonnées"""
+
+from conftest import make_article
+
+from facet_index import CATEGORY_FACETS, RANGE_FACETS, FacetIndex, SearchFilter
+from metadata_store import ColumnarMetadata, write_columnar
+
+
+def _metadata(article):
+    return {
+        'article_id': article['article_id'],
+        'vehicle_manufacturer': article['vehicle_info']['manufacturer'],
+        'vehicle_model': article['vehicle_info']['model'],
+        'vehicle_year': article['vehicle_info']['year'],
+        'estimated_price': article['estimated_price'],
+    }
+
+
+def _selected(index, search_filter):
+    return index.select(search_filter).nonzero()[0].tolist()
+
+
+def test_index_from_columnar_file_matches_index_built_from_rows(tmp_path, articles):
+    rows = [_metadata(article) for article in articles]
+    rows.append(_metadata(make_article('honda-3', model='ｎ－ｂｏｘ', year=None, price=12000)))
+    rows.append(None)
+    path = str(tmp_path / 'metadata.cols')
+    write_columnar(path, rows)
+    metadata = ColumnarMetadata(path)
+
+    from_columns = FacetIndex.from_columns(
+        metadata.live_mask(),
+        {name: metadata.category_codes(name) for name in CATEGORY_FACETS},
+        {name: metadata.numeric_values(name) for name in RANGE_FACETS})
+    built = FacetIndex.build((row, value) for row, value in enumerate(rows) if value is not None)
+
+    filters = [
+        SearchFilter(vehicle_manufacturer='ホンダ'),
+        SearchFilter(vehicle_model='N-BOX'),
+        SearchFilter(year_min=2016, year_max=2019),
+        SearchFilter(price_max=20000),
+        SearchFilter(vehicle_manufacturer='ホンダ', price_min=15000),
+        SearchFilter(vehicle_model='アクア'),
+    ]
+    for search_filter in filters:
+        assert _selected(from_columns, search_filter) == _selected(built, search_filter)
+    assert _selected(from_columns, SearchFilter(vehicle_model='n-box')) == [0, 5]
+    assert from_columns.stats() == built.stats()
+
+
+def test_filters_survive_save_and_load(search_engine, tmp_path):
+    search_filter = SearchFilter(vehicle_manufacturer='ホンダ', price_max=25000)
+
+    def filtered(engine):
+        return sorted(result['article']['article_id']
+                      for result in engine.search('ハンドルが重い', k=5, min_similarity=-1.0, filters=search_filter))
+
+    assert filtered(search_engine) == ['honda-1']
+    search_engine.save_index(str(tmp_path))
+    assert search_engine.load_index(str(tmp_path))
+    assert filtered(search_engine) == ['honda-1']
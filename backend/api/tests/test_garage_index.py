@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+"""Tests de la recherche de garages par lieu"""
+
+from garage_index import GarageIndex, load_centroids
+
+
+def _garage(name, prefecture, latitude, longitude, ville=''):
+    return {'nom': name, 'prefecture': prefecture, 'ville': ville, 'adresse': f"{prefecture}{ville}",
+            'latitude': latitude, 'longitude': longitude, 'specialites': [], 'services': []}
+
+
+GARAGES = [
+    _garage('京都駅前モータース', '京都府', 34.9858, 135.7588, '京都市'),
+    _garage('梅田オートサービス', '大阪府', 34.7025, 135.4959, '大阪市'),
+    _garage('大津カーケア', '滋賀県', 35.0045, 135.8686, '大津市'),
+    # Coordonnées seules (adresse non renseignée) : retrouvé par proximité
+    _garage('烏丸自動車', '', 35.0116, 135.7681),
+]
+
+
+def _names(results):
+    return [garage['nom'] for garage in results]
+
+
+def test_city_query_excludes_garages_of_neighbouring_cities():
+    index = GarageIndex(GARAGES, load_centroids())
+
+    kyoto = _names(index.search(location='京都', limit=10))
+    assert kyoto == ['烏丸自動車', '京都駅前モータース']
+    assert _names(index.search(location='大阪', limit=10)) == ['梅田オートサービス']
+    assert _names(index.search(location='滋賀', limit=10)) == ['大津カーケア']
@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+"""Tests de l'index des codes OBD"""
+
+from obd_index import ObdCodeIndex
+
+
+def test_lookup_exact_code_first_then_same_base_code():
+    index = ObdCodeIndex.build([(0, ['U3003-1C']), (1, ['u3003']), (2, ['P0A80']), (3, ['U3003-1C', 'C1AE687'])])
+
+    assert index.lookup('ｕ３００３－１ｃ') == [(0, True), (3, True), (1, False)]
+    assert index.lookup('U3003') == [(1, True), (0, False), (3, False)]
+    assert index.lookup('P0000') == []
+
+
+def test_updates_after_load_overlay_the_saved_postings(tmp_path):
+    path = str(tmp_path / 'obd.npz')
+    ObdCodeIndex.build([(0, ['U3003-1C']), (1, ['P0A80']), (2, [])]).save(path)
+    index = ObdCodeIndex.load(path)
+    assert index.lookup('P0A80') == [(1, True)]
+
+    index.add(0, ['P0A80'])
+    index.remove(1)
+    index.add(5, ['U3003-2A'])
+    assert index.lookup('P0A80') == [(0, True)]
+    assert index.lookup('U3003-1C') == [(5, False)]
+
+    snapshot = index.snapshot()
+    index.remove(5)
+    snapshot.save(path)
+    reloaded = ObdCodeIndex.load(path)
+    assert reloaded.lookup('P0A80') == [(0, True)]
+    assert reloaded.lookup('U3003') == [(5, False)]
+    assert reloaded.stats() == {'codes': 2, 'base_codes': 2, 'articles': 2}
+    assert index.lookup('U3003') == []
@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+"""Tests des fichiers de l'index : articles (JSON Lines) et métadonnées colonnaires"""
+
+from conftest import make_article
+
+from metadata_store import ColumnarMetadata, write_columnar
+from record_store import MmapRecordList, write_records
+
+
+def _metadata(article):
+    return {
+        'article_id': article['article_id'],
+        'type': 'diagnostic_article',
+        'vehicle_manufacturer': article['vehicle_info']['manufacturer'],
+        'vehicle_model': article['vehicle_info']['model'],
+        'vehicle_year': article['vehicle_info']['year'],
+        'obd_codes': [code['code'] for code in article['obd_codes']],
+        'symptom': article['symptom'],
+        'estimated_price': article['estimated_price'],
+        'estimated_duration': article['estimated_duration'],
+    }
+
+
+def _edit(rows, articles):
+    """Modification, suppression et ajouts en mémoire ; renvoie le contenu attendu"""
+    expected = list(rows)
+    rows[1] = expected[1] = articles[0]
+    rows[2] = expected[2] = None
+    for article in articles[1:]:
+        rows.append(article)
+        expected.append(article)
+    return expected
+
+
+def test_record_list_is_rewritten_with_only_its_overrides_encoded(tmp_path, articles):
+    write_records(str(tmp_path / 'articles.jsonl'), articles + [None])
+    records = MmapRecordList(str(tmp_path / 'articles.jsonl'))
+    expected = _edit(records, [make_article('honda-9', symptom='ワイパー'), make_article('toyota-9', obd_codes=['P0171'])])
+
+    assert write_records(str(tmp_path / 'saved.jsonl'), records.snapshot()) == len(expected)
+    assert list(MmapRecordList(str(tmp_path / 'saved.jsonl'))) == expected
+
+
+def test_columnar_metadata_is_rewritten_column_by_column(tmp_path, articles):
+    write_columnar(str(tmp_path / 'metadata.cols'), [_metadata(article) for article in articles] + [None])
+    metadata = ColumnarMetadata(str(tmp_path / 'metadata.cols'))
+    edits = [make_article('honda-9', model='ヴェゼル', obd_codes=['U3003-1C', 'P0171'], price=None),
+             make_article('subaru-1', manufacturer='スバル', model='XV', year=None)]
+    expected = _edit(metadata, [_metadata(article) for article in edits])
+
+    assert write_columnar(str(tmp_path / 'saved.cols'), metadata.snapshot()) == len(expected)
+    saved = ColumnarMetadata(str(tmp_path / 'saved.cols'))
+    assert list(saved) == expected
+    assert saved.vocabularies['vehicle_manufacturer'][-1] == 'スバル'
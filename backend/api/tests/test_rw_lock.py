@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+"""Tests du verrou lecteurs/rédacteur"""
+
+import threading
+import time
+
+from rw_lock import ReadWriteLock
+
+
+def test_readers_share_the_lock():
+    lock = ReadWriteLock()
+    both_inside = threading.Barrier(2, timeout=5)
+
+    def reader():
+        with lock.read():
+            both_inside.wait()
+
+    threads = [threading.Thread(target=reader) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=5)
+    assert not both_inside.broken
+
+
+def test_writer_waits_for_readers_and_blocks_new_ones():
+    lock = ReadWriteLock()
+    events = []
+    reader_inside = threading.Event()
+    release_reader = threading.Event()
+
+    def first_reader():
+        with lock.read():
+            reader_inside.set()
+            release_reader.wait(5)
+            events.append('reader done')
+
+    def writer():
+        with lock.write():
+            events.append('writer')
+
+    first = threading.Thread(target=first_reader)
+    first.start()
+    reader_inside.wait(5)
+    writing = threading.Thread(target=writer)
+    writing.start()
+    while not lock._writers_waiting:
+        time.sleep(0.001)
+    # Un rédacteur attend : un nouveau lecteur passe après lui
+    def late_reader():
+        with lock.read():
+            events.append('late reader')
+
+    late = threading.Thread(target=late_reader)
+    late.start()
+    release_reader.set()
+    for thread in (first, writing, late):
+        thread.join(timeout=5)
+    assert events == ['reader done', 'writer', 'late reader']
@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+"""Tests de l'index BM25"""
+
+import numpy as np
+
+from sparse_index import SparseIndex
+
+DOCUMENTS = [
+    'エンジン警告灯が点灯 P0A80',
+    'ハンドルが重い N-BOX',
+    'バッテリー警告灯 U3003-1C',
+    'ブレーキの異音',
+    'エンジンがかからない',
+]
+
+
+def test_scores_only_rows_matching_query_terms():
+    index = SparseIndex.build(enumerate(DOCUMENTS))
+    index.add(7, 'エンジン警告灯 再点灯')
+
+    ranked = [row for row, _ in index.search('警告灯', k=10)]
+    assert sorted(ranked) == [0, 2, 7]
+    assert index.search('サスペンション', k=10) == []
+
+
+def test_ties_break_by_row_and_mask_excludes_rows():
+    index = SparseIndex.build(enumerate(['オイル漏れ', 'タイヤ交換', 'オイル漏れ', 'オイル漏れ']))
+
+    assert [row for row, _ in index.search('オイル漏れ', k=2)] == [0, 2]
+    allowed = np.array([False, True, False], dtype=bool)
+    assert [row for row, _ in index.search('オイル漏れ', k=2, allowed=allowed)] == []
+    assert [row for row, _ in index.search('オイル漏れ', k=5, allowed=np.array([False, True, True, True]))] == [2, 3]
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+"""Tests du moteur de recherche : mises à jour de l'index"""
+
+import pytest
+
+from conftest import make_article
+
+
+def test_upsert_rejects_whole_batch_when_an_article_is_invalid(search_engine):
+    before = (search_engine.article_count, search_engine.index.ntotal, len(search_engine.metadata))
+
+    valid = make_article('honda-3', symptom='ワイパーが動かない')
+    invalid = make_article('honda-4', symptom='ワイパーが動かない')
+    del invalid['estimated_price']
+
+    with pytest.raises(KeyError):
+        search_engine.upsert_articles([valid, invalid])
+
+    after = (search_engine.article_count, search_engine.index.ntotal, len(search_engine.metadata))
+    assert after == before
+    results = search_engine.search('ワイパーが動かない', k=10, min_similarity=0.0)
+    assert 'honda-3' not in [result['article']['article_id'] for result in results]
+
+
+def test_upsert_then_delete_keeps_index_and_metadata_in_step(search_engine):
+    search_engine.upsert_articles([make_article('honda-3', symptom='ワイパーが動かない'),
+                                   make_article('honda-1', symptom='ハンドルが重い', price=25000)])
+    assert search_engine.article_count == search_engine.index.ntotal == 6
+
+    assert search_engine.delete_articles(['honda-3', 'unknown']) == 1
+    assert search_engine.article_count == search_engine.index.ntotal == 5
+    results = search_engine.search('ワイパーが動かない', k=10, min_similarity=0.0)
+    assert 'honda-3' not in [result['article']['article_id'] for result in results]
+
+
+@pytest.mark.parametrize('index_type', ['flat', 'ivf_flat'])
+def test_hybrid_search_applies_min_similarity_to_bm25_only_hits(monkeypatch, articles, index_type):
+    pytest.importorskip('faiss')
+    pytest.importorskip('sentence_transformers')
+    import vector_search
+    from conftest import HashingEncoder
+
+    monkeypatch.setattr(vector_search, 'SentenceTransformer', HashingEncoder)
+    engine = vector_search.GoonetVectorSearch(use_bedrock=False, embedding_cache_path=None,
+                                              index_type=index_type)
+    engine.articles = list(articles)
+    engine.create_embeddings()
+    assert engine.sparse_index is not None
+
+    # Recherche approximative qui ne remonte que le plus proche voisin : les
+    # autres articles citant « 警告灯 » ne sont trouvés que par BM25
+    index_search = engine._index_search
+    monkeypatch.setattr(engine, '_index_search',
+                        lambda embeddings, depth, allowed: tuple(
+                            array[:, :1] for array in index_search(embeddings, depth, allowed)))
+
+    query = 'エンジン警告灯が点灯'
+    everything = engine.search(query, k=5, min_similarity=-1.0)
+    bm25_only = [result for result in everything if result['retrieval']['dense_rank'] is None]
+    assert bm25_only
+    assert all(result['similarity'] != 0.0 for result in bm25_only)
+
+    threshold = 0.3
+    results = engine.search(query, k=5, min_similarity=threshold)
+    assert [result['article']['article_id'] for result in results] == ['toyota-1']
+    assert all(result['similarity'] >= threshold for result in results)
+
+
+def test_obd_code_index_is_saved_with_the_bundle(search_engine, tmp_path):
+    import json
+
+    search_engine.upsert_articles([make_article('honda-3', obd_codes=['U3003-2A'])])
+    search_engine.save_index(str(tmp_path))
+    manifest = json.loads((tmp_path / 'manifest.json').read_text(encoding='utf-8'))
+    assert manifest['files']['obd'] == 'obd.npz'
+
+    def obd_hits(engine):
+        return [(result['article']['article_id'], result['similarity'])
+                for result in engine.find_by_obd_code('U3003-1C')]
+
+    expected = [('nissan-1', 1.0), ('honda-3', 0.9)]
+    assert obd_hits(search_engine) == expected
+    assert search_engine.load_index(str(tmp_path))
+    assert obd_hits(search_engine) == expected
+
+    # Index sauvegardé sans obd.npz : codes relus depuis les métadonnées
+    del manifest['files']['obd']
+    (tmp_path / 'manifest.json').write_text(json.dumps(manifest), encoding='utf-8')
+    assert search_engine.load_index(str(tmp_path))
+    assert obd_hits(search_engine) == expected
+
+
+def test_updates_to_a_loaded_bundle_survive_the_next_save(search_engine, tmp_path):
+    search_engine.save_index(str(tmp_path))
+    assert search_engine.load_index(str(tmp_path))
+
+    search_engine.upsert_articles([make_article('honda-3', symptom='ワイパーが動かない'),
+                                   make_article('honda-1', symptom='ハンドルが重い', price=25000)])
+    search_engine.delete_articles(['mazda-1'])
+    search_engine.save_index(str(tmp_path))
+    assert search_engine.load_index(str(tmp_path))
+
+    assert search_engine.article_count == 5
+    rows = search_engine._row_by_article_id
+    assert search_engine.articles[rows['honda-3']]['symptom'] == 'ワイパーが動かない'
+    assert search_engine.metadata[rows['honda-1']]['estimated_price'] == 25000
+    assert 'mazda-1' not in rows
@@ -10,7 +10,7 @@ echo "📦 Vérification des dépendances..."
 python3 -c "import fastapi, uvicorn, boto3, faiss, sentence_transformers" 2>/dev/null
 if [ $? -ne 0 ]; then
     echo "❌ Dépendances manquantes. Installation..."
-    pip install fastapi uvicorn boto3 faiss-cpu sentence-transformers pydantic
+    pip install fastapi uvicorn boto3 faiss-cpu sentence-transformers pydantic prometheus-client
 fi
 
 # Création des répertoires nécessaires
@@ -22,13 +22,13 @@ mkdir -p /workspaces/SmarBot/data/faiss_index
 # Génération des données JSON (si pas déjà fait)
 echo "🔄 Préparation des données..."
 cd /workspaces/SmarBot
-if [ ! -f "data/json/diagnostic_articles.json" ]; then
+if ! ls data/json/diagnostic_articles.json* > /dev/null 2>&1; then
     echo "   Conversion CSV vers JSON..."
     python backend/api/data_processing/csv_converter.py
 fi
 
 # Génération de l'index FAISS (si pas déjà fait)
-if [ ! -f "data/faiss_index/articles.index" ]; then
+if [ ! -f "data/faiss_index/manifest.json" ]; then
     echo "   Création de l'index de recherche vectorielle..."
     python backend/api/data_processing/vector_search.py
 fi
@@ -117,6 +117,48 @@ def test_chat_endpoint() -> bool:
     print(f"\n📊 Résumé Chat: {success_count}/{len(test_messages)} tests réussis")
     return success_count == len(test_messages)
 
+def test_chat_stream_endpoint() -> bool:
+    """Test de l'endpoint de chat en flux (Server-Sent Events)"""
+    try:
+        payload = {
+            "message": "エアコンが効かない 東京",
+            "session_id": "test-session-stream"
+        }
+        
+        start_time = time.time()
+        first_token_time = None
+        events = []
+        
+        with requests.post(f"{API_BASE_URL}/chat/stream", json=payload, stream=True, timeout=60) as response:
+            if response.status_code != 200:
+                print(f"❌ Chat stream failed: {response.status_code}")
+                return False
+            
+            event_name = None
+            for line in response.iter_lines(decode_unicode=True):
+                if line.startswith("event: "):
+                    event_name = line[len("event: "):]
+                elif line.startswith("data: "):
+                    events.append((event_name, json.loads(line[len("data: "):])))
+                    if event_name == "token" and first_token_time is None:
+                        first_token_time = time.time() - start_time
+        
+        names = [name for name, _ in events]
+        if not names or names[0] != "metadata" or names[-1] != "done":
+            print(f"❌ Chat stream: séquence d'événements inattendue {names[:3]}...{names[-1:]}")
+            return False
+        
+        metadata = events[0][1]
+        print(f"✅ Chat stream: {names.count('token')} fragments")
+        print(f"   📚 Sources: {len(metadata['sources'])} articles, 🏪 Garages: {len(metadata['recommended_garages'])}")
+        if first_token_time is not None:
+            print(f"   ⚡ Premier fragment après {first_token_time:.2f}s")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Chat stream error: {e}")
+        return False
+
 def test_garages_endpoint() -> bool:
     """Test de l'endpoint garages"""
     try:
@@ -241,6 +283,7 @@ def main():
         ("Garages", test_garages_endpoint),
         ("Frontend", test_frontend_availability),
         ("Feedback", test_feedback_endpoint),
+        ("Chat Stream", test_chat_stream_endpoint),
         ("Chat Engine", test_chat_endpoint),  # Le plus long en dernier
     ]
     